@@ -0,0 +1,49 @@
+"""Estimated mosaic throughput: one job per tile vs tiles batched into one job.
+
+Usage: python bench_batch.py [tiles_per_batch ...]
+"""
+import random
+import sys
+import blot_fill
+import blot_ir
+import blot_mosaic
+from blot_cache import compile_drawing
+from blot_estimate import Estimator
+
+grid_origin = (5, 5)
+grid_size = 60
+rest = (grid_origin[0] + grid_size + 10, grid_origin[1] + grid_size + 10)
+mosaic_origin = (grid_origin[0] + grid_size + 5, 5)
+estimator = Estimator()
+
+
+def random_tiles(n, seed=1):
+    """n random tiles in adjacent mosaic positions, as placed drawings"""
+    rng = random.Random(seed)
+    tiles = []
+    for i in range(n):
+        pattern = [[rng.random() < 0.5 for _ in range(6)] for _ in range(5)]
+        local = compile_drawing(blot_ir.Drawing(blot_fill.tile_strokes(pattern)).transform(blot_mosaic.TILE_TO_PLOTTER))
+        dx, dy = blot_mosaic.plot_offset(*blot_mosaic.tile_offset(i))
+        tiles.append(local.translate(mosaic_origin[0] + dx, mosaic_origin[1] + dy))
+    return tiles
+
+def one_job_each(tiles):
+    """Every tile from the resting corner and back, with its own motor cycle"""
+    return sum(estimator.drawing_seconds(blot_ir.orient(rest)(t), rest, rest, motors_on=True, motors_off=True)
+               for t in tiles)
+
+def batched(tiles):
+    """All tiles routed as one drawing, one motor cycle and one park"""
+    drawing = blot_ir.run_passes(sum(tiles[1:], tiles[0]), [blot_ir.drop_empty, blot_ir.order(rest, rest)])
+    return estimator.drawing_seconds(drawing, rest, rest, motors_on=True, motors_off=True)
+
+
+if __name__ == '__main__':
+    sizes = [int(a) for a in sys.argv[1:]] or [1, 2, 4, 8, 16, 24]
+    print(f"{'batch':>6}{'each s':>9}{'batched s':>11}{'tiles/h each':>14}{'tiles/h batched':>17}{'gain':>7}")
+    for n in sizes:
+        tiles = random_tiles(n)
+        each, together = one_job_each(tiles), batched(tiles)
+        print(f"{n:>6}{each:>9.1f}{together:>11.1f}{3600 * n / each:>14.0f}{3600 * n / together:>17.0f}"
+              f"{each / together:>6.2f}x")
@@ -0,0 +1,94 @@
+"""Frames per second for v1 go frames: send_message-style encoding vs FrameEncoder.
+
+Usage: python bench_encoder.py [tiles]
+"""
+import sys
+import time
+import struct
+import random
+import blot_fill
+import blot_mosaic
+from blot_protocol import v1_message, FrameEncoder, ProtocolV1, PEN_UP_PULSE
+
+# Timing noise on a busy machine is one-sided, so each case reports its fastest run
+REPEATS = 7
+
+
+def legacy(points):
+    # What send_message did for every go: fresh buffers and cobs.encode
+    for seq, (x, y) in enumerate(points):
+        v1_message('go', struct.pack('<ff', x, y), seq % 256)
+
+def protocol_encode(cmds, proto):
+    # The backend hands the encoder commands it has already built, so they are built before timing
+    for seq, cmd in enumerate(cmds):
+        proto.encode(cmd, seq % 256)
+
+def encoder_go(points, enc):
+    for seq, (x, y) in enumerate(points):
+        enc.go(x, y, seq % 256)
+
+def encoder_many(points, enc):
+    enc.encode_many(points, 0)
+
+def legacy_pen(points):
+    for seq in range(len(points)):
+        v1_message('servo', struct.pack('<i', PEN_UP_PULSE), seq % 256)
+
+def cached_pen(points, proto):
+    for seq in range(len(points)):
+        proto.encode(('servo', PEN_UP_PULSE), seq % 256)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def best(fn, data, make=None):
+    """Fastest of REPEATS runs (cold, warm); cold runs start from a fresh encoder each time"""
+    cold, warm = [], []
+    for _ in range(REPEATS):
+        if make is None:
+            cold.append(timed(fn, data))
+            continue
+        state = make()
+        cold.append(timed(fn, data, state))
+        warm.append(timed(fn, data, state))
+    return min(cold), min(warm or cold)
+
+def check(points):
+    enc = FrameEncoder()
+    many = bytes(FrameEncoder().encode_many(points, 0))
+    expected = b''.join(v1_message('go', struct.pack('<ff', x, y), seq % 256) for seq, (x, y) in enumerate(points))
+    assert many == expected
+    for seq, (x, y) in enumerate(points):
+        assert bytes(enc.go(x, y, seq % 256)) == v1_message('go', struct.pack('<ff', x, y), seq % 256)
+
+
+def tile_points(tiles):
+    """Every point of the hatch plans for random tiles across the mosaic"""
+    rng = random.Random(1)
+    points = []
+    for _ in range(tiles):
+        pattern = [[rng.random() < 0.5 for _ in range(6)] for _ in range(5)]
+        dx, dy = blot_mosaic.plot_offset(*blot_mosaic.tile_offset(rng.randrange(blot_mosaic.TILE_COUNT)))
+        for stroke in blot_fill.plan_tile(pattern, 70 + dx, 5 + dy, blot_mosaic.TILE_TO_PLOTTER, 'crosshatch', (75, 75)):
+            points.extend(stroke)
+    return points
+
+
+if __name__ == '__main__':
+    tiles = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    points = tile_points(tiles)
+    n = len(points)
+    check(points[:2000])
+    print(f"{n} go frames from {tiles} crosshatched tiles, {len(set(points))} distinct points")
+    print(f"{'encoder':<28}{'cold':>14}{'warm':>14}  frames/s")
+    cmds = [('go', x, y) for x, y in points]
+    cases = [('send_message path', legacy, points, None), ('ProtocolV1.encode', protocol_encode, cmds, ProtocolV1),
+             ('FrameEncoder.go', encoder_go, points, FrameEncoder),
+             ('FrameEncoder.encode_many', encoder_many, points, FrameEncoder),
+             ('pen up, fresh', legacy_pen, points, None), ('pen up, cached', cached_pen, points, ProtocolV1)]
+    for name, fn, data, make in cases:
+        cold, warm = best(fn, data, make)
+        print(f"{name:<28}{n / cold:>14,.0f}{n / warm:>14,.0f}")
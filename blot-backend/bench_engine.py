@@ -0,0 +1,82 @@
+"""Positions evaluated per second: the old dict game logic vs the ttt_engine bitboards.
+
+Usage: python bench_engine.py [positions]
+"""
+import random
+import sys
+import time
+import ttt_engine
+
+LINES = [
+    [1, 2, 3], [4, 5, 6], [7, 8, 9],
+    [1, 4, 7], [2, 5, 8], [3, 6, 9],
+    [1, 5, 9], [3, 5, 7]
+]
+
+
+# --- The dict implementation the backends used before ---
+def dict_winner(board_state):
+    for line in LINES:
+        if board_state[line[0]] == board_state[line[1]] == board_state[line[2]] and board_state[line[0]] != ' ':
+            return board_state[line[0]]
+    if all(board_state[c] != ' ' for c in range(1, 10)):
+        return 'D'
+    return None
+
+def dict_ai_move(board, rng):
+    available = [c for c in range(1, 10) if board[c] == ' ']
+    if not available:
+        return None
+    for cell in available:
+        board_copy = board.copy()
+        board_copy[cell] = 'O'
+        if dict_winner(board_copy) == 'O':
+            return cell
+    for cell in available:
+        board_copy = board.copy()
+        board_copy[cell] = 'X'
+        if dict_winner(board_copy) == 'X':
+            return cell
+    return rng.choice(available)
+
+def random_positions(n, seed=1):
+    """Boards reached by random play, stopping before the game is decided"""
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < n:
+        board = {i: ' ' for i in range(1, 10)}
+        for ply in range(rng.randrange(9)):
+            cell = rng.choice([c for c in board if board[c] == ' '])
+            board[cell] = 'X' if ply % 2 == 0 else 'O'
+            if dict_winner(board):
+                break
+        boards.append(board)
+    return boards
+
+def rate(fn, items):
+    t0 = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - t0)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    boards = random_positions(n)
+    masks = [ttt_engine.from_dict(b) for b in boards]
+    for b, (x, o) in zip(boards, masks):
+        assert dict_winner(b) == ttt_engine.winner(x, o)
+        if not dict_winner(b):
+            assert dict_ai_move(b, random.Random(0)) == ttt_engine.ai_move(b, rng=random.Random(0))
+
+    rows = [
+        ('winner, dict', rate(dict_winner, boards)),
+        ('winner, engine from dict', rate(ttt_engine.check_winner_for_board, boards)),
+        ('winner, bitboard', rate(lambda m: ttt_engine.winner(*m), masks)),
+        ('ai_move, dict', rate(lambda b: dict_ai_move(b, random), boards)),
+        ('ai_move, engine', rate(ttt_engine.ai_move, boards)),
+    ]
+    base = {'winner': rows[0][1], 'ai_move': rows[3][1]}
+    print(f"{'evaluation':<28}{'positions/s':>14}{'speedup':>9}")
+    for name, per_sec in rows:
+        print(f"{name:<28}{per_sec:>14,.0f}{per_sec / base[name.split(',')[0]]:>8.1f}x")
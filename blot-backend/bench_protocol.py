@@ -0,0 +1,79 @@
+"""Bytes on the wire per drawing for command protocol v1 vs v2.
+
+Usage: python bench_protocol.py
+"""
+import blot_fill
+import blot_mosaic
+from blot_protocol import ProtocolV1, ProtocolV2, PEN_UP_PULSE, PEN_DOWN_PULSE, expand_paths, split_path
+
+cell_size = 20
+grid_origin = (5, 5)
+rest = (grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)
+
+UP = ('servo', PEN_UP_PULSE)
+DOWN = ('servo', PEN_DOWN_PULSE)
+
+
+def strokes_to_commands(strokes, use_paths):
+    cmds = []
+    for stroke in strokes:
+        cmds.append(('go',) + tuple(stroke[0]))
+        cmds.append(DOWN)
+        if use_paths and len(stroke) > 2:
+            cmds.extend(('path', chunk) for chunk in split_path(stroke[1:]))
+        else:
+            cmds.extend(('go', px, py) for px, py in stroke[1:])
+        cmds.append(UP)
+    return cmds
+
+def grid_strokes():
+    strokes = []
+    for i in range(1, 3):
+        x = grid_origin[0] + i * cell_size
+        strokes.append([(x, grid_origin[1]), (x, grid_origin[1] + 3 * cell_size)])
+    for i in range(1, 3):
+        y = grid_origin[1] + i * cell_size
+        strokes.append([(grid_origin[0], y), (grid_origin[0] + 3 * cell_size, y)])
+    return strokes
+
+def x_strokes(x, y):
+    return [[(x - 5, y - 5), (x + 5, y + 5)], [(x - 5, y + 5), (x + 5, y - 5)]]
+
+def o_strokes(x, y):
+    return [[(x - 5, y), (x, y + 5), (x + 5, y), (x, y - 5), (x - 5, y)]]
+
+def drawing(strokes, use_paths):
+    return [('motorsOn',)] + strokes_to_commands(strokes, use_paths) + [('go',) + rest, ('motorsOff',)]
+
+def wire_bytes(proto, cmds):
+    return sum(len(proto.encode(cmd, seq % 256)) for seq, cmd in enumerate(cmds))
+
+def check_roundtrip(cmds):
+    v2 = ProtocolV2()
+    pos = None
+    for seq, cmd in enumerate(cmds):
+        decoded, _, pos = v2.decode_command(v2.encode(cmd, seq % 256), pos)
+        got = expand_paths(decoded)
+        want = expand_paths([cmd])
+        for a, b in zip(got, want):
+            assert a[0] == b[0] and all(abs(p - q) <= 0.005 for p, q in zip(a[1:], b[1:])), (a, b)
+
+
+if __name__ == '__main__':
+    full_tile = [[1] * 6 for _ in range(5)]
+    cases = {
+        'grid': grid_strokes(),
+        'X mark': x_strokes(15, 15),
+        'O mark': o_strokes(35, 35),
+        'pixel tile (single)': blot_fill.plan_tile(full_tile, 70, 5, blot_mosaic.TILE_TO_PLOTTER, 'single', rest, rest),
+        'pixel tile (crosshatch)': blot_fill.plan_tile(full_tile, 70, 5, blot_mosaic.TILE_TO_PLOTTER, 'crosshatch', rest, rest),
+    }
+    print(f"{'drawing':<26}{'frames':>8}{'v1 bytes':>10}{'v2 go':>8}{'v2 path':>9}{'saved':>8}")
+    for name, strokes in cases.items():
+        plain = drawing(strokes, False)
+        paths = drawing(strokes, True)
+        check_roundtrip(paths)
+        v1 = wire_bytes(ProtocolV1(), plain)
+        v2_go = wire_bytes(ProtocolV2(), plain)
+        v2_path = wire_bytes(ProtocolV2(), paths)
+        print(f"{name:<26}{len(plain):>8}{v1:>10}{v2_go:>8}{v2_path:>9}{1 - v2_path / v1:>8.0%}")
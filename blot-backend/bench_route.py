@@ -0,0 +1,78 @@
+"""Pen-up travel per drawing: as drawn, nearest neighbour only, and blot_route.optimize.
+
+Usage: python bench_route.py [time_budget_seconds]
+"""
+import random
+import sys
+import time
+import blot_fill
+import blot_mosaic
+import blot_route
+
+cell_size = 20
+grid_origin = (5, 5)
+rest = (grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)
+mosaic_origin = (70, 5)
+
+
+def grid_strokes():
+    strokes = []
+    for i in range(1, 3):
+        x = grid_origin[0] + i * cell_size
+        strokes.append([(x, grid_origin[1]), (x, grid_origin[1] + 3 * cell_size)])
+    for i in range(1, 3):
+        y = grid_origin[1] + i * cell_size
+        strokes.append([(grid_origin[0], y), (grid_origin[0] + 3 * cell_size, y)])
+    return strokes
+
+def rectangle(left, top, right, bottom):
+    return [(left, top), (right, top), (right, bottom), (left, bottom), (left, top)]
+
+def o_strokes(x, y):
+    return [[(x - 5, y), (x, y + 5), (x + 5, y), (x, y - 5), (x - 5, y)]]
+
+def mosaic_frame(tiles, seed=1):
+    """Strokes of several random tiles placed side by side, as one drawing"""
+    rng = random.Random(seed)
+    strokes = []
+    for t in range(tiles):
+        pattern = [[rng.random() < 0.5 for _ in range(6)] for _ in range(5)]
+        ox = mosaic_origin[0] + (t % 6) * 8
+        oy = mosaic_origin[1] + (t // 6) * 7
+        strokes += blot_fill.to_plotter(blot_fill.tile_strokes(pattern, 'single'), ox, oy, blot_mosaic.TILE_TO_PLOTTER)
+    return strokes
+
+def nearest_neighbour(strokes, start):
+    """Endpoints-only greedy ordering, the baseline before loop rotation and improvement passes"""
+    remaining = [list(s) for s in strokes]
+    ordered = []
+    pos = start
+    while remaining:
+        i, rev = min(((i, rev) for i in range(len(remaining)) for rev in (False, True)),
+                     key=lambda c: blot_fill.dist(pos, remaining[c[0]][-1 if c[1] else 0]))
+        s = remaining.pop(i)
+        if rev:
+            s.reverse()
+        ordered.append(s)
+        pos = s[-1]
+    return ordered
+
+
+if __name__ == '__main__':
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else blot_route.TIME_BUDGET
+    cases = {
+        'grid': grid_strokes(),
+        'nested rectangles': [rectangle(68, 5, 120, 120), rectangle(69, 6, 119, 119)],
+        'O mark (cell 9)': o_strokes(55, 55),
+        'mosaic 6 tiles': mosaic_frame(6),
+        'mosaic 24 tiles': mosaic_frame(24),
+    }
+    print(f"{'drawing':<20}{'strokes':>8}{'as drawn':>10}{'greedy':>9}{'optimized':>11}{'saved':>8}{'ms':>7}")
+    for name, strokes in cases.items():
+        drawn = blot_route.travel(strokes, rest, rest)
+        greedy = blot_route.travel(nearest_neighbour(strokes, rest), rest, rest)
+        t0 = time.perf_counter()
+        ordered = blot_route.optimize(strokes, rest, rest, budget)
+        ms = (time.perf_counter() - t0) * 1000
+        best = blot_route.travel(ordered, rest, rest)
+        print(f"{name:<20}{len(strokes):>8}{drawn:>10.1f}{greedy:>9.1f}{best:>11.1f}{1 - best / drawn:>8.0%}{ms:>7.1f}")
@@ -0,0 +1,134 @@
+"""Self-play between tic-tac-toe strategies: results, decisions per second and move latency.
+
+Usage: python bench_selfplay.py [--games N] [--workers W] [--seed S] [X:O ...]
+
+Each X:O matchup (e.g. random:medium) plays N games split across a
+multiprocessing pool. Strategies: random, engine (the old one-ply AI),
+easy, medium, hard (ttt_solver difficulties; medium is what /ai-move
+plays by default), depth<n> (perfect play seeing n plies ahead) and
+search (ttt_board's alpha-beta on the 3x3 board). With no matchups,
+each of STRATEGIES plays O against random and against hard.
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from collections import Counter
+import ttt_board
+import ttt_engine
+import ttt_solver
+from ttt_engine import bit_cell, from_dict
+
+# Played by default; search is left out as it is ~100x slower per move
+STRATEGIES = ('random', 'engine', 'easy', 'medium', 'hard', 'depth2')
+CHUNK = 2000
+PERCENTILES = (50, 90, 99)
+
+
+def depth_limited(depth):
+    """Perfect play that only sees wins and losses up to depth plies ahead"""
+    def move(board, player, rng):
+        x, o = from_dict(board)
+        own, other = (o, x) if player == 'O' else (x, o)
+        seen = {bit: ttt_solver.horizon(v, depth) for bit, v in ttt_solver.move_values(own, other).items()}
+        best = max(seen.values())
+        return bit_cell(rng.choice([bit for bit, v in seen.items() if v == best]))
+    return move
+
+def strategy(name):
+    """move(board, player, rng) -> cell for a strategy name"""
+    if name == 'random':
+        return lambda board, player, rng: ttt_engine.random_move(board, rng)
+    if name == 'engine':
+        return ttt_engine.ai_move
+    if name in ttt_solver.DIFFICULTY:
+        return lambda board, player, rng: ttt_solver.choose_move(board, player, name, rng)
+    if name.startswith('depth') and name[5:].isdigit():
+        return depth_limited(int(name[5:]))
+    if name == 'search':
+        return lambda board, player, rng: ttt_board.best_move(board, 3, 3, player)
+    raise ValueError(f"Unknown strategy {name!r}")
+
+def play_chunk(args):
+    """Play games of one matchup; results Counter and per-side latency histograms in microseconds"""
+    x_name, o_name, games, seed = args
+    rng = random.Random(seed)
+    players = {'X': strategy(x_name), 'O': strategy(o_name)}
+    results = Counter()
+    latency = {'X': Counter(), 'O': Counter()}
+    seconds = {'X': 0.0, 'O': 0.0}
+    for _ in range(games):
+        board = {i: ' ' for i in range(1, 10)}
+        turn = 'X'
+        while True:
+            t0 = time.perf_counter()
+            cell = players[turn](board, turn, rng)
+            spent = time.perf_counter() - t0
+            seconds[turn] += spent
+            latency[turn][int(spent * 1e6)] += 1
+            board[cell] = turn
+            result = ttt_engine.check_winner_for_board(board)
+            if result:
+                results[result] += 1
+                break
+            turn = 'O' if turn == 'X' else 'X'
+    return x_name, o_name, results, latency, seconds
+
+def percentile(hist, p):
+    total = sum(hist.values())
+    target = total * p / 100
+    seen = 0
+    for us in sorted(hist):
+        seen += hist[us]
+        if seen >= target:
+            return us
+    return 0
+
+def run(matchups, games, workers, seed):
+    tasks = []
+    for x_name, o_name in matchups:
+        for i, start in enumerate(range(0, games, CHUNK)):
+            tasks.append((x_name, o_name, min(CHUNK, games - start), seed + i))
+    results = {m: Counter() for m in matchups}
+    latency = {}
+    seconds = Counter()
+    t0 = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        for x_name, o_name, res, lat, secs in pool.imap_unordered(play_chunk, tasks):
+            results[(x_name, o_name)].update(res)
+            for side, name in (('X', x_name), ('O', o_name)):
+                latency.setdefault(name, Counter()).update(lat[side])
+                seconds[name] += secs[side]
+    return results, latency, seconds, time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('matchups', nargs='*', help="X:O strategy pairs")
+    parser.add_argument('--games', type=int, default=10000, help="games per matchup")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.matchups:
+        matchups = [tuple(m.split(':', 1)) for m in args.matchups]
+    else:
+        matchups = [(x, o) for x in ('random', 'hard') for o in STRATEGIES]
+    for name in {n for m in matchups for n in m}:
+        strategy(name)
+
+    results, latency, seconds, wall = run(matchups, args.games, args.workers, args.seed)
+
+    print(f"{'X':<10}{'O':<10}{'games':>9}{'X wins':>9}{'draws':>9}{'O wins':>9}")
+    for (x_name, o_name), res in results.items():
+        n = sum(res.values())
+        print(f"{x_name:<10}{o_name:<10}{n:>9}" + ''.join(f"{100 * res[r] / n:>8.1f}%" for r in 'XDO'))
+    print()
+    print(f"{'strategy':<10}{'decisions':>11}{'per second':>12}"
+          + ''.join(f"{f'p{p} us':>9}" for p in PERCENTILES) + f"{'max us':>9}")
+    for name, hist in sorted(latency.items()):
+        n = sum(hist.values())
+        print(f"{name:<10}{n:>11}{n / seconds[name]:>12,.0f}"
+              + ''.join(f"{percentile(hist, p):>9}" for p in PERCENTILES) + f"{max(hist):>9}")
+    total = sum(sum(r.values()) for r in results.values())
+    print(f"\n{total} games in {wall:.1f}s on {args.workers} workers ({total / wall:,.0f} games/s)")
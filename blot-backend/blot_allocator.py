@@ -0,0 +1,141 @@
+import itertools
+import math
+import secrets
+import threading
+import time
+import blot_mosaic
+
+# Seconds a claimed tile stays reserved without a renew or a submission
+LEASE_SECONDS = 120
+
+
+class Lease:
+    def __init__(self, token, tile, client, expires):
+        self.token = token
+        self.tile = tile
+        self.client = client
+        self.expires = expires
+
+    def to_dict(self):
+        x, y = blot_mosaic.tile_offset(self.tile)
+        return {"token": self.token, "tile": self.tile, "x": x, "y": y, "client": self.client,
+                "expires_in": round(max(self.expires - time.monotonic(), 0.0), 1)}
+
+
+class TileAllocator:
+    """Hands out the mosaic's free tiles one claimant at a time.
+
+    claim() reserves a free tile under a lease and returns it; the holder
+    then either submits it with commit(), which marks the tile used for
+    good, or gives it back with release(). A lease that is neither renewed
+    nor committed within lease_seconds expires and its tile is free again.
+    Of the free tiles, claim() picks the one whose footprint on paper is
+    closest to where the pen will be, so consecutive submissions plot next
+    to each other. Every
+    operation runs under one lock, so a tile is never leased twice.
+    """
+
+    def __init__(self, used=(), lease_seconds=LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.used = set(used)
+        self.leases = {}
+        self.by_tile = {}
+        self.lock = threading.Lock()
+        self.stats = {"claimed": 0, "committed": 0, "released": 0, "expired": 0, "exhausted": 0}
+        self._centers = [self._center(i) for i in range(blot_mosaic.TILE_COUNT)]
+        self._tokens = itertools.count(1)
+
+    @staticmethod
+    def _center(tile):
+        # On paper, as an offset from the mosaic origin
+        left, top, right, bottom = blot_mosaic.tile_rect(tile)
+        return (left + right) / 2, (top + bottom) / 2
+
+    def _expire(self, now):
+        # Called with self.lock held
+        for token in [t for t, lease in self.leases.items() if lease.expires <= now]:
+            lease = self.leases.pop(token)
+            del self.by_tile[lease.tile]
+            self.stats["expired"] += 1
+
+    def _lease(self, token):
+        # Called with self.lock held; None once the lease has expired or been used
+        self._expire(time.monotonic())
+        return self.leases.get(token)
+
+    def claim(self, client=None, near=(0, 0)):
+        """Lease for the free tile closest to near (a plotter offset from the mosaic origin), or None when full"""
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            free = [i for i in range(blot_mosaic.TILE_COUNT) if i not in self.used and i not in self.by_tile]
+            if not free:
+                self.stats["exhausted"] += 1
+                return None
+            tile = min(free, key=lambda i: (math.dist(self._centers[i], near), i))
+            token = f"{next(self._tokens)}-{secrets.token_hex(8)}"
+            lease = Lease(token, tile, client, now + self.lease_seconds)
+            self.leases[token] = lease
+            self.by_tile[tile] = lease
+            self.stats["claimed"] += 1
+            return lease
+
+    def peek(self, token):
+        """Live lease for a token, left as it is; None once expired or used"""
+        with self.lock:
+            return self._lease(token)
+
+    def renew(self, token):
+        with self.lock:
+            lease = self._lease(token)
+            if lease is not None:
+                lease.expires = time.monotonic() + self.lease_seconds
+            return lease
+
+    def release(self, token):
+        """Give a leased tile back unused"""
+        with self.lock:
+            lease = self._lease(token)
+            if lease is None:
+                return False
+            del self.leases[token]
+            del self.by_tile[lease.tile]
+            self.stats["released"] += 1
+            return True
+
+    def commit(self, token):
+        """Tile of a live lease, now used for good; None if the lease is unknown or expired"""
+        with self.lock:
+            lease = self._lease(token)
+            if lease is None:
+                return None
+            del self.leases[token]
+            del self.by_tile[lease.tile]
+            self.used.add(lease.tile)
+            self.stats["committed"] += 1
+            return lease.tile
+
+    def take(self, tile):
+        """Mark a tile used by a submission that named it directly; False if a lease holds it"""
+        with self.lock:
+            self._expire(time.monotonic())
+            if tile in self.by_tile:
+                return False
+            self.used.add(tile)
+            return True
+
+    def free(self, tile):
+        """Make a used tile claimable again, e.g. when its job was cancelled or failed"""
+        with self.lock:
+            self.used.discard(tile)
+
+    def snapshot(self):
+        with self.lock:
+            self._expire(time.monotonic())
+            leases = [lease.to_dict() for lease in self.leases.values()]
+            stats = dict(self.stats, used=len(self.used), leased=len(leases),
+                         free=blot_mosaic.TILE_COUNT - len(self.used) - len(leases))
+        for lease in leases:
+            del lease["token"]
+        stats["leases"] = leases
+        return stats
@@ -0,0 +1,119 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+import blot_ir
+
+CACHE_SIZE = 512
+CACHE_FORMAT = 1
+# Seconds after a miss before the cache is written, so a burst of misses costs one write
+SAVE_DELAY = 2.0
+
+
+def compile_drawing(drawing):
+    """Optimize a shape once in its own coordinates: drop empty moves and order from its origin"""
+    return blot_ir.run_passes(drawing, [blot_ir.drop_empty, blot_ir.order((0, 0))])
+
+
+class DrawingCache:
+    """LRU cache of compiled shapes in relative coordinates.
+
+    Keys are tuples such as ('mark', 'X'), ('glyph', 'Y') or
+    ('mosaic tile', mode, bitmask). A cached Drawing is placed with
+    translate(), so stamping a mark or tile never replans it. With a path,
+    entries are written there as JSON save_delay seconds after a miss (and
+    at exit) and read back at the next start.
+    """
+
+    def __init__(self, capacity=CACHE_SIZE, path=None, save_delay=SAVE_DELAY):
+        self.capacity = capacity
+        self.path = path
+        self.save_delay = save_delay
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Serializes writers, so two saves never race on the file
+        self.save_lock = threading.Lock()
+        self.save_timer = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "loaded": 0}
+        if path and os.path.exists(path):
+            self.load()
+        if path:
+            atexit.register(self.flush)
+
+    def get(self, key, build):
+        """Compiled drawing for key, built with build() and compile_drawing on a miss"""
+        with self.lock:
+            drawing = self.entries.get(key)
+            if drawing is not None:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return drawing
+            self.stats["misses"] += 1
+        drawing = compile_drawing(build())
+        with self.lock:
+            self._put(key, drawing)
+            if self.path and self.save_timer is None:
+                self.save_timer = threading.Timer(self.save_delay, self.flush)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+        return drawing
+
+    def _put(self, key, drawing):
+        # Called with self.lock held
+        self.entries[key] = drawing
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["capacity"] = self.capacity
+        stats["persistent"] = bool(self.path)
+        return stats
+
+    # --- Persistence ---
+    def flush(self):
+        """Write a pending save now"""
+        with self.lock:
+            pending, self.save_timer = self.save_timer, None
+        if pending is not None:
+            pending.cancel()
+            self.save()
+
+    def save(self):
+        """Write every entry to path, replacing the old file in one step"""
+        with self.save_lock:
+            with self.lock:
+                entries = [[list(key), d.points.tolist(), d.starts.tolist()] for key, d in self.entries.items()]
+            # A temp file of its own in the same directory, so os.replace stays atomic
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(self.path)),
+                                             suffix='.tmp', delete=False) as f:
+                json.dump({"format": CACHE_FORMAT, "entries": entries}, f)
+            os.replace(f.name, self.path)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[blot_cache] ignoring unreadable cache {self.path}: {e}")
+            return
+        if data.get("format") != CACHE_FORMAT:
+            return
+        with self.lock:
+            for key, points, starts in data["entries"]:
+                points = np.asarray(points, dtype=float).reshape(-1, 2)
+                self._put(tuple(key), blot_ir.Drawing.packed(points, np.asarray(starts, dtype=int)))
+                self.stats["loaded"] += 1
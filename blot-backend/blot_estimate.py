@@ -0,0 +1,195 @@
+"""Kinematic plot-time estimates for Blot command streams, and their calibration.
+
+Usage: python blot_estimate.py calibrate SAMPLES.jsonl [CALIBRATION.json]
+       where each line is {"commands": [[...], ...], "seconds": measured}
+"""
+import json
+import os
+import sys
+import threading
+import numpy as np
+import blot_fill
+from blot_protocol import PEN_UP_PULSE, expand_paths
+
+# Until calibrated: the Blot's top speed (units/s) and acceleration (units/s^2)
+MAX_SPEED = blot_fill.DRAW_SPEED
+ACCELERATION = 40.0
+PEN_SETTLE = blot_fill.PEN_SETTLE
+# Seconds for the steppers to energise after motorsOn
+MOTOR_SETTLE = 0.1
+# Time for one frame to cross the wire at 9600 baud and be acked
+COMMAND_OVERHEAD = 0.02
+# Measured jobs kept for online calibration, and how many it takes before the fit is used
+CALIBRATION_SAMPLES = 50
+CALIBRATION_MIN = 8
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plot_calibration.json')
+TERMS = ('motion', 'pen', 'motor', 'command')
+
+
+def move_seconds(d, speed=MAX_SPEED, accel=ACCELERATION):
+    """Time for moves of length d that start and end at rest: a trapezoidal
+    speed profile, or a triangular one for moves too short to reach speed"""
+    d = np.asarray(d, dtype=float)
+    ramp = speed * speed / accel
+    return np.where(d >= ramp, d / speed + speed / accel, 2 * np.sqrt(d / accel))
+
+
+class Estimator:
+    """Predicted seconds for command streams and drawings.
+
+    A plot's time is split into four terms, each a count times a weight:
+    motion (seconds of trapezoidal moves at the configured speed and
+    acceleration, weight ~1), pen changes (servo settle), motorsOn (stepper
+    settle) and commands (wire and ack overhead). Measured jobs are fitted
+    to those terms by least squares, so the weights absorb whatever the
+    model gets wrong about a particular Blot.
+    """
+
+    def __init__(self, speed=MAX_SPEED, accel=ACCELERATION, path=None):
+        self.speed = speed
+        self.accel = accel
+        self.path = path
+        self.weights = np.array([1.0, PEN_SETTLE, MOTOR_SETTLE, COMMAND_OVERHEAD])
+        self.samples = []
+        self.lock = threading.Lock()
+        self.fitted = False
+        if path and os.path.exists(path):
+            self.load()
+
+    # --- Features ---
+    def features(self, cmds, pos=(0, 0)):
+        """(motion seconds, pen changes, motor starts, commands) of a command stream from pos"""
+        lengths = []
+        pen = PEN_UP_PULSE
+        pen_changes = motors = count = 0
+        for cmd in expand_paths(cmds):
+            count += 1
+            if cmd[0] == 'go':
+                target = (cmd[1], cmd[2])
+                if pos is not None:
+                    lengths.append(np.hypot(target[0] - pos[0], target[1] - pos[1]))
+                pos = target
+            elif cmd[0] == 'servo':
+                if cmd[1] != pen:
+                    pen_changes += 1
+                pen = cmd[1]
+            elif cmd[0] == 'motorsOn':
+                motors += 1
+        return np.array([self.motion(lengths), pen_changes, motors, count], dtype=float)
+
+    def drawing_features(self, drawing, start=None, end=None, motors_on=False, motors_off=False):
+        """features() of drawing.to_commands() from start, plus the move to end, without building the commands;
+        motors_on and motors_off count the motor commands a job wraps around the drawing"""
+        points = drawing.points
+        # Consecutive points are one move each, including pen-up travel between strokes
+        lengths = [np.hypot(*np.diff(points, axis=0).T)]
+        if start is not None and len(points):
+            lengths.append([np.hypot(*(points[0] - start))])
+        last = points[-1] if len(points) else start
+        if end is not None and last is not None:
+            lengths.append([np.hypot(*np.subtract(end, last))])
+        moves = len(points) + (end is not None)
+        return np.array([self.motion(np.concatenate(lengths)), 2 * len(drawing), int(motors_on),
+                         moves + 2 * len(drawing) + int(motors_on) + int(motors_off)], dtype=float)
+
+    def motion(self, lengths):
+        """Seconds of rest-to-rest moves of these lengths"""
+        if not len(lengths):
+            return 0.0
+        return float(move_seconds(lengths, self.speed, self.accel).sum())
+
+    # --- Estimates ---
+    def seconds(self, cmds, pos=(0, 0)):
+        return float(self.features(cmds, pos) @ self.weights)
+
+    def drawing_seconds(self, drawing, start=None, end=None, motors_on=False, motors_off=False):
+        return float(self.drawing_features(drawing, start, end, motors_on, motors_off) @ self.weights)
+
+    def breakdown(self, cmds, pos=(0, 0)):
+        """Seconds per term, for showing where a plot's time goes"""
+        parts = self.features(cmds, pos) * self.weights
+        return {term: round(float(v), 2) for term, v in zip(TERMS, parts)}
+
+    # --- Calibration ---
+    def record(self, cmds, pos, measured):
+        """Add a measured job; True if the weights were refitted from the recent samples"""
+        features = self.features(cmds, pos)
+        with self.lock:
+            self.samples.append((features, measured))
+            del self.samples[:-CALIBRATION_SAMPLES]
+            if len(self.samples) < CALIBRATION_MIN:
+                return False
+            return self.fit([f for f, _ in self.samples], [m for _, m in self.samples])
+
+    def fit(self, features, measured):
+        """Least-squares weights for measured seconds; terms that would go negative are dropped"""
+        x = np.asarray(features, dtype=float)
+        y = np.asarray(measured, dtype=float)
+        active = list(range(len(TERMS)))
+        while active:
+            coef, *_ = np.linalg.lstsq(x[:, active], y, rcond=None)
+            if (coef >= 0).all():
+                break
+            active = [a for a, c in zip(active, coef) if c >= 0]
+        if not active or not np.isfinite(coef).all():
+            return False
+        weights = np.zeros(len(TERMS))
+        weights[active] = coef
+        # A term the samples never exercised keeps its current weight
+        unused = ~x.any(axis=0)
+        weights[unused] = self.weights[unused]
+        self.weights = weights
+        self.fitted = True
+        return True
+
+    def snapshot(self):
+        with self.lock:
+            samples = list(self.samples)
+        errors = [abs(float(f @ self.weights) - m) / m for f, m in samples if m > 0]
+        return {"speed": self.speed, "acceleration": self.accel, "calibrated": self.fitted,
+                "samples": len(samples),
+                "mean_error": round(sum(errors) / len(errors), 3) if errors else None,
+                "weights": {term: round(float(w), 4) for term, w in zip(TERMS, self.weights)}}
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path + '.tmp', 'w') as f:
+            json.dump({"speed": self.speed, "acceleration": self.accel,
+                       "weights": [float(w) for w in self.weights]}, f)
+        os.replace(path + '.tmp', path)
+
+    def load(self, path=None):
+        path = path or self.path
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            self.speed = data["speed"]
+            self.accel = data["acceleration"]
+            self.weights = np.array(data["weights"], dtype=float)
+            self.fitted = True
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[blot_estimate] ignoring unreadable calibration {path}: {e}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'calibrate':
+        print(__doc__)
+        sys.exit(1)
+    estimator = Estimator()
+    samples = []
+    with open(sys.argv[2]) as f:
+        for line in f:
+            if line.strip():
+                samples.append(json.loads(line))
+    feats = [estimator.features([tuple(c) for c in s["commands"]]) for s in samples]
+    before = [float(f @ estimator.weights) for f in feats]
+    if not estimator.fit(feats, [s["seconds"] for s in samples]):
+        print("Could not fit these samples")
+        sys.exit(1)
+    after = [float(f @ estimator.weights) for f in feats]
+    for name, predicted in (('default', before), ('calibrated', after)):
+        errors = [abs(p - s["seconds"]) / s["seconds"] for p, s in zip(predicted, samples) if s["seconds"]]
+        print(f"{name:<12}mean error {100 * sum(errors) / len(errors):.1f}%")
+    out = sys.argv[3] if len(sys.argv) > 3 else CALIBRATION_PATH
+    estimator.save(out)
+    print(f"Weights {estimator.snapshot()['weights']} written to {out}")
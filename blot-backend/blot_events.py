@@ -0,0 +1,78 @@
+import json
+import threading
+from queue import Queue, Full, Empty
+
+# Events a client may fall behind by before it is dropped
+CLIENT_BUFFER = 64
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT = 15.0
+
+
+class Subscriber:
+    def __init__(self, buffer):
+        self.queue = Queue(maxsize=buffer)
+        self.dropped = False
+
+
+class EventHub:
+    """Fan-out of server-sent events to any number of streams.
+
+    publish() formats an event once and offers the same bytes to every
+    subscriber without blocking. A subscriber whose buffer is full is cut
+    off rather than allowed to hold up the others; its stream ends and the
+    browser's EventSource reconnects and picks up from the next event.
+    """
+
+    def __init__(self, buffer=CLIENT_BUFFER):
+        self.buffer = buffer
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.stats = {"published": 0, "dropped_clients": 0}
+
+    def subscribe(self, initial=()):
+        """New subscriber, first sent the (event, data) pairs in initial, e.g. a state snapshot"""
+        sub = Subscriber(self.buffer)
+        with self.lock:
+            for event, data in initial:
+                sub.queue.put_nowait(self._format(event, data))
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.discard(sub)
+
+    def _format(self, event, data):
+        # Called with self.lock held
+        message = f"id: {self.next_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+        self.next_id += 1
+        return message
+
+    def publish(self, event, data):
+        with self.lock:
+            message = self._format(event, data)
+            self.stats["published"] += 1
+            for sub in list(self.subscribers):
+                try:
+                    sub.queue.put_nowait(message)
+                except Full:
+                    sub.dropped = True
+                    self.subscribers.discard(sub)
+                    self.stats["dropped_clients"] += 1
+
+    def stream(self, sub, heartbeat=HEARTBEAT):
+        """Generator of SSE bytes for one subscriber; ends when it is dropped"""
+        try:
+            yield b"retry: 2000\n\n"
+            while not sub.dropped:
+                try:
+                    yield sub.queue.get(timeout=heartbeat)
+                except Empty:
+                    yield b": keep-alive\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, clients=len(self.subscribers))
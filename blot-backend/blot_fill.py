@@ -0,0 +1,133 @@
+import math
+import blot_route
+
+# --- Plot timing model ---
+DRAW_SPEED = 10.0    # units/s, pen up or down
+PEN_SETTLE = 0.3     # s for the servo to lift or drop the pen
+
+# Distance between hatch lines inside a pixel (pixels are 1x1 units)
+HATCH_SPACING = 0.5
+
+QUALITY_MODES = ('single', 'double', 'crosshatch')
+DEFAULT_MODE = 'single'
+
+PATTERN_ROWS = 5
+PATTERN_COLS = 6
+
+
+def dist(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+# --- Pixels and runs ---
+# Tiles are planned in pattern space, x = column and y = row, with pixel
+# (row, col) covering [col, col + 1] x [row, row + 1]. How that lands on paper
+# is the caller's matrix, normally blot_mosaic.TILE_TO_PLOTTER.
+
+def pattern_pixels(pattern):
+    """Filled pixels of a 5x6 pattern as (col, row)"""
+    return {(col, row) for row in range(PATTERN_ROWS) for col in range(PATTERN_COLS) if pattern[row][col]}
+
+def pattern_bitmask(pattern):
+    """The 30 pixels of a 5x6 pattern as an int, bit row * 6 + col"""
+    mask = 0
+    for row in range(PATTERN_ROWS):
+        for col in range(PATTERN_COLS):
+            if pattern[row][col]:
+                mask |= 1 << (row * PATTERN_COLS + col)
+    return mask
+
+def bitmask_pattern(mask):
+    return [[(mask >> (row * PATTERN_COLS + col)) & 1 for col in range(PATTERN_COLS)] for row in range(PATTERN_ROWS)]
+
+def to_plotter(strokes, origin_x, origin_y, matrix):
+    """Map pattern-space strokes onto the paper through matrix ((a, b, c), (d, e, f)),
+    with the tile's top-left at the origin"""
+    (a, b, c), (d, e, f) = matrix
+    return [[(origin_x + a * x + b * y + c, origin_y + d * x + e * y + f) for x, y in s] for s in strokes]
+
+def pixel_runs(pixels):
+    """Merge horizontally adjacent pixels into (y, x_start, x_end) runs, x_end exclusive"""
+    runs = []
+    for y in sorted({py for _, py in pixels}):
+        xs = sorted(px for px, py in pixels if py == y)
+        start = prev = xs[0]
+        for px in xs[1:]:
+            if px != prev + 1:
+                runs.append((y, start, prev + 1))
+                start = px
+            prev = px
+        runs.append((y, start, prev + 1))
+    return runs
+
+def hatch_run(run, from_left, spacing=HATCH_SPACING):
+    """Zig-zag over one run from its bottom edge to its top edge"""
+    y, x0, x1 = run
+    lines = int(round(1 / spacing)) + 1
+    near, far = (x0, x1) if from_left else (x1, x0)
+    points = []
+    for i in range(lines):
+        ly = y + i * spacing
+        a, b = (near, far) if i % 2 == 0 else (far, near)
+        points.append((a, ly))
+        points.append((b, ly))
+    return points
+
+def serpentine_strokes(runs, spacing=HATCH_SPACING):
+    """Chain runs in consecutive rows that overlap into continuous pen-down strokes"""
+    remaining = sorted(runs)
+    strokes = []
+    while remaining:
+        run = remaining.pop(0)
+        stroke = hatch_run(run, True, spacing)
+        while True:
+            end_x, end_y = stroke[-1]
+            _, x0, x1 = run
+            nxt = None
+            for cand in remaining:
+                # The shared edge is inked when the two runs overlap
+                if cand[0] == end_y and cand[1] < x1 and cand[2] > x0:
+                    nxt = cand
+                    break
+            if nxt is None:
+                break
+            remaining.remove(nxt)
+            from_left = abs(nxt[1] - end_x) <= abs(nxt[2] - end_x)
+            stroke.extend(hatch_run(nxt, from_left, spacing))
+            run = nxt
+        strokes.append(dedupe(stroke))
+    return strokes
+
+def dedupe(stroke):
+    out = [stroke[0]]
+    for p in stroke[1:]:
+        if p != out[-1]:
+            out.append(p)
+    return out
+
+# --- Stroke ordering ---
+def order_strokes(strokes, start, end=None):
+    """Order and orient strokes to minimise pen-up travel (see blot_route.optimize)"""
+    return blot_route.optimize(strokes, start, end)
+
+# --- Tile planning ---
+def tile_strokes(pattern, mode=DEFAULT_MODE):
+    """Unordered pen-down strokes that fill a 5x6 pattern, in pattern space"""
+    if mode not in QUALITY_MODES:
+        raise ValueError(f"Unknown fill mode: {mode}")
+    pixels = pattern_pixels(pattern)
+    if not pixels:
+        return []
+    strokes = serpentine_strokes(pixel_runs(pixels))
+    if mode == 'double':
+        # Retrace each stroke back to its start without lifting the pen
+        strokes = [s + s[-2::-1] for s in strokes]
+    elif mode == 'crosshatch':
+        # Hatch again along columns by planning in transposed space
+        flipped = {(py, px) for px, py in pixels}
+        strokes += [[(x, y) for y, x in s] for s in serpentine_strokes(pixel_runs(flipped))]
+    return strokes
+
+def plan_tile(pattern, origin_x, origin_y, matrix, mode=DEFAULT_MODE, start=(0, 0), end=None):
+    """Ordered pen-down strokes that fill a 5x6 pattern with its top-left at the origin"""
+    strokes = to_plotter(tile_strokes(pattern, mode), origin_x, origin_y, matrix)
+    return order_strokes(strokes, start, end)
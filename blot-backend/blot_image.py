@@ -0,0 +1,201 @@
+"""Turn an image into a 108x50 mosaic bitmap, and optionally send it to the backend.
+
+Usage: python blot_image.py IMAGE [--dither floyd-steinberg|ordered|threshold]
+                                  [--mode single|double|crosshatch] [--post URL]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+import blot_route
+from blot_mosaic import MOSAIC_COLS, MOSAIC_ROWS, TILE_COUNT, canvas_to_masks
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DITHERS = ('floyd-steinberg', 'ordered', 'threshold')
+DEFAULT_DITHER = 'floyd-steinberg'
+# 4x4 Bayer matrix; (value + 0.5) / 16 is the ink threshold at each position
+BAYER_4 = np.array([[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]])
+# Error shares pushed to the (dy, dx) neighbours, left-to-right rows
+FLOYD_STEINBERG = ((0, 1, 7 / 16), (1, -1, 3 / 16), (1, 0, 5 / 16), (1, 1, 1 / 16))
+
+
+# --- Image to darkness ---
+def load_image(source):
+    """Darkness in [0, 1] (1 = black) of an image path, file object or bytes; transparency is white"""
+    if Image is None:
+        raise RuntimeError("Image import needs Pillow: pip install pillow")
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with Image.open(source) as im:
+        im = im.convert('RGBA')
+        white = Image.new('RGBA', im.size, (255, 255, 255, 255))
+        gray = np.asarray(Image.alpha_composite(white, im).convert('L'), dtype=float) / 255
+    return 1 - gray
+
+def crop_to_aspect(a, rows=MOSAIC_ROWS, cols=MOSAIC_COLS):
+    """Centre crop of a 2D array to the mosaic's aspect ratio"""
+    h, w = a.shape
+    if w * rows > h * cols:
+        keep = max(round(h * cols / rows), 1)
+        left = (w - keep) // 2
+        return a[:, left:left + keep]
+    keep = max(round(w * rows / cols), 1)
+    top = (h - keep) // 2
+    return a[top:top + keep]
+
+def _bin_means(a, n, axis):
+    # Mean of each of n near-equal bins along axis; inputs smaller than n are repeated first
+    size = a.shape[axis]
+    if size < n:
+        a = np.repeat(a, -(-n // size), axis=axis)
+        size = a.shape[axis]
+    edges = np.arange(n) * size // n
+    counts = np.diff(np.append(edges, size))
+    shape = [1, 1]
+    shape[axis] = n
+    return np.add.reduceat(a, edges, axis=axis) / counts.reshape(shape)
+
+def downsample(darkness, rows=MOSAIC_ROWS, cols=MOSAIC_COLS):
+    """Area-average a darkness array down to rows x cols after cropping it to that aspect"""
+    a = crop_to_aspect(np.asarray(darkness, dtype=float), rows, cols)
+    return _bin_means(_bin_means(a, rows, 0), cols, 1)
+
+def autocontrast(darkness):
+    lo, hi = darkness.min(), darkness.max()
+    return (darkness - lo) / (hi - lo) if hi > lo else darkness
+
+# --- Dithering (True = ink) ---
+def dither_threshold(darkness):
+    return darkness >= 0.5
+
+def dither_ordered(darkness):
+    rows, cols = darkness.shape
+    thresholds = (np.tile(BAYER_4, (-(-rows // 4), -(-cols // 4)))[:rows, :cols] + 0.5) / 16
+    return darkness > thresholds
+
+def dither_floyd_steinberg(darkness):
+    """Error diffusion on serpentine rows, so errors do not all drift one way"""
+    a = np.array(darkness, dtype=float)
+    rows, cols = a.shape
+    ink = np.zeros(a.shape, dtype=bool)
+    for y in range(rows):
+        step = 1 if y % 2 == 0 else -1
+        for x in range(0, cols) if step == 1 else range(cols - 1, -1, -1):
+            ink[y, x] = a[y, x] >= 0.5
+            error = a[y, x] - ink[y, x]
+            for dy, dx, share in FLOYD_STEINBERG:
+                ny, nx = y + dy, x + dx * step
+                if ny < rows and 0 <= nx < cols:
+                    a[ny, nx] += error * share
+    return ink
+
+def dither(darkness, method=DEFAULT_DITHER):
+    if method == 'floyd-steinberg':
+        return dither_floyd_steinberg(darkness)
+    if method == 'ordered':
+        return dither_ordered(darkness)
+    if method == 'threshold':
+        return dither_threshold(darkness)
+    raise ValueError(f"Unknown dither: {method}")
+
+def image_canvas(source, method=DEFAULT_DITHER):
+    """(MOSAIC_ROWS, MOSAIC_COLS) bool ink bitmap of an image"""
+    return dither(autocontrast(downsample(load_image(source))), method)
+
+def preview(canvas):
+    return '\n'.join(''.join('#' if v else '.' for v in row) for row in canvas)
+
+# --- Plan ---
+def order_tiles(ends, start, end=None):
+    """Tiles in plotting order: ends maps tile -> (first, last) point of its placed strokes.
+
+    Each tile's strokes run between those two points, so routing them like
+    strokes (blot_route.optimize) gives one travel-optimized pass over the
+    whole canvas rather than 180 independent ones.
+    """
+    # Each point carries its tile id, so tiles with the same ends stay apart and come back by id
+    strokes = [[(a[0], a[1], tile), (b[0], b[1], tile)] for tile, (a, b) in ends.items()]
+    return [s[0][2] for s in blot_route.optimize(strokes, start, end)]
+
+
+class ImportRun:
+    """One image import (or diff plot) streamed to the plotter a tile at a time"""
+
+    def __init__(self, run_id, masks, mode, kind='image'):
+        self.id = run_id
+        self.kind = kind
+        self.masks = np.asarray(masks, dtype=np.uint32)
+        self.mode = mode
+        self.order = []
+        self.estimates = {}
+        self.done = []
+        self.skipped = []
+        self.reserved = []
+        self.clipped = []
+        self.status = 'queued'
+        self.error = None
+        self.job = None
+        self.cancelled = threading.Event()
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        remaining = [t for t in self.order if t not in self.done and t not in self.skipped and t not in self.reserved]
+        total = len(self.order)
+        finished = total - len(remaining)
+        return {"id": self.id, "kind": self.kind, "status": self.status, "mode": self.mode, "tiles_total": total,
+                "tiles_done": len(self.done), "tiles_skipped": len(self.skipped), "tiles_reserved": self.reserved,
+                "tiles_clipped": self.clipped,
+                "progress": round(finished / total, 3) if total else 1.0,
+                "eta_seconds": round(sum(self.estimates.get(t, 0.0) for t in remaining), 1),
+                "current_job": self.job.id if self.job is not None and self.status == 'running' else None,
+                "error": self.error, "created_at": self.created_at, "finished_at": self.finished_at}
+
+    # --- Persistence, for resuming after a restart ---
+    def save(self, path):
+        with open(path + '.tmp', 'w') as f:
+            json.dump({"id": self.id, "kind": self.kind, "mode": self.mode,
+                       "masks": [int(m) for m in self.masks]}, f)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if len(data["masks"]) != TILE_COUNT:
+            raise ValueError(f"{path} does not hold {TILE_COUNT} tiles")
+        return cls(data["id"], data["masks"], data["mode"], data.get("kind", 'image'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('image')
+    parser.add_argument('--dither', choices=DITHERS, default=DEFAULT_DITHER)
+    parser.add_argument('--mode', default='single')
+    parser.add_argument('--post', metavar='URL', help="backend to send it to, e.g. http://localhost:5000")
+    args = parser.parse_args()
+
+    canvas = image_canvas(args.image, args.dither)
+    print(preview(canvas))
+    masks = canvas_to_masks(canvas)
+    print(f"{int(canvas.sum())} of {canvas.size} pixels inked, {int(np.count_nonzero(masks))} of {TILE_COUNT} tiles")
+    if args.post:
+        body = json.dumps({"pixels": canvas.astype(int).tolist(), "mode": args.mode}).encode()
+        req = urllib.request.Request(args.post.rstrip('/') + '/mosaic/import', body,
+                                     {"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req) as resp:
+                print(resp.read().decode())
+        except urllib.error.HTTPError as e:
+            print(f"{e.code}: {e.read().decode()}")
+            sys.exit(1)
@@ -0,0 +1,195 @@
+import numpy as np
+import blot_route
+from blot_protocol import PEN_UP_PULSE, PEN_DOWN_PULSE
+
+# Reachable area of the Blot, in plotter units
+WORKSPACE = (0.0, 0.0, 125.0, 125.0)
+
+
+class Drawing:
+    """Pen-down polylines packed into one (n, 2) float array.
+
+    Stroke i is points[starts[i]:starts[i + 1]]. Keeping every point in a
+    single array lets transforms, clipping and measurements run as NumPy
+    operations over the whole drawing instead of one go() at a time.
+    """
+
+    def __init__(self, strokes=()):
+        arrays = [np.asarray(s, dtype=float).reshape(-1, 2) for s in strokes]
+        arrays = [a for a in arrays if len(a)]
+        lengths = [len(a) for a in arrays]
+        self.points = np.concatenate(arrays) if arrays else np.empty((0, 2))
+        self.starts = np.concatenate(([0], np.cumsum(lengths, dtype=int))).astype(int)
+
+    @classmethod
+    def packed(cls, points, starts):
+        d = cls()
+        d.points = points
+        d.starts = starts
+        return d
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __add__(self, other):
+        return Drawing.packed(np.concatenate((self.points, other.points)),
+                              np.concatenate((self.starts[:-1], other.starts + len(self.points))))
+
+    def strokes(self):
+        return [self.points[a:b] for a, b in zip(self.starts[:-1], self.starts[1:])]
+
+    def reversed(self):
+        """The same strokes drawn backwards, last stroke first"""
+        return Drawing.packed(self.points[::-1].copy(), len(self.points) - self.starts[::-1])
+
+    def copy(self):
+        return Drawing.packed(self.points.copy(), self.starts.copy())
+
+    # --- Transforms ---
+    def transform(self, matrix):
+        """Apply a 2x3 (or 3x3) affine matrix to every point at once"""
+        m = np.asarray(matrix, dtype=float)
+        return Drawing.packed(self.points @ m[:2, :2].T + m[:2, 2], self.starts.copy())
+
+    def translate(self, dx, dy):
+        return Drawing.packed(self.points + (dx, dy), self.starts.copy())
+
+    def scale(self, sx, sy=None):
+        return self.transform(scale(sx, sy))
+
+    # --- Measurements ---
+    def segment_mask(self):
+        """True for consecutive point pairs that belong to the same stroke"""
+        mask = np.ones(max(len(self.points) - 1, 0), dtype=bool)
+        inner = self.starts[1:-1]
+        mask[inner[inner > 0] - 1] = False
+        return mask
+
+    def ink_length(self):
+        steps = np.hypot(*np.diff(self.points, axis=0).T) if len(self.points) > 1 else np.empty(0)
+        return float(steps[self.segment_mask()].sum())
+
+    def bounds(self):
+        if not len(self.points):
+            return None
+        lo, hi = self.points.min(axis=0), self.points.max(axis=0)
+        return (float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1]))
+
+    def inside(self, bounds=WORKSPACE):
+        """True if every point lies within the (x0, y0, x1, y1) rectangle"""
+        x0, y0, x1, y1 = bounds
+        return bool(((self.points >= (x0, y0)) & (self.points <= (x1, y1))).all())
+
+    # --- Encoding ---
+    def to_commands(self):
+        """Command tuples (see blot_protocol) that plot the strokes in order"""
+        cmds = []
+        for stroke in self.strokes():
+            pts = [(float(x), float(y)) for x, y in stroke]
+            cmds.append(('go',) + pts[0])
+            cmds.append(('servo', PEN_DOWN_PULSE))
+            if len(pts) > 2:
+                cmds.append(('path', pts[1:]))
+            elif len(pts) == 2:
+                cmds.append(('go',) + pts[1])
+            cmds.append(('servo', PEN_UP_PULSE))
+        return cmds
+
+
+# --- Affine matrices ---
+def translation(dx, dy):
+    return np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], dtype=float)
+
+def scale(sx, sy=None):
+    return np.array([[sx, 0, 0], [0, sx if sy is None else sy, 0], [0, 0, 1]], dtype=float)
+
+def rotation(degrees):
+    t = np.radians(degrees)
+    c, s = np.cos(t), np.sin(t)
+    return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]], dtype=float)
+
+def compose(*matrices):
+    """Matrix applying the given transforms left to right"""
+    out = np.eye(3)
+    for m in matrices:
+        out = np.asarray(m, dtype=float) @ out
+    return out
+
+
+# --- Passes ---
+def clip(drawing, bounds=WORKSPACE):
+    """Cut strokes to the workspace rectangle (Liang-Barsky over all segments at once)"""
+    if not len(drawing.points):
+        return drawing
+    x0, y0, x1, y1 = bounds
+    inside = ((drawing.points >= (x0, y0)) & (drawing.points <= (x1, y1))).all(axis=1)
+    if inside.all():
+        return drawing
+    a, b = drawing.points[:-1], drawing.points[1:]
+    d = b - a
+    t0 = np.zeros(len(a))
+    t1 = np.ones(len(a))
+    keep = drawing.segment_mask()
+    for p, q in ((-d[:, 0], a[:, 0] - x0), (d[:, 0], x1 - a[:, 0]),
+                 (-d[:, 1], a[:, 1] - y0), (d[:, 1], y1 - a[:, 1])):
+        parallel = p == 0
+        keep &= ~(parallel & (q < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.where(parallel, 0.0, q / np.where(parallel, 1.0, p))
+        t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+        t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+    keep &= t0 <= t1
+    ca = a + d * t0[:, None]
+    cb = a + d * t1[:, None]
+    # Rejoin clipped segments into polylines wherever they still touch
+    strokes = []
+    current = None
+    for i in np.flatnonzero(keep):
+        p, q = ca[i], cb[i]
+        if current is not None and last_index == i - 1 and np.allclose(current[-1], p):
+            current.append(q)
+        else:
+            current = [p, q]
+            strokes.append(current)
+        last_index = i
+    # Single-point strokes (dots) survive only when inside
+    lengths = np.diff(drawing.starts)
+    for s in np.flatnonzero(lengths == 1):
+        if inside[drawing.starts[s]]:
+            strokes.append([drawing.points[drawing.starts[s]]])
+    return Drawing(strokes)
+
+def drop_empty(drawing, min_length=1e-6):
+    """Remove repeated points, so zero-length moves never reach the plotter"""
+    strokes = []
+    for stroke in drawing.strokes():
+        if len(stroke) > 1:
+            keep = np.ones(len(stroke), dtype=bool)
+            keep[1:] = np.hypot(*np.diff(stroke, axis=0).T) > min_length
+            stroke = stroke[keep]
+        strokes.append(stroke)
+    return Drawing(strokes)
+
+def run_passes(drawing, passes):
+    for p in passes:
+        drawing = p(drawing)
+    return drawing
+
+def orient(start):
+    """Pass factory for drawings already ordered (e.g. cached): run it forwards or backwards, whichever starts nearer"""
+    def orient_pass(drawing):
+        if not len(drawing):
+            return drawing
+        first = drawing.points[0]
+        last = drawing.points[-1]
+        if np.hypot(*(last - start)) < np.hypot(*(first - start)):
+            return drawing.reversed()
+        return drawing
+    return orient_pass
+
+def order(start, end=None):
+    """Pass factory: reorder, flip and rotate strokes to cut pen-up travel from start (to end)"""
+    def order_pass(drawing):
+        strokes = [[tuple(p) for p in s.tolist()] for s in drawing.strokes()]
+        return Drawing(blot_route.optimize(strokes, start, end))
+    return order_pass
@@ -0,0 +1,182 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+# Lower runs first; jobs with equal priority run in submission order
+PRIORITY_GAME = 0
+PRIORITY_MOSAIC = 10
+# Finished jobs remembered for status queries
+HISTORY = 200
+
+
+class Job:
+    def __init__(self, job_id, name, build, priority, estimate=None, not_before=0.0):
+        self.id = job_id
+        self.name = name
+        # Called by the worker when the job starts, so it plans from where the pen really is
+        self.build = build
+        self.priority = priority
+        # Expected plot seconds, for ETAs; frames are filled in by run() once they are queued
+        self.estimate = estimate
+        # Expected command count, for queue depth; set by whoever submits the job
+        self.commands = None
+        self.frames = None
+        self.frames_base = None
+        # time.time() before which the job is held back, e.g. while a batch fills up
+        self.not_before = not_before
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "priority": self.priority, "status": self.status,
+                "estimate_seconds": None if self.estimate is None else round(self.estimate, 1),
+                "commands": self.commands,
+                "created_at": self.created_at, "started_at": self.started_at,
+                "finished_at": self.finished_at, "result": self.result, "error": self.error}
+
+
+class JobScheduler:
+    """Runs whole drawing jobs one at a time, highest priority first.
+
+    submit() returns a Job immediately. A single worker thread pops the
+    most urgent queued job, calls run(job) and only then takes the next, so
+    the commands of two jobs never interleave on serial_queue. Queued jobs
+    can be cancelled or given a new priority; the running one finishes. A
+    job submitted with a delay is held back that long while others run.
+    on_change(job), if given, is called after every status change.
+    """
+
+    def __init__(self, run, on_change=None):
+        self.run = run
+        self.on_change = on_change
+        self.heap = []
+        self.jobs = OrderedDict()
+        self.counter = itertools.count()
+        self.ids = itertools.count(1)
+        self.cond = threading.Condition()
+        self.current = None
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, name, build, priority=PRIORITY_MOSAIC, estimate=None, delay=0.0):
+        with self.cond:
+            job = Job(next(self.ids), name, build, priority, estimate, time.time() + delay)
+            self.jobs[job.id] = job
+            heapq.heappush(self.heap, (priority, next(self.counter), job))
+            self._trim()
+            self.cond.notify_all()
+        self._changed(job)
+        return job
+
+    def get(self, job_id):
+        with self.cond:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued job; returns False if it is unknown or already running or finished"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return False
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            job.done.set()
+            self.cond.notify_all()
+        self._changed(job)
+        return True
+
+    def reprioritize(self, job_id, priority):
+        """Move a queued job to another priority, behind jobs already waiting there"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return False
+            job.priority = priority
+            # The old heap entry is skipped when popped because its priority no longer matches
+            heapq.heappush(self.heap, (priority, next(self.counter), job))
+        self._changed(job)
+        return True
+
+    def queued(self):
+        """Queued jobs in the order they will run"""
+        with self.cond:
+            live = [(p, c, job) for p, c, job in self.heap if job.status == 'queued' and job.priority == p]
+        # A job moved away and back has two live entries; the earlier one is the one popped
+        seen = set()
+        return [job for _, _, job in sorted(live) if not (job.id in seen or seen.add(job.id))]
+
+    def ahead_of(self, job):
+        """Queued jobs that will run before job"""
+        queued = self.queued()
+        return queued[:queued.index(job)] if job in queued else []
+
+    def _changed(self, job):
+        if self.on_change is not None:
+            try:
+                self.on_change(job)
+            except Exception as e:
+                print(f"[blot_jobs] on_change failed for job {job.id}: {e}")
+
+    def _trim(self):
+        # Called with self.cond held: forget the oldest finished jobs
+        finished = [i for i, job in self.jobs.items() if job.done.is_set()]
+        for job_id in finished[:max(len(finished) - HISTORY, 0)]:
+            del self.jobs[job_id]
+
+    def _next(self):
+        # Called with self.cond held; returns (job or None, seconds until a held job is due or None)
+        now = time.time()
+        held = []
+        job = None
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            priority, _, candidate = entry
+            if candidate.status != 'queued' or candidate.priority != priority:
+                continue
+            if candidate.not_before > now:
+                held.append(entry)
+                continue
+            job = candidate
+            break
+        for entry in held:
+            heapq.heappush(self.heap, entry)
+        due = min((entry[2].not_before - now for entry in held), default=None)
+        return job, due
+
+    def _worker(self):
+        while self.running:
+            with self.cond:
+                job, due = self._next()
+                while job is None:
+                    self.cond.wait(due)
+                    job, due = self._next()
+                job.status = 'running'
+                job.started_at = time.time()
+                self.current = job
+            self._changed(job)
+            try:
+                job.result = self.run(job)
+                job.status = 'done'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+                print(f"[blot_jobs] job {job.id} ({job.name}) failed: {e}")
+            with self.cond:
+                job.finished_at = time.time()
+                self.current = None
+                job.done.set()
+                self.cond.notify_all()
+            self._changed(job)
@@ -0,0 +1,243 @@
+import threading
+import time
+from collections import OrderedDict
+from queue import Empty
+from cobs import cobs
+from blot_protocol import ProtocolV1
+
+# --- Flow control defaults ---
+WINDOW = 8            # frames sent but not yet acked
+ACK_TIMEOUT = 5.0     # s the oldest in-flight frame may wait for its ack
+MAX_RETRIES = 3       # retransmissions before a frame is given up on
+
+# --- Write coalescing defaults ---
+MAX_BATCH = 16         # frames gathered into a single ser.write
+FLUSH_LATENCY = 0.005  # s to wait for more frames before writing a partial batch
+
+
+class InFlight:
+    def __init__(self, frame, sent_at):
+        self.frame = frame
+        self.sent_at = sent_at
+        self.retries = 0
+
+
+class BlotLink:
+    """Windowed, acknowledged transport between serial_queue and the Blot.
+
+    The writer thread takes (seq, frame) items off the queue while fewer than
+    `window` frames are unacknowledged, coalescing up to `max_batch` of them
+    (waiting at most `flush_latency` for stragglers) into a single write.
+    The reader thread decodes the frames the firmware sends back. The
+    firmware executes frames in order and acks after each one, so an ack
+    for a sequence byte retires that frame and every frame sent before it:
+    their own acks were lost, not the frames. Only the oldest in-flight
+    frame runs a timer, and it is written again only when nothing after it
+    has been acked, so a replay never lands behind later commands. A
+    replayed v1 frame may still run twice (a servo change repeated after a
+    lost ack); v2 firmware drops repeated sequence numbers (see
+    blot_protocol). A corrupt reply is counted and left to the timer, since
+    the frames after it may already be running.
+    """
+
+    def __init__(self, ser, queue, window=WINDOW, ack_timeout=ACK_TIMEOUT, max_retries=MAX_RETRIES, acks=True,
+                 max_batch=MAX_BATCH, flush_latency=FLUSH_LATENCY, decode=None, on_resync=None):
+        if not 1 <= window <= 127:
+            raise ValueError("Window must fit in half the 8-bit sequence space")
+        self.ser = ser
+        self.queue = queue
+        self.window = window
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        # Without acks (older firmware) frames are written blindly, as before
+        self.acks = acks
+        self.max_batch = max_batch
+        # Turns a COBS-decoded reply into (event, payload, seq) for the negotiated protocol
+        self.decode = decode or ProtocolV1().decode
+        self.flush_latency = flush_latency
+        # Called when a frame is re-sent or given up on, since the plotter's state is then uncertain
+        self.on_resync = on_resync
+        self.in_flight = OrderedDict()
+        self.acked = set()
+        self.cond = threading.Condition()
+        self.last_ack_at = time.monotonic()
+        self.write_lock = threading.Lock()
+        self.running = False
+        self.stats = {"sent": 0, "acked": 0, "retransmits": 0, "corrupt": 0, "dropped": 0,
+                      "writes": 0, "bytes": 0}
+        self.started_at = time.monotonic()
+
+    def start(self):
+        self.running = True
+        self.started_at = time.monotonic()
+        threading.Thread(target=self._writer, daemon=True).start()
+        if self.acks:
+            threading.Thread(target=self._reader, daemon=True).start()
+
+    # --- Waiting for the plotter ---
+    def wait_for(self, seq, timeout=None):
+        """Block until the frame carrying seq has been acked (or given up on)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while seq not in self.acked:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def wait_idle(self, timeout=None):
+        """Block until everything queued so far has been written and acked"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self.queue.unfinished_tasks or self.in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining if remaining is not None else 0.1)
+        return True
+
+    def completed(self):
+        """Frames the plotter is done with: acked or given up on, or just written without acks"""
+        with self.cond:
+            if self.acks:
+                return self.stats["acked"] + self.stats["dropped"]
+            return self.stats["sent"]
+
+    # --- Writer ---
+    def _write(self, frame):
+        with self.write_lock:
+            self.ser.write(frame)
+            self.stats["writes"] += 1
+            self.stats["bytes"] += len(frame)
+
+    def _gather(self, first, limit):
+        """Collect up to limit queued items, waiting at most flush_latency for stragglers"""
+        batch = [first]
+        deadline = time.monotonic() + self.flush_latency
+        while len(batch) < limit and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _writer(self):
+        buf = bytearray()
+        while self.running:
+            with self.cond:
+                while self.acks and len(self.in_flight) >= self.window:
+                    self._check_timeout()
+                    self.cond.wait(0.05)
+                self._check_timeout()
+                room = self.window - len(self.in_flight) if self.acks else self.max_batch
+            try:
+                first = self.queue.get(timeout=0.05)
+            except Empty:
+                continue
+            batch = self._gather(first, min(room, self.max_batch))
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            buf.clear()
+            now = time.monotonic()
+            with self.cond:
+                for seq, frame in batch:
+                    buf.extend(frame)
+                    if self.acks:
+                        self.acked.discard(seq)
+                        if not self.in_flight:
+                            self.last_ack_at = now
+                        self.in_flight[seq] = InFlight(frame, now)
+                self.stats["sent"] += len(batch)
+            if buf:
+                # One write per batch: one syscall and fewer, fuller USB packets
+                self._write(bytes(buf))
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+            if stop:
+                self.running = False
+
+    def snapshot(self):
+        """Counters plus derived frames per write and bytes per second"""
+        with self.write_lock:
+            stats = dict(self.stats)
+        elapsed = time.monotonic() - self.started_at
+        stats["frames_per_write"] = round(stats["sent"] / stats["writes"], 2) if stats["writes"] else 0.0
+        stats["bytes_per_sec"] = round(stats["bytes"] / elapsed, 1) if elapsed > 0 else 0.0
+        stats["in_flight"] = len(self.in_flight)
+        stats["queued"] = self.queue.qsize()
+        return stats
+
+    def _check_timeout(self):
+        # Called with self.cond held
+        if not self.in_flight:
+            return
+        seq, entry = next(iter(self.in_flight.items()))
+        started = max(entry.sent_at, self.last_ack_at)
+        if time.monotonic() - started >= self.ack_timeout:
+            self._retransmit(seq, entry)
+
+    def _retransmit(self, seq, entry):
+        # Called with self.cond held
+        if entry.retries >= self.max_retries:
+            print(f"[blot_link] giving up on frame {seq} after {entry.retries} retries")
+            self._resync()
+            del self.in_flight[seq]
+            self.acked.add(seq)
+            self.stats["dropped"] += 1
+            self.last_ack_at = time.monotonic()
+            self.cond.notify_all()
+            return
+        entry.retries += 1
+        entry.sent_at = time.monotonic()
+        self.stats["retransmits"] += 1
+        self._resync()
+        self._write(entry.frame)
+
+    def _resync(self):
+        if self.on_resync is not None:
+            self.on_resync()
+
+    # --- Reader ---
+    def _reader(self):
+        buf = bytearray()
+        while self.running:
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+            if not chunk:
+                with self.cond:
+                    self._check_timeout()
+                continue
+            buf.extend(chunk)
+            while b'\x00' in buf:
+                end = buf.index(b'\x00')
+                raw = bytes(buf[:end])
+                del buf[:end + 1]
+                if raw:
+                    self._handle(raw)
+
+    def _handle(self, raw):
+        try:
+            event, _, seq = self.decode(raw)
+        except (cobs.DecodeError, IndexError, ValueError, UnicodeDecodeError):
+            with self.cond:
+                self.stats["corrupt"] += 1
+            return
+        if event != 'ack':
+            return
+        with self.cond:
+            if seq not in self.in_flight:
+                return
+            # Frames run in order, so everything sent before seq has run too
+            while True:
+                done, _ = self.in_flight.popitem(last=False)
+                self.acked.add(done)
+                self.stats["acked"] += 1
+                if done == seq:
+                    break
+            self.last_ack_at = time.monotonic()
+            self.cond.notify_all()
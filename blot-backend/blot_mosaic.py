@@ -0,0 +1,241 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+import blot_fill
+
+# The mosaic is MOSAIC_COLS x MOSAIC_ROWS pixels in pattern space, split into 6x5 tiles
+MOSAIC_COLS = 108
+MOSAIC_ROWS = 50
+TILE_COLS = blot_fill.PATTERN_COLS
+TILE_ROWS = blot_fill.PATTERN_ROWS
+TILES_X = MOSAIC_COLS // TILE_COLS
+TILES_Y = MOSAIC_ROWS // TILE_ROWS
+TILE_COUNT = TILES_X * TILES_Y
+TILE_PIXELS = TILE_COLS * TILE_ROWS
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+CANVAS_PATH = os.path.join(_HERE, 'mosaic_canvas.bin')
+LOG_PATH = os.path.join(_HERE, 'mosaic_log.bin')
+
+# Canvas file: header, then one uint32 per tile holding its pixel bitmask (blot_fill.pattern_bitmask)
+CANVAS_MAGIC = b'MOS1'
+CANVAS_HEADER = struct.Struct('<4sHH')
+TILE_SLOT = struct.Struct('<I')
+CANVAS_SIZE = CANVAS_HEADER.size + TILE_COUNT * TILE_SLOT.size
+# Log record: submission id, time, tile, bitmask, mode, status; a status change appends a new record
+LOG_RECORD = struct.Struct('<IdHIBB')
+MODES = blot_fill.QUALITY_MODES
+STATUSES = ('queued', 'running', 'done', 'cancelled', 'failed')
+
+
+# --- Tile addressing ---
+# Tile i is column i % TILES_X, row i // TILES_X of the tile grid. Its pixel
+# (row, col) is canvas pixel (ty * TILE_ROWS + row, tx * TILE_COLS + col), and
+# its top-left pixel is at mosaic offset (tx * TILE_COLS, ty * TILE_ROWS), the
+# x/y that /draw-pixel-art-square takes.
+def tile_offset(index):
+    ty, tx = divmod(index, TILES_X)
+    return tx * TILE_COLS, ty * TILE_ROWS
+
+# --- On paper ---
+# The space right of the grid is 50 units wide and 108 tall, so the mosaic is
+# plotted a quarter turn from how it is drawn on screen: mosaic point (x, y)
+# lands at (y, x) from mosaic_origin, 10 tiles across and 18 down.
+TILE_TO_PLOTTER = ((0, 1, 0), (1, 0, 0))
+PLOT_WIDTH = MOSAIC_ROWS
+PLOT_HEIGHT = MOSAIC_COLS
+
+def plot_offset(x, y):
+    """Plotter offset from mosaic_origin of mosaic point (x, y)"""
+    return y, x
+
+def tile_rect(index):
+    """(left, top, right, bottom) plotter offsets a tile covers"""
+    left, top = plot_offset(*tile_offset(index))
+    return left, top, left + TILE_ROWS, top + TILE_COLS
+
+def tile_at(x, y):
+    """Tile plotted at offset (x, y), or None if that is not a tile's corner"""
+    if x % TILE_COLS or y % TILE_ROWS:
+        return None
+    tx, ty = x // TILE_COLS, y // TILE_ROWS
+    if not (0 <= tx < TILES_X and 0 <= ty < TILES_Y):
+        return None
+    return ty * TILES_X + tx
+
+def masks_to_canvas(masks):
+    """(MOSAIC_ROWS, MOSAIC_COLS) bool array from TILE_COUNT tile bitmasks"""
+    bits = (np.asarray(masks, dtype=np.uint32)[:, None] >> np.arange(TILE_PIXELS, dtype=np.uint32)) & 1
+    return (bits.reshape(TILES_Y, TILES_X, TILE_ROWS, TILE_COLS)
+                .transpose(0, 2, 1, 3).reshape(MOSAIC_ROWS, MOSAIC_COLS).astype(bool))
+
+def canvas_to_masks(canvas):
+    """TILE_COUNT tile bitmasks from a (MOSAIC_ROWS, MOSAIC_COLS) array"""
+    tiles = (np.asarray(canvas, dtype=bool).reshape(TILES_Y, TILE_ROWS, TILES_X, TILE_COLS)
+                                           .transpose(0, 2, 1, 3).reshape(TILE_COUNT, TILE_PIXELS))
+    return tiles.astype(np.uint32) @ (np.uint32(1) << np.arange(TILE_PIXELS, dtype=np.uint32))
+
+def diff(inked, target):
+    """(to_plot, unplottable) bool arrays: pixels target adds, and inked pixels target wants blank"""
+    changed = np.logical_xor(inked, target)
+    return changed & target, changed & inked
+
+
+class MosaicStore:
+    """The mosaic as the backend knows it: what is inked on paper, and every submission.
+
+    The canvas is a small fixed-size file mapped with mmap, one 30-bit
+    mask per tile, so reading or inking a tile is one 4-byte access and a
+    restart just maps the file again. Ink only accumulates: a tile's mask
+    is OR-ed in once its job is done. The log is append-only fixed-size
+    records, one per submission and one per status change, replayed at
+    start to know each submission's latest status; if the canvas file is
+    missing it is rebuilt from the log's finished submissions.
+    """
+
+    def __init__(self, canvas_path=CANVAS_PATH, log_path=LOG_PATH):
+        self.canvas_path = canvas_path
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        # submission id -> (time, tile, mask, mode, status) as of its last record
+        self.submissions = {}
+        self.by_tile = {}
+        fresh = not os.path.exists(canvas_path) or os.path.getsize(canvas_path) != CANVAS_SIZE
+        if fresh:
+            with open(canvas_path, 'wb') as f:
+                f.write(CANVAS_HEADER.pack(CANVAS_MAGIC, MOSAIC_COLS, MOSAIC_ROWS))
+                f.write(bytes(CANVAS_SIZE - CANVAS_HEADER.size))
+        self.file = open(canvas_path, 'r+b')
+        self.mm = mmap.mmap(self.file.fileno(), CANVAS_SIZE)
+        magic, cols, rows = CANVAS_HEADER.unpack_from(self.mm, 0)
+        if (magic, cols, rows) != (CANVAS_MAGIC, MOSAIC_COLS, MOSAIC_ROWS):
+            raise ValueError(f"{canvas_path} is not a {MOSAIC_COLS}x{MOSAIC_ROWS} mosaic canvas")
+        self._replay(rebuild=fresh)
+        self.log = open(log_path, 'ab')
+        self.next_id = max(self.submissions, default=0) + 1
+
+    def _replay(self, rebuild):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % LOG_RECORD.size
+        for sub_id, t, tile, mask, mode, status in LOG_RECORD.iter_unpack(data[:usable]):
+            self.submissions[sub_id] = (t, tile, mask, MODES[mode], STATUSES[status])
+            self.by_tile.setdefault(tile, []).append(sub_id)
+            if rebuild and STATUSES[status] == 'done':
+                self._ink(tile, mask)
+        if usable != len(data):
+            # A record cut short by a crash; drop it so new records stay aligned
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(usable)
+        for ids in self.by_tile.values():
+            ids[:] = sorted(set(ids))
+
+    def _offset(self, tile):
+        if not 0 <= tile < TILE_COUNT:
+            raise IndexError(f"Tile {tile} is outside the {TILES_X}x{TILES_Y} mosaic")
+        return CANVAS_HEADER.size + tile * TILE_SLOT.size
+
+    def _ink(self, tile, mask):
+        offset = self._offset(tile)
+        TILE_SLOT.pack_into(self.mm, offset, TILE_SLOT.unpack_from(self.mm, offset)[0] | mask)
+
+    def _append(self, sub_id, t, tile, mask, mode, status):
+        # Called with self.lock held
+        self.log.write(LOG_RECORD.pack(sub_id, t, tile, mask, MODES.index(mode), STATUSES.index(status)))
+        self.log.flush()
+        self.submissions[sub_id] = (t, tile, mask, mode, status)
+
+    # --- Tiles ---
+    def tile(self, tile):
+        """Bitmask of the pixels inked in a tile"""
+        return TILE_SLOT.unpack_from(self.mm, self._offset(tile))[0]
+
+    def ink(self, tile, mask):
+        with self.lock:
+            self._ink(tile, mask)
+
+    def masks(self):
+        """Every tile's inked bitmask, as a uint32 array read straight from the map"""
+        with self.lock:
+            return np.frombuffer(self.mm, dtype='<u4', count=TILE_COUNT, offset=CANVAS_HEADER.size).copy()
+
+    def canvas(self):
+        return masks_to_canvas(self.masks())
+
+    def clear(self):
+        """Forget the ink, e.g. after a fresh sheet of paper; the log is kept"""
+        with self.lock:
+            self.mm[CANVAS_HEADER.size:CANVAS_SIZE] = bytes(CANVAS_SIZE - CANVAS_HEADER.size)
+
+    # --- Submissions ---
+    def submit(self, tile, mask, mode=blot_fill.DEFAULT_MODE):
+        """Log a new submission for a tile and return its id"""
+        self._offset(tile)
+        with self.lock:
+            sub_id = self.next_id
+            self.next_id += 1
+            self._append(sub_id, time.time(), tile, mask, mode, 'queued')
+            self.by_tile.setdefault(tile, []).append(sub_id)
+        return sub_id
+
+    def update(self, sub_id, status):
+        """Log a submission's new status; a finished one is inked into its tile"""
+        with self.lock:
+            _, tile, mask, mode, old = self.submissions[sub_id]
+            if status == old:
+                return
+            self._append(sub_id, time.time(), tile, mask, mode, status)
+            if status == 'done':
+                self._ink(tile, mask)
+
+    def used_tiles(self):
+        """Tiles with ink or with a submission still queued, running or done"""
+        masks = self.masks()
+        with self.lock:
+            live = {tile for _, tile, _, _, status in self.submissions.values()
+                    if status in ('queued', 'running', 'done')}
+        return live | {i for i in range(TILE_COUNT) if masks[i]}
+
+    def submission(self, sub_id):
+        with self.lock:
+            t, tile, mask, mode, status = self.submissions[sub_id]
+        return {"id": sub_id, "time": t, "tile": tile, "offset": tile_offset(tile),
+                "pattern": blot_fill.bitmask_pattern(mask), "mode": mode, "status": status}
+
+    def history(self, tile):
+        with self.lock:
+            ids = list(self.by_tile.get(tile, ()))
+        return [self.submission(i) for i in ids]
+
+    def recent(self, limit=50):
+        with self.lock:
+            ids = sorted(self.submissions)
+            ids = ids[max(len(ids) - limit, 0):]
+        return [self.submission(i) for i in reversed(ids)]
+
+    def snapshot(self):
+        masks = self.masks()
+        with self.lock:
+            statuses = [s[4] for s in self.submissions.values()]
+        return {"cols": MOSAIC_COLS, "rows": MOSAIC_ROWS, "tiles_x": TILES_X, "tiles_y": TILES_Y,
+                "tiles_inked": int(np.count_nonzero(masks)),
+                "pixels_inked": int(sum(bin(int(m)).count('1') for m in masks)),
+                "submissions": len(statuses),
+                "by_status": {s: statuses.count(s) for s in STATUSES}}
+
+    def flush(self):
+        with self.lock:
+            self.mm.flush()
+            self.log.flush()
+            os.fsync(self.log.fileno())
+
+    def close(self):
+        self.flush()
+        self.mm.close()
+        self.file.close()
+        self.log.close()
@@ -0,0 +1,115 @@
+import math
+import blot_estimate
+from blot_protocol import PEN_UP_PULSE, PEN_DOWN_PULSE, expand_paths
+
+# How far a point may sit off a straight line and still be merged away
+COLLINEAR_TOLERANCE = 1e-6
+
+
+def collinear(a, b, c):
+    """True if b lies on the segment from a to c"""
+    cross = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    if abs(cross) > COLLINEAR_TOLERANCE:
+        return False
+    dot = (b[0] - a[0]) * (c[0] - b[0]) + (b[1] - a[1]) * (c[1] - b[1])
+    return dot >= 0
+
+def pack_paths(cmds):
+    """Fold runs of pen-down go commands into path commands"""
+    out = []
+    pen_down = False
+    run = []
+    for cmd in cmds + [None]:
+        if cmd is not None and cmd[0] == 'go' and pen_down:
+            run.append((cmd[1], cmd[2]))
+            continue
+        if len(run) > 1:
+            out.append(('path', run))
+        elif run:
+            out.append(('go',) + run[0])
+        run = []
+        if cmd is None:
+            break
+        if cmd[0] == 'servo':
+            pen_down = cmd[1] == PEN_DOWN_PULSE
+        out.append(cmd)
+    return out
+
+
+class Peephole:
+    """Stateful optimizer between the drawing routines and serial_queue.
+
+    It tracks the pen, motor and position state across optimize() calls
+    until reset(), dropping toggles to a state the plotter is already in.
+    That state is only as good as the link: a lost ack or a replayed frame
+    can leave the pen somewhere else, so the backend resets it before every
+    job and whenever a frame is re-sent or given up on. Within a job it
+    drops zero-length moves, merges pen-down moves that continue in a
+    straight line and collapses a run of pen-up moves into its final target.
+    Time saved is priced by estimator, a blot_estimate.Estimator.
+    """
+
+    def __init__(self, estimator=None):
+        self.estimator = estimator or blot_estimate.Estimator()
+        self.reset()
+        self.totals = {"jobs": 0, "commands_in": 0, "commands_out": 0, "seconds_saved": 0.0}
+
+    def reset(self):
+        """Forget the plotter state, e.g. after a reconnect or a cancelled job"""
+        self.pen = None      # 'up', 'down' or None when unknown
+        self.motors = None   # True, False or None when unknown
+        self.pos = None
+
+    def optimize(self, cmds):
+        """Return (optimized commands, report) and advance the tracked state"""
+        start_pos = self.pos
+        flat = expand_paths(cmds)
+        out = []
+        for cmd in flat:
+            op = cmd[0]
+            if op == 'motorsOn' or op == 'motorsOff':
+                on = op == 'motorsOn'
+                if self.motors == on:
+                    continue
+                self.motors = on
+                out.append(cmd)
+            elif op == 'servo':
+                pen = 'down' if cmd[1] == PEN_DOWN_PULSE else 'up' if cmd[1] == PEN_UP_PULSE else None
+                if pen is not None and pen == self.pen:
+                    continue
+                self.pen = pen
+                out.append(cmd)
+            elif op == 'go':
+                target = (cmd[1], cmd[2])
+                if self.pos is not None and math.isclose(target[0], self.pos[0]) and math.isclose(target[1], self.pos[1]):
+                    continue
+                prev = out[-1] if out else None
+                if prev is not None and prev[0] == 'go':
+                    if self.pen == 'up':
+                        # Travel: only the final target of consecutive pen-up moves matters
+                        out.pop()
+                    elif self.pen == 'down' and len(out) >= 2:
+                        before = out[-2]
+                        origin = (before[1], before[2]) if before[0] == 'go' else self._pos_before(out)
+                        if origin is not None and collinear(origin, (prev[1], prev[2]), target):
+                            out.pop()
+                self.pos = target
+                out.append(cmd)
+            else:
+                out.append(cmd)
+        out = pack_paths(out)
+        saved = self.estimator.seconds(cmds, start_pos) - self.estimator.seconds(out, start_pos)
+        report = {"commands_in": len(flat), "commands_out": len(expand_paths(out)),
+                  "seconds_saved": round(max(saved, 0.0), 2)}
+        self.totals["jobs"] += 1
+        self.totals["commands_in"] += report["commands_in"]
+        self.totals["commands_out"] += report["commands_out"]
+        self.totals["seconds_saved"] = round(self.totals["seconds_saved"] + report["seconds_saved"], 2)
+        return out, report
+
+    def _pos_before(self, out):
+        # Position just before out[-1]: the last go before it, if any
+        for cmd in reversed(out[:-1]):
+            if cmd[0] == 'go':
+                return (cmd[1], cmd[2])
+        return None
@@ -0,0 +1,322 @@
+import struct
+import time
+from cobs import cobs
+
+# Commands are tuples, encoded per protocol version:
+#   ('go', x, y)          move to an absolute position
+#   ('path', [(x, y)...]) move through several positions in order
+#   ('servo', pulse)      set the pen servo pulse width
+#   ('motorsOn',) / ('motorsOff',)
+PEN_UP_PULSE = 500
+PEN_DOWN_PULSE = 2500
+PEN_UP = ('servo', PEN_UP_PULSE)
+PEN_DOWN = ('servo', PEN_DOWN_PULSE)
+MOTORS_ON = ('motorsOn',)
+MOTORS_OFF = ('motorsOff',)
+
+
+def v1_message(event, payload_bytes, seq):
+    """One v1 frame built the straightforward way (also the benchmark baseline)"""
+    event_bytes = event.encode('utf-8')
+    message = bytearray()
+    message.append(len(event_bytes))
+    message.extend(event_bytes)
+    message.append(len(payload_bytes))
+    message.extend(payload_bytes)
+    message.append(seq)
+    return cobs.encode(message) + b'\x00'
+
+
+# --- Protocol v1 fast path ---
+_go_payload = struct.Struct('<ff')
+_servo_payload = struct.Struct('<i')
+_pack_go = _go_payload.pack
+GO_HEADER = bytes([2]) + b'go' + bytes([_go_payload.size])
+# COBS code byte + header + payload + seq + delimiter
+GO_FRAME_LEN = 1 + len(GO_HEADER) + _go_payload.size + 1 + 1
+GO_SEQ_AT = GO_FRAME_LEN - 2
+# The last two bytes of a go frame with a nonzero sequence byte: that byte and the delimiter
+SEQ_TAILS = [bytes((seq, 0)) for seq in range(256)]
+# Distinct go payloads kept as encoded templates
+TEMPLATE_CACHE_SIZE = 16384
+
+
+class FrameEncoder:
+    """Builds v1 frames from cached templates with precompiled packers.
+
+    A go frame only depends on its payload and sequence byte, and a nonzero
+    sequence byte passes through COBS unchanged. So each packed payload is
+    COBS-encoded once, kept as a template that stops short of the sequence
+    byte, and finished by concatenating one of 256 precomputed tails.
+    Templates are keyed by the packed bytes rather than an (x, y) tuple, so
+    a frame creates no object the garbage collector tracks. A zero sequence
+    byte changes the code bytes, so those frames (one in 256) are encoded in
+    full. Servo and motor frames come from a handful of payloads, so they
+    are cached whole, per sequence number.
+    """
+
+    def __init__(self, cache_size=TEMPLATE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.templates = {}
+        self.constants = {}
+
+    def _template(self, payload):
+        if len(self.templates) >= self.cache_size:
+            self.templates.clear()
+        template = self.templates[payload] = cobs.encode(GO_HEADER + payload + b'\x01')[:GO_SEQ_AT]
+        return template
+
+    def go(self, x, y, seq):
+        payload = _pack_go(x, y)
+        if not seq:
+            return cobs.encode(GO_HEADER + payload + b'\x00') + b'\x00'
+        template = self.templates.get(payload)
+        if template is None:
+            template = self._template(payload)
+        return template + SEQ_TAILS[seq]
+
+    def frames(self, points, seq):
+        """go frames for points, numbered from seq"""
+        go = self.go
+        out = []
+        for x, y in points:
+            out.append(go(x, y, seq))
+            seq = (seq + 1) & 0xFF
+        return out
+
+    def encode_many(self, points, seq):
+        """Consecutive go frames for points, numbered from seq, as one bytes object"""
+        return b''.join(self.frames(points, seq))
+
+    def constant(self, event, payload_bytes, seq):
+        """A frame without coordinates; a cached frame is about twice as fast as encoding it again"""
+        frames = self.constants.get((event, payload_bytes))
+        if frames is None:
+            frames = self.constants[(event, payload_bytes)] = [None] * 256
+        frame = frames[seq]
+        if frame is None:
+            frame = frames[seq] = v1_message(event, payload_bytes, seq)
+        return frame
+
+
+class ProtocolV1:
+    """The original firmware format: [len, event, len, payload, seq], COBS framed"""
+    version = 1
+
+    def __init__(self):
+        self.encoder = FrameEncoder()
+        self.go = self.encoder.go
+
+    def encode(self, cmd, seq):
+        op = cmd[0]
+        if op == 'go':
+            return self.go(cmd[1], cmd[2], seq)
+        if op == 'servo':
+            return self.encoder.constant('servo', _servo_payload.pack(cmd[1]), seq)
+        if op in ('motorsOn', 'motorsOff'):
+            return self.encoder.constant(op, b'', seq)
+        raise ValueError(f"Protocol v1 cannot encode {op!r}")
+
+    def encode_path(self, points, seq):
+        """go frames for every point"""
+        return self.encoder.frames(points, seq)
+
+    def decode(self, raw):
+        """Split a COBS-decoded firmware message into (event, payload, seq)"""
+        data = cobs.decode(raw)
+        event_len = data[0]
+        event = data[1:1 + event_len].decode('utf-8')
+        payload_len = data[1 + event_len]
+        payload = bytes(data[2 + event_len:2 + event_len + payload_len])
+        if len(data) != 3 + event_len + payload_len:
+            raise ValueError("Frame length does not match its header")
+        return event, payload, data[-1]
+
+
+# --- Protocol v2 ---
+# Frames are [opcode, payload, seq], COBS framed. Coordinates are int16 in
+# hundredths of a unit. Relative moves and path points after the first are
+# zigzag varint deltas, so axis-aligned and short moves take 1-2 bytes per axis.
+# Relative moves are not idempotent, so v2 firmware must re-ack (and not re-run)
+# a frame whose seq it has already executed within the last window.
+OP_GO = 0x01
+OP_MOVE = 0x02
+OP_PATH = 0x03
+OP_PEN_UP = 0x04
+OP_PEN_DOWN = 0x05
+OP_SERVO = 0x06
+OP_MOTORS_ON = 0x07
+OP_MOTORS_OFF = 0x08
+OP_ACK = 0x80
+
+FIXED_SCALE = 100
+PATH_MAX_POINTS = 32
+
+_xy = struct.Struct('<hh')
+_pulse = struct.Struct('<H')
+
+
+def to_fixed(v):
+    return int(round(v * FIXED_SCALE))
+
+def put_varint(buf, v):
+    v = v * 2 if v >= 0 else -v * 2 - 1
+    while v >= 0x80:
+        buf.append((v & 0x7F) | 0x80)
+        v >>= 7
+    buf.append(v)
+
+def get_varint(data, i):
+    v = shift = 0
+    while True:
+        b = data[i]
+        i += 1
+        v |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            break
+    return (v >> 1 if not v & 1 else -(v >> 1) - 1), i
+
+
+class ProtocolV2:
+    """Compact opcodes and fixed-point coordinates; tracks position for deltas"""
+    version = 2
+
+    def __init__(self):
+        self.pos = None
+
+    def frame(self, body, seq):
+        body.append(seq)
+        return cobs.encode(body) + b'\x00'
+
+    def encode(self, cmd, seq):
+        op = cmd[0]
+        body = bytearray()
+        if op == 'go':
+            x, y = to_fixed(cmd[1]), to_fixed(cmd[2])
+            delta = bytearray()
+            if self.pos is not None:
+                put_varint(delta, x - self.pos[0])
+                put_varint(delta, y - self.pos[1])
+            if self.pos is not None and len(delta) < _xy.size:
+                body.append(OP_MOVE)
+                body.extend(delta)
+            else:
+                body.append(OP_GO)
+                body.extend(_xy.pack(x, y))
+            self.pos = (x, y)
+        elif op == 'path':
+            points = [(to_fixed(px), to_fixed(py)) for px, py in cmd[1]]
+            if not 1 <= len(points) <= PATH_MAX_POINTS:
+                raise ValueError(f"Path frames carry 1-{PATH_MAX_POINTS} points")
+            body.append(OP_PATH)
+            body.append(len(points))
+            body.extend(_xy.pack(*points[0]))
+            for (ax, ay), (bx, by) in zip(points, points[1:]):
+                put_varint(body, bx - ax)
+                put_varint(body, by - ay)
+            self.pos = points[-1]
+        elif op == 'servo':
+            if cmd[1] == PEN_UP_PULSE:
+                body.append(OP_PEN_UP)
+            elif cmd[1] == PEN_DOWN_PULSE:
+                body.append(OP_PEN_DOWN)
+            else:
+                body.append(OP_SERVO)
+                body.extend(_pulse.pack(cmd[1]))
+        elif op == 'motorsOn':
+            body.append(OP_MOTORS_ON)
+        elif op == 'motorsOff':
+            body.append(OP_MOTORS_OFF)
+        else:
+            raise ValueError(f"Protocol v2 cannot encode {op!r}")
+        return self.frame(body, seq)
+
+    def decode(self, raw):
+        """Firmware replies: acks become ('ack', b'', seq) like in v1"""
+        data = cobs.decode(raw)
+        if len(data) < 2:
+            raise ValueError("Frame too short")
+        if data[0] == OP_ACK:
+            return 'ack', b'', data[-1]
+        return f"op{data[0]:02x}", bytes(data[1:-1]), data[-1]
+
+    def decode_command(self, raw, pos=None):
+        """Turn a host frame back into (commands, seq, pos); used to verify encodings"""
+        data = cobs.decode(raw.rstrip(b'\x00'))
+        op, seq, i = data[0], data[-1], 1
+        cmds = []
+        if op == OP_GO:
+            pos = _xy.unpack_from(data, i)
+            cmds.append(('go', pos[0] / FIXED_SCALE, pos[1] / FIXED_SCALE))
+        elif op == OP_MOVE:
+            dx, i = get_varint(data, i)
+            dy, i = get_varint(data, i)
+            pos = (pos[0] + dx, pos[1] + dy)
+            cmds.append(('go', pos[0] / FIXED_SCALE, pos[1] / FIXED_SCALE))
+        elif op == OP_PATH:
+            count = data[i]
+            pos = _xy.unpack_from(data, i + 1)
+            i += 1 + _xy.size
+            points = [pos]
+            for _ in range(count - 1):
+                dx, i = get_varint(data, i)
+                dy, i = get_varint(data, i)
+                pos = (pos[0] + dx, pos[1] + dy)
+                points.append(pos)
+            cmds.append(('path', [(px / FIXED_SCALE, py / FIXED_SCALE) for px, py in points]))
+        elif op in (OP_PEN_UP, OP_PEN_DOWN):
+            cmds.append(('servo', PEN_UP_PULSE if op == OP_PEN_UP else PEN_DOWN_PULSE))
+        elif op == OP_SERVO:
+            cmds.append(('servo', _pulse.unpack_from(data, i)[0]))
+        elif op == OP_MOTORS_ON:
+            cmds.append(('motorsOn',))
+        elif op == OP_MOTORS_OFF:
+            cmds.append(('motorsOff',))
+        return cmds, seq, pos
+
+
+def split_path(points):
+    """Chunks of a polyline that fit in path frames, sharing their joint points"""
+    step = PATH_MAX_POINTS - 1
+    return [points[i:i + PATH_MAX_POINTS] for i in range(0, max(len(points) - 1, 1), step)]
+
+def expand_paths(cmds):
+    """Rewrite path commands as plain go commands, for protocol v1"""
+    out = []
+    for cmd in cmds:
+        if cmd[0] == 'path':
+            out.extend(('go', px, py) for px, py in cmd[1])
+        else:
+            out.append(cmd)
+    return out
+
+# --- Negotiation ---
+def negotiate(ser, preferred=2, timeout=1.0):
+    """Offer protocol v2 with a v1 'protocol' message before the link starts.
+
+    Firmware that speaks v2 answers with a 'protocol' message carrying the
+    version it accepts; anything else (just an ack, or silence) means v1.
+    """
+    v1 = ProtocolV1()
+    if preferred < 2:
+        return v1
+    ser.write(v1_message('protocol', bytes([preferred]), 0))
+    buf = bytearray()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        buf.extend(ser.read(ser.in_waiting or 1))
+        while b'\x00' in buf:
+            end = buf.index(b'\x00')
+            raw = bytes(buf[:end])
+            del buf[:end + 1]
+            try:
+                event, payload, _ = v1.decode(raw)
+            except (cobs.DecodeError, IndexError, ValueError, UnicodeDecodeError):
+                continue
+            if event == 'protocol' and payload and payload[0] >= 2:
+                return ProtocolV2()
+            if event == 'ack':
+                # v2 firmware answers before acking, so this is v1 firmware
+                return v1
+    return v1
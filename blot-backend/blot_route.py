@@ -0,0 +1,153 @@
+import math
+import time
+
+# Seconds the improvement passes may run per drawing
+TIME_BUDGET = 0.05
+# Longest run of consecutive strokes Or-opt moves as one block
+OR_OPT_MAX = 3
+
+
+def dist(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+def is_loop(stroke):
+    return len(stroke) > 2 and tuple(stroke[0]) == tuple(stroke[-1])
+
+def rotate_loop(stroke, i):
+    """The same closed stroke, started and ended at vertex i"""
+    body = stroke[:-1]
+    body = body[i:] + body[:i]
+    return body + [body[0]]
+
+def travel(strokes, start, end=None):
+    """Pen-up distance from start through the strokes in order (and on to end)"""
+    total = 0.0
+    pos = start
+    for s in strokes:
+        total += dist(pos, s[0])
+        pos = s[-1]
+    if end is not None:
+        total += dist(pos, end)
+    return total
+
+def _edge(a, b):
+    # Distance between two tour points where None (no fixed end) costs nothing
+    return 0.0 if a is None or b is None else dist(a, b)
+
+# --- Construction ---
+def greedy(strokes, start):
+    """Nearest neighbour over every way into a stroke: either end, or any vertex of a loop"""
+    remaining = [list(s) for s in strokes]
+    ordered = []
+    pos = start
+    while remaining:
+        best = None
+        for i, s in enumerate(remaining):
+            if is_loop(s):
+                entries = [(k, p) for k, p in enumerate(s[:-1])]
+            else:
+                entries = [(0, s[0]), (-1, s[-1])]
+            for k, p in entries:
+                d = dist(pos, p)
+                if best is None or d < best[0]:
+                    best = (d, i, k)
+        _, i, k = best
+        s = remaining.pop(i)
+        if is_loop(s):
+            s = rotate_loop(s, k)
+        elif k == -1:
+            s.reverse()
+        ordered.append(s)
+        pos = s[-1]
+    return ordered
+
+# --- Improvement ---
+def two_opt(strokes, start, end=None, deadline=None):
+    """Reverse runs of strokes (flipping each one) while that shortens travel"""
+    n = len(strokes)
+    improved = True
+    changed = False
+    while improved:
+        improved = False
+        for i in range(n - 1):
+            if deadline is not None and time.monotonic() > deadline:
+                return changed
+            before = start if i == 0 else strokes[i - 1][-1]
+            for j in range(i + 1, n):
+                after = strokes[j + 1][0] if j + 1 < n else end
+                old = dist(before, strokes[i][0]) + _edge(strokes[j][-1], after)
+                new = dist(before, strokes[j][-1]) + _edge(strokes[i][0], after)
+                if new < old - 1e-9:
+                    strokes[i:j + 1] = [s[::-1] for s in reversed(strokes[i:j + 1])]
+                    improved = changed = True
+    return changed
+
+def or_opt(strokes, start, end=None, deadline=None):
+    """Move blocks of up to OR_OPT_MAX strokes elsewhere in the order, flipped if that helps"""
+    improved = True
+    changed = False
+    while improved:
+        improved = False
+        n = len(strokes)
+        for length in range(1, min(OR_OPT_MAX, n - 1) + 1):
+            for i in range(n - length + 1):
+                if deadline is not None and time.monotonic() > deadline:
+                    return changed
+                block = strokes[i:i + length]
+                before = start if i == 0 else strokes[i - 1][-1]
+                after = strokes[i + length][0] if i + length < n else end
+                gain = dist(before, block[0][0]) + _edge(block[-1][-1], after) - _edge(before, after)
+                rest = strokes[:i] + strokes[i + length:]
+                flipped = [s[::-1] for s in reversed(block)]
+                best = None
+                for j in range(len(rest) + 1):
+                    if j == i:
+                        continue
+                    a = start if j == 0 else rest[j - 1][-1]
+                    b = rest[j][0] if j < len(rest) else end
+                    for cand in (block, flipped):
+                        cost = dist(a, cand[0][0]) + _edge(cand[-1][-1], b) - _edge(a, b)
+                        if cost < gain - 1e-9 and (best is None or cost < best[0]):
+                            best = (cost, j, cand)
+                if best is not None:
+                    _, j, cand = best
+                    strokes[:] = rest[:j] + cand + rest[j:]
+                    improved = changed = True
+                    break
+            if improved:
+                break
+    return changed
+
+def rotate_loops(strokes, start, end=None):
+    """Start each closed stroke at the vertex nearest its neighbours in the order"""
+    changed = False
+    for i, s in enumerate(strokes):
+        if not is_loop(s):
+            continue
+        before = start if i == 0 else strokes[i - 1][-1]
+        after = strokes[i + 1][0] if i + 1 < len(strokes) else end
+        costs = [dist(before, p) + _edge(p, after) for p in s[:-1]]
+        k = min(range(len(costs)), key=costs.__getitem__)
+        if costs[k] < costs[0] - 1e-9:
+            strokes[i] = rotate_loop(s, k)
+            changed = True
+    return changed
+
+def optimize(strokes, start, end=None, time_budget=TIME_BUDGET):
+    """Order strokes, orient them and rotate loops to minimise pen-up travel from start (to end).
+
+    A greedy pass builds the order; 2-opt, Or-opt and loop rotation then run
+    in turn until none of them helps or the time budget is spent.
+    """
+    strokes = [[tuple(p) for p in s] for s in strokes if len(s)]
+    if not strokes:
+        return []
+    deadline = time.monotonic() + time_budget
+    ordered = greedy(strokes, start)
+    while time.monotonic() < deadline:
+        changed = two_opt(ordered, start, end, deadline)
+        changed |= or_opt(ordered, start, end, deadline)
+        changed |= rotate_loops(ordered, start, end)
+        if not changed:
+            break
+    return ordered
@@ -2,10 +2,13 @@ import serial
 from cobs import cobs
 import struct
 import time
-import random
+import ttt_engine
+import ttt_solver
 
 SERIAL_PORT = 'COM25'
 BAUD_RATE = 9600
+# How well the AI plays: 'easy', 'medium' or 'hard' (perfect play)
+AI_DIFFICULTY = 'medium'
 
 ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
 msg_count = 0
@@ -84,17 +87,7 @@ def draw_mark(player, cell):
     go(grid_origin[0] - 10, grid_origin[1] - 10)
 
 def check_winner(board):
-    lines = [
-        [1,2,3],[4,5,6],[7,8,9],
-        [1,4,7],[2,5,8],[3,6,9],
-        [1,5,9],[3,5,7]
-    ]
-    for line in lines:
-        if board[line[0]] == board[line[1]] == board[line[2]] and board[line[0]] != ' ':
-            return board[line[0]]
-    if all(board[c] != ' ' for c in range(1,10)):
-        return 'D'
-    return None
+    return ttt_engine.check_winner_for_board(board)
 
 def draw_grid():
     print("Drawing grid...")
@@ -118,8 +111,7 @@ def draw_grid():
     print("Grid drawn.")
 
 def ai_move(board):
-    available = [c for c in range(1, 10) if board[c] == ' ']
-    return random.choice(available)
+    return ttt_solver.choose_move(board, 'O', AI_DIFFICULTY)
 
 def print_board(board):
     print("\n")
@@ -0,0 +1,89 @@
+"""Many threads claiming, submitting and abandoning mosaic tiles at once.
+
+Usage: python stress_allocator.py [claimants] [lease_seconds]
+
+Each claimant loops: claim a tile, then commit it, release it, or walk
+away and let the lease expire. At the end every tile must have been
+committed exactly once, and no tile may ever have been leased to a second
+holder before the first one's lease was gone.
+"""
+import itertools
+import random
+import sys
+import threading
+import time
+import blot_mosaic
+from blot_allocator import TileAllocator
+
+
+def overlap(a, b, lease_seconds):
+    # Neither lease is renewed, so each lives from expires - lease_seconds to expires
+    return a.expires - lease_seconds < b.expires and b.expires - lease_seconds < a.expires
+
+def forget(holders, lease, lock):
+    with lock:
+        if holders.get(lease.tile) is lease:
+            del holders[lease.tile]
+
+def claimant(allocator, seed, holders, committed, errors, lock):
+    rng = random.Random(seed)
+    while True:
+        lease = allocator.claim(f"kiosk-{seed}", (rng.uniform(0, blot_mosaic.PLOT_WIDTH), rng.uniform(0, blot_mosaic.PLOT_HEIGHT)))
+        if lease is None:
+            return
+        with lock:
+            # An abandoned lease stays in holders, and the two leases' lifetimes must not overlap.
+            # Threads may record out of order, so the later of the two is kept.
+            previous = holders.get(lease.tile)
+            if previous is not None and overlap(previous, lease, allocator.lease_seconds):
+                errors.append(f"tile {lease.tile} leased to {previous.token} and {lease.token}")
+            if previous is None or previous.expires < lease.expires:
+                holders[lease.tile] = lease
+        time.sleep(rng.uniform(0, 0.002))
+        roll = rng.random()
+        if roll < 0.6:
+            # Drop the holder first: once committed or released the tile may be leased again
+            forget(holders, lease, lock)
+            tile = allocator.commit(lease.token)
+            if tile is not None:
+                with lock:
+                    committed.append(tile)
+        elif roll < 0.8:
+            forget(holders, lease, lock)
+            allocator.release(lease.token)
+
+
+if __name__ == '__main__':
+    claimants = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    lease_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    allocator = TileAllocator(lease_seconds=lease_seconds)
+    holders, committed, errors = {}, [], []
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=claimant, args=(allocator, i, holders, committed, errors, lock))
+               for i in range(claimants)]
+    for t in threads:
+        t.start()
+    # Claimants stop when no tile is free; then wait for abandoned leases to expire and start over
+    for round_number in itertools.count(1):
+        for t in threads:
+            t.join()
+        time.sleep(lease_seconds)
+        if not allocator.snapshot()["free"]:
+            break
+        threads = [threading.Thread(target=claimant, args=(allocator, round_number * claimants + i, holders,
+                                                           committed, errors, lock))
+                   for i in range(claimants)]
+        for t in threads:
+            t.start()
+    elapsed = time.perf_counter() - t0
+
+    stats = allocator.snapshot()
+    if sorted(committed) != list(range(blot_mosaic.TILE_COUNT)):
+        errors.append(f"{len(committed)} commits for {len(set(committed))} distinct tiles")
+    for error in errors[:10]:
+        print("FAIL", error)
+    print(f"{claimants} claimants, {blot_mosaic.TILE_COUNT} tiles in {elapsed:.2f}s: "
+          + ", ".join(f"{k} {stats[k]}" for k in ('claimed', 'committed', 'released', 'expired')))
+    print("OK" if not errors else f"{len(errors)} errors")
+    sys.exit(1 if errors else 0)
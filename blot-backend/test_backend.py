@@ -1,8 +1,11 @@
 from flask import Flask, request, jsonify
 import time
 import threading
-import random
 from flask_cors import CORS
+import blot_estimate
+import blot_ir
+import ttt_engine
+import ttt_solver
 
 app = Flask(__name__)
 CORS(app)
@@ -12,87 +15,72 @@ board = {i: ' ' for i in range(1, 10)}
 current_turn = 'X'
 game_over = False
 winner = None
+# How well Auto plays: 'easy', 'medium' or 'hard' (perfect play), see ttt_solver.DIFFICULTY
+AI_DIFFICULTY = 'medium'
+# Simulated drawings take as long as the real Blot is estimated to, divided by this (0 = no waiting)
+SIMULATION_SPEED = 10.0
+
+# --- Simulated plotter, laid out like ttt_backend_corner5's 3x3 grid ---
+GRID_ORIGIN = (5, 5)
+GRID_SIZE = 60
+CELL_SIZE = GRID_SIZE / 3
+REST_POSITION = (GRID_ORIGIN[0] + GRID_SIZE + 10, GRID_ORIGIN[1] + GRID_SIZE + 10)
+X_MARK = blot_ir.Drawing([[(-5, -5), (5, 5)], [(-5, 5), (5, -5)]])
+O_MARK = blot_ir.Drawing([[(-5, 0), (0, 5), (5, 0), (0, -5), (-5, 0)]])
+estimator = blot_estimate.Estimator(path=blot_estimate.CALIBRATION_PATH)
+
+def cell_center(cell):
+    col, row = (cell - 1) % 3, (cell - 1) // 3
+    return (GRID_ORIGIN[0] + (col + 0.5) * CELL_SIZE, GRID_ORIGIN[1] + (row + 0.5) * CELL_SIZE)
 
 # --- Simulated drawing functions ---
-def simulate_drawing_delay():
-    """Simulate the time it takes for the Blot to draw"""
-    time.sleep(0.5)
+def simulate_seconds(seconds):
+    if SIMULATION_SPEED:
+        time.sleep(seconds / SIMULATION_SPEED)
+
+def simulate_drawing_delay(drawing):
+    """Wait as long as the Blot is estimated to take powering up, drawing this from its rest position
+    and parking again"""
+    simulate_seconds(estimator.drawing_seconds(drawing, REST_POSITION, REST_POSITION, motors_on=True))
 
 def draw_grid():
     """Simulate drawing the grid"""
     print("🖊️  Drawing grid...")
-    simulate_drawing_delay()
+    lines = [[(GRID_ORIGIN[0] + i * CELL_SIZE, GRID_ORIGIN[1]), (GRID_ORIGIN[0] + i * CELL_SIZE, GRID_ORIGIN[1] + GRID_SIZE)]
+             for i in (1, 2)]
+    lines += [[(GRID_ORIGIN[0], GRID_ORIGIN[1] + i * CELL_SIZE), (GRID_ORIGIN[0] + GRID_SIZE, GRID_ORIGIN[1] + i * CELL_SIZE)]
+              for i in (1, 2)]
+    simulate_drawing_delay(blot_ir.Drawing(lines))
     print("✅ Grid drawn")
 
 def draw_mark(player, cell):
     """Simulate drawing an X or O"""
     print(f"🖊️  Drawing {player} in cell {cell}...")
-    simulate_drawing_delay()
+    simulate_drawing_delay((X_MARK if player == 'X' else O_MARK).translate(*cell_center(cell)))
     print(f"✅ {player} drawn in cell {cell}")
 
 def draw_winning_line(winning_cells):
     """Simulate drawing the winning line"""
     print(f"🏆 Drawing winning line through cells {winning_cells}...")
-    simulate_drawing_delay()
+    simulate_drawing_delay(blot_ir.Drawing([[cell_center(winning_cells[0]), cell_center(winning_cells[-1])]]))
     print("✅ Winning line drawn")
 
 def go_to_corner():
-    """Simulate moving to corner after each move"""
+    """Simulate powering down at the corner; drawings already end at the rest position"""
     print("📍 Moving to corner...")
-    time.sleep(0.2)
+    simulate_seconds(estimator.drawing_seconds(blot_ir.Drawing(), motors_off=True))
     print("✅ At corner")
 
 # --- Game logic functions ---
 def check_winner():
-    lines = [
-        [1, 2, 3], [4, 5, 6], [7, 8, 9],
-        [1, 4, 7], [2, 5, 8], [3, 6, 9],
-        [1, 5, 9], [3, 5, 7]
-    ]
-    for line in lines:
-        if board[line[0]] == board[line[1]] == board[line[2]] and board[line[0]] != ' ':
-            return board[line[0]], line
-    if all(board[c] != ' ' for c in range(1, 10)):
-        return 'D', None
-    return None, None
+    return ttt_engine.check_board(board)
 
 def check_winner_for_board(board_state):
     """Check winner for a given board state (used by AI)"""
-    lines = [
-        [1, 2, 3], [4, 5, 6], [7, 8, 9],
-        [1, 4, 7], [2, 5, 8], [3, 6, 9],
-        [1, 5, 9], [3, 5, 7]
-    ]
-    for line in lines:
-        if board_state[line[0]] == board_state[line[1]] == board_state[line[2]] and board_state[line[0]] != ' ':
-            return board_state[line[0]]
-    if all(board_state[c] != ' ' for c in range(1, 10)):
-        return 'D'
-    return None
-
-def ai_move():
-    available = [c for c in range(1, 10) if board[c] == ' ']
-    if not available:
-        return None
-    
-    # Check if AI can win in one move
-    for cell in available:
-        board_copy = board.copy()
-        board_copy[cell] = 'O'
-        winner = check_winner_for_board(board_copy)
-        if winner == 'O':
-            return cell
-    
-    # Check if player can win in one move and block it
-    for cell in available:
-        board_copy = board.copy()
-        board_copy[cell] = 'X'
-        winner = check_winner_for_board(board_copy)
-        if winner == 'X':
-            return cell
-    
-    # Otherwise, make a random move
-    return random.choice(available)
+    return ttt_engine.check_winner_for_board(board_state)
+
+def ai_move(difficulty=None):
+    return ttt_solver.choose_move(board, 'O', difficulty or AI_DIFFICULTY)
 
 def async_draw_mark(player, cell):
     """Simulate async drawing (non-blocking)"""
@@ -161,7 +149,10 @@ def ai_move_endpoint():
         return jsonify({"error": "Game over."}), 400
 
     # AI move
-    ai = ai_move()
+    difficulty = (request.get_json(silent=True) or {}).get('difficulty', AI_DIFFICULTY)
+    if difficulty not in ttt_solver.DIFFICULTY:
+        return jsonify({"error": f"Difficulty must be one of {', '.join(ttt_solver.DIFFICULTY)}."}), 400
+    ai = ai_move(difficulty)
     if ai:
         print(f"🤖 AI makes move at cell {ai}")
         board[ai] = 'O'
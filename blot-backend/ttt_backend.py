@@ -4,9 +4,10 @@ from cobs import cobs
 import struct
 import time
 import threading
-import random
 from queue import Queue
 from flask_cors import CORS
+import ttt_engine
+import ttt_solver
 
 app = Flask(__name__)
 CORS(app)
@@ -26,6 +27,8 @@ board = {i: ' ' for i in range(1, 10)}
 current_turn = 'X'
 game_over = False
 winner = None
+# How well Auto plays: 'easy', 'medium' or 'hard' (perfect play), see ttt_solver.DIFFICULTY
+AI_DIFFICULTY = 'medium'
 
 # --- Serial message queue setup ---
 serial_queue = Queue()
@@ -128,55 +131,14 @@ def draw_mark(player, cell):
     go(grid_origin[0] - 10, grid_origin[1] - 10)
 
 def check_winner():
-    lines = [
-        [1, 2, 3], [4, 5, 6], [7, 8, 9],
-        [1, 4, 7], [2, 5, 8], [3, 6, 9],
-        [1, 5, 9], [3, 5, 7]
-    ]
-    for line in lines:
-        if board[line[0]] == board[line[1]] == board[line[2]] and board[line[0]] != ' ':
-            return board[line[0]], line
-    if all(board[c] != ' ' for c in range(1, 10)):
-        return 'D', None
-    return None, None
+    return ttt_engine.check_board(board)
 
 def check_winner_for_board(board_state):
     """Check winner for a given board state (used by AI)"""
-    lines = [
-        [1, 2, 3], [4, 5, 6], [7, 8, 9],
-        [1, 4, 7], [2, 5, 8], [3, 6, 9],
-        [1, 5, 9], [3, 5, 7]
-    ]
-    for line in lines:
-        if board_state[line[0]] == board_state[line[1]] == board_state[line[2]] and board_state[line[0]] != ' ':
-            return board_state[line[0]]
-    if all(board_state[c] != ' ' for c in range(1, 10)):
-        return 'D'
-    return None
-
-def ai_move():
-    available = [c for c in range(1, 10) if board[c] == ' ']
-    if not available:
-        return None
-    
-    # Check if AI can win in one move
-    for cell in available:
-        board_copy = board.copy()
-        board_copy[cell] = 'O'
-        winner = check_winner_for_board(board_copy)
-        if winner == 'O':
-            return cell
-    
-    # Check if player can win in one move and block it
-    for cell in available:
-        board_copy = board.copy()
-        board_copy[cell] = 'X'
-        winner = check_winner_for_board(board_copy)
-        if winner == 'X':
-            return cell
-    
-    # Otherwise, make a random move
-    return random.choice(available)
+    return ttt_engine.check_winner_for_board(board_state)
+
+def ai_move(difficulty=None):
+    return ttt_solver.choose_move(board, 'O', difficulty or AI_DIFFICULTY)
 
 def draw_grid():
     motors_on()
@@ -306,7 +268,10 @@ def ai_move_endpoint():
         return jsonify({"error": "Game over."}), 400
 
     # AI move
-    ai = ai_move()
+    difficulty = (request.get_json(silent=True) or {}).get('difficulty', AI_DIFFICULTY)
+    if difficulty not in ttt_solver.DIFFICULTY:
+        return jsonify({"error": f"Difficulty must be one of {', '.join(ttt_solver.DIFFICULTY)}."}), 400
+    ai = ai_move(difficulty)
     if ai:
         board[ai] = 'O'
         # Draw the AI move synchronously (wait for it to complete)
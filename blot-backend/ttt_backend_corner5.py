@@ -1,12 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import serial
-from cobs import cobs
-import struct
 import time
 import threading
+import itertools
+import json
+import math
+import os
 import random
 from queue import Queue
+from collections import deque
+import numpy as np
 from flask_cors import CORS
+import blot_fill
+import blot_ir
+import blot_image
+import blot_mosaic
+from blot_allocator import TileAllocator, LEASE_SECONDS
+import blot_estimate
+import blot_protocol
+import ttt_engine
+import ttt_solver
+import ttt_board
+from ttt_speculation import Speculator, position_key
+from blot_link import BlotLink
+from blot_peephole import Peephole
+from blot_estimate import Estimator
+from blot_cache import DrawingCache
+from blot_jobs import JobScheduler, PRIORITY_GAME, PRIORITY_MOSAIC
+from blot_events import EventHub
 
 app = Flask(__name__)
 CORS(app)
@@ -16,231 +37,654 @@ SERIAL_PORT = 'COM25'
 BAUD_RATE = 9600
 ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
 msg_count = 0
+# Frames queued since start; unlike msg_count it never wraps, so jobs can count their frames
+frames_queued = 0
+# Set to False for firmware that does not ack commands; writes are then blind
+FLOW_CONTROL = True
+# Frames coalesced per serial write, and how long to hold a partial batch (s)
+WRITE_BATCH = 16
+FLUSH_LATENCY = 0.005
+# Highest command protocol to offer the firmware at connect; 1 skips negotiation
+PROTOCOL_VERSION = 2
+# Seconds between plot progress events on /events while a job runs
+PROGRESS_INTERVAL = 0.5
+# Longest a /state long-poll may block (s)
+STATE_MAX_WAIT = 30
+# Compiled marks, glyphs and mosaic tiles kept in memory; set a path to keep them across restarts
+DRAWING_CACHE_SIZE = 512
+DRAWING_CACHE_PATH = None
+# Where the mosaic's inked tiles (mmap'd) and its append-only submission log are kept
+MOSAIC_CANVAS_PATH = blot_mosaic.CANVAS_PATH
+MOSAIC_LOG_PATH = blot_mosaic.LOG_PATH
+# Seconds a claimed mosaic tile stays reserved for its client
+MOSAIC_LEASE_SECONDS = LEASE_SECONDS
+# Pixel-art tiles arriving within this many seconds of a batch's first (or while it waits
+# behind other jobs) are plotted with it as one job; at most TILE_BATCH_MAX tiles per batch
+TILE_BATCH_WINDOW = 1.0
+TILE_BATCH_MAX = 24
+# Latest image import's target tiles, kept so /mosaic/import/resume works after a restart
+MOSAIC_IMPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mosaic_import.json')
+# Plot-time model weights, fitted by blot_estimate.py or online; None keeps the defaults
+PLOT_CALIBRATION_PATH = blot_estimate.CALIBRATION_PATH
+# With acks on, refit the plot-time model from how long each job really took (and save it)
+PLOT_CALIBRATE_ONLINE = True
+# Admission control: mosaic work is refused with 503 once the plotter is booked this many
+# estimated seconds ahead, and with 429 once one client has this many seconds queued.
+# Game moves are always let in
+BACKLOG_BUDGET = 600
+CLIENT_BUDGET = 180
 
-cell_size = 20
-# Move the 60x60 grid (3 cells × 20 units) so the top-left corner is at (5, 5)
+# Default board variant: BOARD_SIZE x BOARD_SIZE cells, WIN_LENGTH in a row wins; /start may pick another
+BOARD_SIZE = 3
+WIN_LENGTH = 3
+# Seconds Auto may think on boards larger than 3x3
+AI_TIME_BUDGET = ttt_board.TIME_BUDGET
+# Player moves per position whose replies are precomputed on boards larger than 3x3 (3x3: all)
+SPECULATE_WIDTH = 8
+
+board_size = BOARD_SIZE
+win_length = WIN_LENGTH
+# The grid is always 60x60 with its top-left corner at (5, 5); cells shrink as the board grows
 grid_origin = (5, 5)
+grid_size = 60
+cell_size = grid_size / board_size
+# Marks are drawn for 20-unit cells and scaled to fit
+MARK_CELL = 20
+# Where the pen parks after each drawing, just past the grid's far corner
+rest_position = (grid_origin[0] + grid_size + 10, grid_origin[1] + grid_size + 10)
+# Mosaic region offset: top-left of the 108x50 mosaic, right of the grid
+mosaic_margin = 5
+mosaic_origin = (max(grid_origin[0] + grid_size + mosaic_margin, mosaic_margin), mosaic_margin)
+# Last position the pen was sent to, where the next drawing's route starts
+plotter_position = (0, 0)
 
-board = {i: ' ' for i in range(1, 10)}
+board = {i: ' ' for i in range(1, board_size * board_size + 1)}
 current_turn = 'X'
 game_over = False
 winner = None
+# How well Auto plays: 'easy', 'medium' or 'hard' (perfect play), see ttt_solver.DIFFICULTY
+AI_DIFFICULTY = 'medium'
+# Bumped on every change to the game; /state bodies are cached per version
+state_version = 0
+state_cond = threading.Condition()
+state_cache = {"version": None, "body": None, "etag": None}
+# Part of every ETag, so versions from before a restart never match
+state_epoch = int(time.time())
 
 # --- Serial message queue setup ---
 serial_queue = Queue()
 
-def serial_worker():
-    while True:
-        message = serial_queue.get()
-        if message is None:
-            break
-        ser.write(message)
-        serial_queue.task_done()
+protocol = blot_protocol.negotiate(ser, PROTOCOL_VERSION)
+print(f"Blot speaks command protocol v{protocol.version}")
+link = BlotLink(ser, serial_queue, acks=FLOW_CONTROL, max_batch=WRITE_BATCH, flush_latency=FLUSH_LATENCY,
+                decode=protocol.decode)
+link.start()
 
-serial_thread = threading.Thread(target=serial_worker, daemon=True)
-serial_thread.start()
+def wait_for_plotter():
+    """Block until every command queued so far has been acked by the Blot"""
+    link.wait_idle()
 
 # --- Blot commands ---
-def send_message(event, payload_bytes=b''):
-    global msg_count
-    event_bytes = event.encode('utf-8')
-    msg_len = len(event_bytes)
-    payload_len = len(payload_bytes)
-
-    message = bytearray()
-    message.append(msg_len)
-    message.extend(event_bytes)
-    message.append(payload_len)
-    message.extend(payload_bytes)
-    message.append(msg_count)
-
-    encoded = cobs.encode(message) + b'\x00'
-    serial_queue.put(encoded)
-    msg_count = (msg_count + 1) % 256
+# Encoders reuse buffers and track state, so frames are built one at a time
+send_lock = threading.Lock()
+
+def send_command(cmd):
+    """Encode a command tuple in the negotiated protocol and queue it"""
+    global msg_count, frames_queued
+    with send_lock:
+        seq = msg_count
+        serial_queue.put((seq, protocol.encode(cmd, seq)))
+        msg_count = (msg_count + 1) % 256
+        frames_queued += 1
+    return seq
+
+# --- Plot-time estimates ---
+# Kinematic model of the Blot (moves, pen lifts, motor settle, per-command overhead)
+estimator = Estimator(path=PLOT_CALIBRATION_PATH)
+
+def calibrate(cmds, start, measured):
+    """Feed a job's measured plot time back into the model"""
+    if estimator.record(cmds, start, measured) and PLOT_CALIBRATION_PATH:
+        estimator.save(PLOT_CALIBRATION_PATH)
+
+# --- Peephole stage ---
+# Every command passes through here. Each submission starts from unknown pen, motor and position
+# state, and a re-sent or dropped frame forgets it again, so only redundancy within a job is removed
+peephole = Peephole(estimator)
+link.on_resync = peephole.reset
+job_lock = threading.Lock()
+# Savings of the most recent jobs, served by /optimizer-stats
+job_reports = deque(maxlen=50)
+
+def submit(cmds):
+    """Optimize commands from unknown plotter state and queue them; returns what was sent"""
+    with job_lock:
+        peephole.reset()
+        cmds, report = peephole.optimize(cmds)
+        send_commands(cmds)
+    return cmds, report
+
+def run_job(name, cmds, start=None):
+    """Submit one job's commands together and record what the optimizer saved and what it should take"""
+    cmds, report = submit(cmds)
+    report["job"] = name
+    report["estimated_seconds"] = round(estimator.seconds(cmds, start), 2)
+    job_reports.append(report)
+    print(f"Job {name}: {report['commands_in']} -> {report['commands_out']} commands, "
+          f"{report['seconds_saved']}s saved, ~{report['estimated_seconds']}s")
+    return cmds, report
 
 def go(x, y):
-    payload = struct.pack('<ff', x, y)
-    send_message('go', payload)
+    submit([('go', x, y)])
 
 def pen_up():
-    send_message('servo', struct.pack('<i', 500))
+    submit([blot_protocol.PEN_UP])
 
 def pen_down():
-    send_message('servo', struct.pack('<i', 2500))
+    submit([blot_protocol.PEN_DOWN])
 
 def motors_on():
-    send_message('motorsOn')
+    submit([blot_protocol.MOTORS_ON])
 
 def motors_off():
-    send_message('motorsOff')
+    submit([blot_protocol.MOTORS_OFF])
+
+def trace(points):
+    """Pen-down moves through points: path frames on protocol v2, one bulk-encoded go each on v1"""
+    global msg_count, frames_queued
+    if not points:
+        return
+    if protocol.version >= 2:
+        if len(points) == 1:
+            send_command(('go',) + tuple(points[0]))
+            return
+        for chunk in blot_protocol.split_path(points):
+            send_command(('path', chunk))
+        return
+    with send_lock:
+        for frame in protocol.encode_path(points, msg_count):
+            serial_queue.put((msg_count, frame))
+            msg_count = (msg_count + 1) % 256
+            frames_queued += 1
+
+def send_commands(cmds):
+    for cmd in cmds:
+        if cmd[0] == 'path':
+            trace(cmd[1])
+        else:
+            send_command(cmd)
+
+# --- Drawing pipeline ---
+drawing_cache = DrawingCache(DRAWING_CACHE_SIZE, DRAWING_CACHE_PATH)
+mosaic = blot_mosaic.MosaicStore(MOSAIC_CANVAS_PATH, MOSAIC_LOG_PATH)
+# job id -> mosaic submission ids, so job status changes reach the log
+mosaic_jobs = {}
+mosaic_lock = threading.RLock()
+allocator = TileAllocator(mosaic.used_tiles(), MOSAIC_LEASE_SECONDS)
+# Plotter offset from mosaic_origin of the last tile submitted, where the next claimed tile should be near
+last_tile_offset = None
+
+def plot_passes(park=True, compiled=False, start=None):
+    start = plotter_position if start is None else start
+    if compiled:
+        # Cached shapes were optimized when compiled; only pick the nearer end to start from
+        return [blot_ir.clip, blot_ir.orient(start)]
+    return [blot_ir.clip, blot_ir.drop_empty,
+            blot_ir.order(start, rest_position if park else None)]
+
+def plan(drawing, park=True, compiled=False, start=None):
+    """Run the pass pipeline: clip to the workspace, drop empty moves, order strokes"""
+    return blot_ir.run_passes(drawing, plot_passes(park, compiled, start))
+
+def encode(drawing, park=True, compiled=False, start=None):
+    """The single encode step: plan a drawing into commands, lifting the pen first and parking after.
+    Returns the commands and where they leave the pen"""
+    start = plotter_position if start is None else start
+    ink = drawing.ink_length()
+    drawing = plan(drawing, park, compiled, start)
+    # Clipping only guards the hardware: ink it cut off means the drawing was placed wrong,
+    # so the job fails instead of reporting done with part of it missing
+    lost = ink - drawing.ink_length()
+    if lost > 1e-6 * (1 + ink):
+        raise ValueError(f"{lost:.1f} of {ink:.1f} units of ink fall outside the workspace {blot_ir.WORKSPACE}")
+    cmds = [blot_protocol.PEN_UP] + drawing.to_commands()
+    end = tuple(drawing.points[-1]) if len(drawing) else start
+    if park:
+        cmds.append(('go',) + rest_position)
+        end = rest_position
+    return cmds, end
+
+def job_commands(drawing, compiled=False, motors_off=False, park=True, start=None):
+    """Motors on, the drawing's commands, optionally motors off; and the pen's position after"""
+    cmds, end = encode(drawing, park, compiled, start)
+    cmds = [blot_protocol.MOTORS_ON] + cmds
+    return (cmds + [blot_protocol.MOTORS_OFF] if motors_off else cmds), end
+
+def drawing_job(drawing, compiled=False, motors_off=False, park=True):
+    """Build function for a scheduled job, planned from wherever the previous job left the pen"""
+    def build():
+        global plotter_position
+        cmds, plotter_position = job_commands(drawing, compiled, motors_off, park)
+        return cmds
+    return build
+
+def run_scheduled(job):
+    """Scheduler worker: plan the job now, send it as one unit and wait until it is plotted"""
+    job.frames_base = link.completed()
+    first = frames_queued
+    start = plotter_position
+    started = time.monotonic()
+    cmds, report = run_job(job.name, job.build(), start)
+    job.frames = frames_queued - first
+    # Planned and optimized, the job's commands give a better estimate than the one it was queued with
+    job.estimate = report["estimated_seconds"]
+    wait_for_plotter()
+    # Acks mean the wait ended when the Blot finished, so the elapsed time is the real plot time
+    if FLOW_CONTROL and PLOT_CALIBRATE_ONLINE and cmds:
+        calibrate(cmds, start, time.monotonic() - started)
+    return report
+
+# --- Events ---
+# One hub formats each event once and fans it out to every /events stream
+hub = EventHub()
+
+def publish_job(job):
+    hub.publish('job', job_status(job))
+    if job.done.is_set():
+        release_job(job)
+    if job.status != 'queued':
+        with mosaic_lock:
+            sub_ids = mosaic_jobs.pop(job.id, ()) if job.done.is_set() else list(mosaic_jobs.get(job.id, ()))
+        for sub_id in sub_ids:
+            mosaic.update(sub_id, job.status)
+            if job.status in ('cancelled', 'failed'):
+                tile = mosaic.submission(sub_id)["tile"]
+                if not mosaic.tile(tile):
+                    allocator.free(tile)
+
+def state_changed(previous=None):
+    """Bump the state version, wake long-polls and push the cells that changed since previous"""
+    global state_version
+    diff = {c: board[c] for c in board if previous is None or board[c] != previous[c]}
+    # Published under state_cond, so /events can snapshot and subscribe without missing a change
+    with state_cond:
+        state_version += 1
+        state_cond.notify_all()
+        hub.publish('state', {"version": state_version, "diff": diff, "reset": previous is None,
+                              "size": board_size, "k": win_length,
+                              "current_turn": current_turn, "game_over": game_over, "winner": winner})
+
+def state_snapshot():
+    """Serialized /state body and its ETag, built once per version"""
+    with state_cond:
+        if state_cache["version"] != state_version:
+            body = json.dumps({"board": board, "size": board_size, "k": win_length, "current_turn": current_turn,
+                               "game_over": game_over, "winner": winner, "version": state_version})
+            state_cache.update(version=state_version, body=body, etag=f"state-{state_epoch}-{state_version}")
+        return state_cache["body"], state_cache["etag"]
+
+def progress_loop():
+    """Single producer of progress events for the running job"""
+    last = None
+    while True:
+        time.sleep(PROGRESS_INTERVAL)
+        job = scheduler.current
+        if job is None:
+            continue
+        status = job_status(job)
+        if (job.id, status["progress"]) != last:
+            last = (job.id, status["progress"])
+            hub.publish('job', status)
+
+# --- Job scheduler ---
+# The only sender: jobs run one at a time, game moves ahead of mosaic tiles
+scheduler = JobScheduler(run_scheduled, on_change=publish_job)
+scheduler.start()
+threading.Thread(target=progress_loop, daemon=True).start()
+
+def schedule(name, drawing, priority=PRIORITY_MOSAIC, compiled=False, motors_off=False, park=True):
+    """Queue a drawing as one job and return it straight away"""
+    features = estimator.drawing_features(drawing, plotter_position, rest_position if park else None,
+                                          motors_on=True, motors_off=motors_off)
+    job = scheduler.submit(name, drawing_job(drawing, compiled, motors_off, park), priority,
+                           float(features @ estimator.weights))
+    job.commands = int(features[3])
+    return job
+
+def plot(drawing, priority=PRIORITY_MOSAIC, motors_off=True):
+    return schedule('plot', drawing, priority, motors_off=motors_off)
+
+def job_status(job):
+    """A job's state plus progress (fraction of its frames the plotter has finished) and ETA"""
+    status = job.to_dict()
+    estimate = job.estimate or 0.0
+    if job.status == 'running':
+        progress = 0.0
+        if job.frames:
+            progress = min((link.completed() - job.frames_base) / job.frames, 1.0)
+        eta = estimate * (1 - progress)
+    elif job.status == 'queued':
+        progress = 0.0
+        current = scheduler.current
+        eta = estimate + sum(j.estimate or 0.0 for j in scheduler.ahead_of(job))
+        if current is not None:
+            eta += job_status(current)["eta_seconds"]
+    else:
+        progress = 1.0 if job.status == 'done' else 0.0
+        eta = 0.0
+    status["progress"] = round(progress, 3)
+    status["eta_seconds"] = round(eta, 1)
+    return status
+
+def off_paper(drawing):
+    """400 response for a drawing that leaves the workspace, else None"""
+    if drawing.inside():
+        return None
+    return jsonify({"error": f"Drawing spans {drawing.bounds()}, outside the workspace {blot_ir.WORKSPACE}."}), 400
+
+def accepted(body, job):
+    """202 response carrying the job handle"""
+    body["job_id"] = job.id
+    body["status_url"] = f"/jobs/{job.id}"
+    return jsonify(body), 202
+
+# --- Admission control ---
+# client -> {job id: estimated seconds of that client's work in the job}, until the job finishes
+client_jobs = {}
+admission_stats = {"admitted": 0, "busy": 0, "over_quota": 0}
+
+def client_id(data=None):
+    return (data or {}).get('client') or request.remote_addr
+
+def backlog_seconds():
+    """Estimated seconds of plotting ahead of a job queued now: the running job's rest and every queued job"""
+    current = scheduler.current
+    seconds = sum(job.estimate or 0.0 for job in scheduler.queued())
+    if current is not None:
+        seconds += job_status(current)["eta_seconds"]
+    return seconds
+
+def queue_depth():
+    """Work between a request made now and the pen, in jobs, commands and estimated seconds"""
+    current = scheduler.current
+    queued = scheduler.queued()
+    commands = sum(job.commands or 0 for job in queued)
+    if current is not None:
+        if current.frames is not None:
+            commands += max(current.frames - (link.completed() - current.frames_base), 0)
+        else:
+            commands += current.commands or 0
+    return {"jobs": len(queued) + (current is not None), "commands": commands,
+            "seconds": round(backlog_seconds(), 1)}
+
+def refuse(status, message, retry_after, depth):
+    response = jsonify({"error": message, "retry_after": math.ceil(retry_after), "queue": depth})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(math.ceil(retry_after), 1))
+    return response
+
+def admit(seconds, client=None):
+    """None if mosaic work estimated at seconds may be queued now, else the 503/429 response refusing it.
+    Call with mosaic_lock held and queue the work before releasing it, so admissions cannot race"""
+    depth = queue_depth()
+    backlog = depth["seconds"]
+    # An idle plotter takes anything; otherwise the backlog must drain until the work fits the budget
+    if backlog and backlog + seconds > BACKLOG_BUDGET:
+        admission_stats["busy"] += 1
+        return refuse(503, f"The plotter is booked {backlog:.0f}s ahead; try again later.",
+                      min(backlog, backlog + seconds - BACKLOG_BUDGET), depth)
+    held = client_jobs.get(client, {})
+    booked = sum(held.values())
+    if client is not None and booked and booked + seconds > CLIENT_BUDGET:
+        admission_stats["over_quota"] += 1
+        # A slot opens when the client's first job is plotted
+        etas = [job_status(job)["eta_seconds"] for job in map(scheduler.get, held) if job is not None]
+        return refuse(429, f"{booked:.0f}s of your drawings are already queued; wait for some to be plotted.",
+                      min(etas, default=booked), depth)
+    admission_stats["admitted"] += 1
+    return None
+
+def charge(client, job, seconds):
+    """Book a client's share of a job against their quota until the job finishes"""
+    with mosaic_lock:
+        jobs = client_jobs.setdefault(client, {})
+        jobs[job.id] = jobs.get(job.id, 0.0) + seconds
+
+def release_job(job):
+    with mosaic_lock:
+        for client in [c for c, jobs in client_jobs.items() if job.id in jobs]:
+            del client_jobs[client][job.id]
+            if not client_jobs[client]:
+                del client_jobs[client]
+
+def schedule_mosaic(name, drawing, client):
+    """schedule() for mosaic-priority work behind admission control: (job, None) or (None, refusal)"""
+    with mosaic_lock:
+        refusal = admit(estimator.drawing_seconds(drawing, plotter_position, rest_position, True, True), client)
+        if refusal is not None:
+            return None, refusal
+        job = schedule(name, drawing, motors_off=True)
+        charge(client, job, job.estimate)
+    return job, None
+
+# --- Tile batches ---
+# Pixel-art tiles that arrive while a batch has not started join it: the batch
+# is planned as one drawing when it starts, so it gets one joint route, one
+# motor power cycle and one park instead of one of each per tile
+tile_batch = None
+batch_stats = {"batches": 0, "tiles": 0, "largest": 0}
+
+def batch_job(batch):
+    """Build function for a batch: closes it to new tiles, then plots them all as one drawing"""
+    def build():
+        with mosaic_lock:
+            batch["closed"] = True
+            tiles = list(batch["tiles"])
+        return drawing_job(sum(tiles[1:], tiles[0]), motors_off=True)()
+    return build
+
+def batch_tile(drawing):
+    """Add a placed tile to the waiting batch, or open a batch held for TILE_BATCH_WINDOW; returns its job"""
+    global tile_batch
+    with mosaic_lock:
+        batch = tile_batch
+        if (batch is None or batch["closed"] or batch["job"].status != 'queued'
+                or len(batch["tiles"]) >= TILE_BATCH_MAX):
+            batch = {"tiles": [], "closed": False}
+            # An empty batch still powers the motors up, parks and powers them down
+            base = estimator.drawing_features(blot_ir.Drawing(), plotter_position, rest_position,
+                                              motors_on=True, motors_off=True)
+            batch["job"] = scheduler.submit('pixel art', batch_job(batch), PRIORITY_MOSAIC,
+                                            float(base @ estimator.weights), TILE_BATCH_WINDOW)
+            batch["job"].commands = int(base[3])
+            tile_batch = batch
+            batch_stats["batches"] += 1
+        batch["tiles"].append(drawing)
+        job = batch["job"]
+        features = estimator.drawing_features(drawing)
+        job.estimate += float(features @ estimator.weights)
+        job.commands += int(features[3])
+        if len(batch["tiles"]) > 1:
+            job.name = f"pixel art x{len(batch['tiles'])}"
+        batch_stats["tiles"] += 1
+        batch_stats["largest"] = max(batch_stats["largest"], len(batch["tiles"]))
+        return job, len(batch["tiles"])
+
+# --- Shapes (local coordinates, placed with transforms) ---
+X_MARK = blot_ir.Drawing([[(-5, -5), (5, 5)], [(-5, 5), (5, -5)]])
+O_MARK = blot_ir.Drawing([[(-5, 0), (0, 5), (5, 0), (0, -5), (-5, 0)]])
+
+def rectangle(left, top, right, bottom):
+    return blot_ir.Drawing([[(left, top), (right, top), (right, bottom), (left, bottom), (left, top)]])
 
 def cell_center(cell):
-    col = (cell - 1) % 3
-    row = (cell - 1) // 3
+    col = (cell - 1) % board_size
+    row = (cell - 1) // board_size
     x = grid_origin[0] + col * cell_size + cell_size / 2
     y = grid_origin[1] + row * cell_size + cell_size / 2
     return (x, y)
 
 def draw_X(x, y):
-    pen_down()
-    go(x - 5, y - 5)
-    go(x + 5, y + 5)
-    pen_up()
-    go(x - 5, y + 5)
-    pen_down()
-    go(x + 5, y - 5)
-    pen_up()
+    return drawing_cache.get(('mark', 'X'), lambda: X_MARK).scale(cell_size / MARK_CELL).translate(x, y)
 
 def draw_O(x, y):
-    pen_down()
-    go(x - 5, y)
-    go(x, y + 5)
-    go(x + 5, y)
-    go(x, y - 5)
-    go(x - 5, y)
-    pen_up()
+    return drawing_cache.get(('mark', 'O'), lambda: O_MARK).scale(cell_size / MARK_CELL).translate(x, y)
 
 def draw_winning_line(winning_cells):
-    """Draw a line through the three winning cells"""
-    if not winning_cells or len(winning_cells) != 3:
-        return
-    
-    # Get the center coordinates of the three cells
-    centers = [cell_center(cell) for cell in winning_cells]
-    
+    """Line through the winning cells"""
+    if not winning_cells or len(winning_cells) < 2:
+        return blot_ir.Drawing()
     # Draw line from first to last cell
-    start_x, start_y = centers[0]
-    end_x, end_y = centers[2]
-    
-    pen_up()
-    go(start_x, start_y)
-    pen_down()
-    go(end_x, end_y)
-    pen_up()
+    return blot_ir.Drawing([[cell_center(winning_cells[0]), cell_center(winning_cells[-1])]])
 
 def draw_mark(player, cell):
     x, y = cell_center(cell)
-    go(x, y)
     if player == 'X':
-        draw_X(x, y)
-    elif player == 'O':
-        draw_O(x, y)
-    # Move to the opposite corner after drawing
-    go(grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)
-
-def check_winner():
-    lines = [
-        [1, 2, 3], [4, 5, 6], [7, 8, 9],
-        [1, 4, 7], [2, 5, 8], [3, 6, 9],
-        [1, 5, 9], [3, 5, 7]
-    ]
-    for line in lines:
-        if board[line[0]] == board[line[1]] == board[line[2]] and board[line[0]] != ' ':
-            return board[line[0]], line
-    if all(board[c] != ' ' for c in range(1, 10)):
-        return 'D', None
-    return None, None
+        return draw_X(x, y)
+    if player == 'O':
+        return draw_O(x, y)
+    return blot_ir.Drawing()
+
+def plot_mark(player, cell):
+    # Park at the opposite corner after drawing
+    return schedule(f"mark {player}{cell}", draw_mark(player, cell), PRIORITY_GAME, compiled=True)
+
+def plot_winning_line(winning_line):
+    return schedule('winning line', draw_winning_line(winning_line), PRIORITY_GAME, motors_off=True)
+
+def classic():
+    return board_size == 3 and win_length == 3
+
+def check_winner(board_state=None):
+    """(winner, winning line) of the board, or of board_state"""
+    board_state = board if board_state is None else board_state
+    if classic():
+        return ttt_engine.check_board(board_state)
+    return ttt_board.check_board(board_state, board_size, win_length)
 
 def check_winner_for_board(board_state):
     """Check winner for a given board state (used by AI)"""
-    lines = [
-        [1, 2, 3], [4, 5, 6], [7, 8, 9],
-        [1, 4, 7], [2, 5, 8], [3, 6, 9],
-        [1, 5, 9], [3, 5, 7]
-    ]
-    for line in lines:
-        if board_state[line[0]] == board_state[line[1]] == board_state[line[2]] and board_state[line[0]] != ' ':
-            return board_state[line[0]]
-    if all(board_state[c] != ' ' for c in range(1, 10)):
-        return 'D'
-    return None
+    if classic():
+        return ttt_engine.check_winner_for_board(board_state)
+    return ttt_board.check_board(board_state, board_size, win_length)[0]
 
-def ai_move():
-    available = [c for c in range(1, 10) if board[c] == ' ']
-    if not available:
-        return None
-    
-    # Check if AI can win in one move
-    for cell in available:
-        board_copy = board.copy()
-        board_copy[cell] = 'O'
-        winner = check_winner_for_board(board_copy)
-        if winner == 'O':
-            return cell
-    
-    # Check if player can win in one move and block it
-    for cell in available:
-        board_copy = board.copy()
-        board_copy[cell] = 'X'
-        winner = check_winner_for_board(board_copy)
-        if winner == 'X':
-            return cell
-    
-    # Otherwise, make a random move
-    return random.choice(available)
+def ai_move(difficulty=None, board_state=None):
+    difficulty = difficulty or AI_DIFFICULTY
+    board_state = board if board_state is None else board_state
+    if classic():
+        return ttt_solver.choose_move(board_state, 'O', difficulty)
+    # Larger boards are searched within AI_TIME_BUDGET, with the same blunder rate and horizon
+    level = ttt_solver.DIFFICULTY[difficulty]
+    free = [c for c in board_state if board_state[c] == ' ']
+    if free and random.random() < level["blunder"]:
+        return random.choice(free)
+    return ttt_board.best_move(board_state, board_size, win_length, 'O', AI_TIME_BUDGET, level["depth"])
 
-def draw_grid():
-    motors_on()
-    time.sleep(0.5)
-    for i in range(1, 3):
-        x = grid_origin[0] + i * cell_size
-        go(x, grid_origin[1])
-        pen_down()
-        go(x, grid_origin[1] + 3 * cell_size)
-        pen_up()
-    for i in range(1, 3):
-        y = grid_origin[1] + i * cell_size
-        go(grid_origin[0], y)
-        pen_down()
-        go(grid_origin[0] + 3 * cell_size, y)
-        pen_up()
-    # Move to the opposite corner after drawing grid
-    go(grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)
+# --- Speculative replies ---
+def compute_reply(board_state, difficulty):
+    """Auto's move for a position and its mark, ready to schedule"""
+    cell = ai_move(difficulty, board_state)
+    return cell, draw_mark('O', cell) if cell else blot_ir.Drawing()
+
+speculator = Speculator(compute_reply)
+
+def reply_key(board_state, difficulty):
+    return position_key(board_state, board_size, win_length, difficulty)
+
+def speculate_reply(board_state, difficulty=None, urgent=False):
+    difficulty = difficulty or AI_DIFFICULTY
+    speculator.request(reply_key(board_state, difficulty), (dict(board_state), difficulty), urgent)
+
+def speculate_replies():
+    """While the player thinks, precompute Auto's reply to each move they are likely to make"""
+    free = [c for c in board if board[c] == ' ']
+    if not classic():
+        b = ttt_board.Board.from_dict(board, board_size, win_length)
+        near = sorted(b.candidates(), key=lambda c: -b.move_priority(c, 0))
+        free = [c + 1 for c in near[:SPECULATE_WIDTH]]
+    for cell in free:
+        after = dict(board)
+        after[cell] = 'X'
+        if check_winner_for_board(after) is None:
+            speculate_reply(after)
+
+def compiled_tile(pattern, mode):
+    """A 5x6 tile's fill turned onto the paper (blot_mosaic.TILE_TO_PLOTTER) with its top-left pixel
+    at (0, 0), cached by mode and pixel bitmask"""
+    key = ('mosaic tile', mode, blot_fill.pattern_bitmask(pattern))
+    return drawing_cache.get(key, lambda: blot_ir.Drawing(blot_fill.tile_strokes(pattern, mode))
+                                               .transform(blot_mosaic.TILE_TO_PLOTTER))
+
+def place_tile(drawing, x, y):
+    """A compiled tile moved to mosaic offset (x, y)"""
+    dx, dy = blot_mosaic.plot_offset(x, y)
+    return drawing.translate(mosaic_origin[0] + dx, mosaic_origin[1] + dy)
+
+def mosaic_bounds():
+    """(left, top, right, bottom) of the mosaic on paper, the rectangle /draw-large-area-rectangle draws"""
+    return (mosaic_origin[0], mosaic_origin[1],
+            mosaic_origin[0] + blot_mosaic.PLOT_WIDTH, mosaic_origin[1] + blot_mosaic.PLOT_HEIGHT)
+
+def check_mosaic_layout():
+    """Fail at startup unless every tile, fully inked, lands inside the mosaic boundary and the workspace"""
+    left, top, right, bottom = mosaic_bounds()
+    wx0, wy0, wx1, wy1 = blot_ir.WORKSPACE
+    if not (wx0 <= left and wy0 <= top and right <= wx1 and bottom <= wy1):
+        raise RuntimeError(f"Mosaic boundary {mosaic_bounds()} leaves the workspace {blot_ir.WORKSPACE}")
+    full = blot_ir.Drawing(blot_fill.tile_strokes([[1] * blot_fill.PATTERN_COLS] * blot_fill.PATTERN_ROWS, 'crosshatch'))
+    full = full.transform(blot_mosaic.TILE_TO_PLOTTER)
+    for index in range(blot_mosaic.TILE_COUNT):
+        x0, y0, x1, y1 = place_tile(full, *blot_mosaic.tile_offset(index)).bounds()
+        if not (left <= x0 and top <= y0 and x1 <= right and y1 <= bottom):
+            raise RuntimeError(f"Mosaic tile {index} plots at ({x0}, {y0})-({x1}, {y1}), outside {mosaic_bounds()}")
+
+check_mosaic_layout()
+
+def draw_grid(size=None):
+    size = size or board_size
+    cell = grid_size / size
+    lines = [[(i * cell, 0), (i * cell, grid_size)] for i in range(1, size)]
+    lines += [[(0, i * cell), (grid_size, i * cell)] for i in range(1, size)]
+    return blot_ir.Drawing(lines).translate(*grid_origin)
 
 # --- Draw text letters ---
 def draw_text(text, start_x, start_y, spacing=8):
+    drawing = blot_ir.Drawing()
     x = start_x
     for char in text.upper():
         func = letter_funcs.get(char)
         if func:
-            func(x, start_y)
+            drawing = drawing + drawing_cache.get(('glyph', char), func).translate(x, start_y)
         x += spacing
+    return drawing
 
-def draw_letter_Y(x, y, s=5):
-    pen_down(); go(x, y + s); go(x + s/2, y + s/2)
-    pen_up(); go(x + s, y + s)
-    pen_down(); go(x + s/2, y + s/2); go(x + s/2, y); pen_up()
+# Letters are drawn from their bottom-left corner at (0, 0)
+def draw_letter_Y(s=5):
+    return blot_ir.Drawing([[(0, 0), (0, s), (s/2, s/2)], [(s, s), (s/2, s/2), (s/2, 0)]])
 
-def draw_letter_O(x, y, s=5):
-    pen_down(); go(x, y); go(x, y + s); go(x + s, y + s)
-    go(x + s, y); go(x, y); pen_up()
+def draw_letter_O(s=5):
+    return blot_ir.Drawing([[(0, 0), (0, s), (s, s), (s, 0), (0, 0)]])
 
-def draw_letter_U(x, y, s=5):
-    pen_down(); go(x, y + s); pen_up()
-    go(x, y); pen_down(); go(x + s, y)
-    go(x + s, y + s); pen_up()
+def draw_letter_U(s=5):
+    return blot_ir.Drawing([[(0, 0), (0, s)], [(0, 0), (s, 0), (s, s)]])
 
-def draw_letter_W(x, y, s=5):
-    pen_down(); go(x, y + s); go(x + s/2, y)
-    go(x + s, y + s); pen_up()
+def draw_letter_W(s=5):
+    return blot_ir.Drawing([[(0, 0), (0, s), (s/2, 0), (s, s)]])
 
-def draw_letter_I(x, y, s=5):
-    pen_down(); go(x, y + s); pen_up()
+def draw_letter_I(s=5):
+    return blot_ir.Drawing([[(0, 0), (0, s)]])
 
-def draw_letter_N(x, y, s=5):
-    pen_down(); go(x, y); go(x, y + s); go(x + s, y)
-    go(x + s, y + s); pen_up()
+def draw_letter_N(s=5):
+    return blot_ir.Drawing([[(0, 0), (0, s), (s, 0), (s, s)]])
 
-def draw_letter_L(x, y, s=5):
-    pen_down(); go(x, y + s); pen_up()
-    go(x, y); pen_down(); go(x + s, y); pen_up()
+def draw_letter_L(s=5):
+    return blot_ir.Drawing([[(0, 0), (0, s)], [(0, 0), (s, 0)]])
 
-def draw_exclamation(x, y, s=5):
-    pen_down(); go(x, y + s); pen_up()
-    go(x, y - s/2); pen_down(); go(x, y - s/2 + 1); pen_up()
+def draw_exclamation(s=5):
+    return blot_ir.Drawing([[(0, 0), (0, s)], [(0, -s/2), (0, -s/2 + 1)]])
 
-def draw_space(x, y, s=5):
-    pass
+def draw_space(s=5):
+    return blot_ir.Drawing()
 
 letter_funcs = {
     'Y': draw_letter_Y, 'O': draw_letter_O, 'U': draw_letter_U,
@@ -248,23 +692,167 @@ letter_funcs = {
     'L': draw_letter_L, '!': draw_exclamation, ' ': draw_space
 }
 
-# --- Async mark draw ---
-def async_draw_mark(player, cell):
-    t = threading.Thread(target=draw_mark, args=(player, cell))
-    t.start()
+# --- Image import ---
+import_runs = {}
+import_ids = itertools.count(1)
+active_import = None
+
+def placed_tile(index, mask, mode):
+    return place_tile(compiled_tile(blot_fill.bitmask_pattern(mask), mode), *blot_mosaic.tile_offset(index))
+
+def pixel_array(pixels):
+    """A JSON bitmap as a bool array, or None when it is ragged or holds anything but numbers"""
+    try:
+        array = np.asarray(pixels)
+        if array.dtype.kind not in 'biuf':
+            return None
+        return array.astype(bool)
+    except (ValueError, TypeError):
+        return None
+
+def missing_pixels(run, tile):
+    """Target pixels of a tile not inked yet; ink cannot come off, so only these are plotted"""
+    return int(run.masks[tile]) & ~mosaic.tile(tile)
+
+def plan_import(run):
+    """Route every tile that still needs ink as one pass from the pen, with per-tile estimates.
+    Tiles that would plot outside the mosaic boundary are reported in run.clipped, not planned"""
+    placed = {}
+    for tile in range(blot_mosaic.TILE_COUNT):
+        need = missing_pixels(run, tile)
+        if not need:
+            continue
+        drawing = placed_tile(tile, need, run.mode)
+        if drawing.inside(mosaic_bounds()):
+            placed[tile] = drawing
+        else:
+            run.clipped.append(tile)
+    ends = {t: (tuple(d.points[0]), tuple(d.points[-1])) for t, d in placed.items() if len(d)}
+    run.order = blot_image.order_tiles(ends, plotter_position, rest_position)
+    pos = plotter_position
+    for tile in run.order:
+        run.estimates[tile] = estimator.drawing_seconds(placed[tile], pos)
+        pos = ends[tile][1]
+
+def publish_import(run):
+    hub.publish('import', run.to_dict())
+
+def feed_import(run):
+    """Plot an import one tile job at a time, so game moves can cut in between tiles"""
+    run.status = 'running'
+    publish_import(run)
+    try:
+        for tile in run.order:
+            if run.cancelled.is_set():
+                break
+            need = missing_pixels(run, tile)
+            if not need:
+                run.skipped.append(tile)
+                continue
+            if not allocator.take(tile):
+                run.reserved.append(tile)
+                continue
+            with mosaic_lock:
+                job = schedule(f"import tile {tile}", placed_tile(tile, need, run.mode), compiled=True, park=False)
+                mosaic_jobs[job.id] = [mosaic.submit(tile, need, run.mode)]
+            run.job = job
+            job.wait()
+            if job.status == 'cancelled':
+                run.cancelled.set()
+            if job.status != 'done':
+                run.error = job.error
+                break
+            run.done.append(tile)
+            publish_import(run)
+        if run.clipped and not run.error:
+            run.error = f"{len(run.clipped)} tiles fall outside the mosaic boundary and were not plotted"
+    except Exception as e:
+        run.error = str(e)
+    finally:
+        # Tiles are plotted without parking; the import parks and powers down once at the end
+        schedule('import park', blot_ir.Drawing(), motors_off=True)
+        run.status = 'cancelled' if run.cancelled.is_set() else 'failed' if run.error else 'done'
+        run.finished_at = time.time()
+        publish_import(run)
+
+def start_import(masks, mode, kind='image'):
+    global active_import
+    run = blot_image.ImportRun(next(import_ids), masks, mode, kind)
+    run.save(MOSAIC_IMPORT_PATH)
+    plan_import(run)
+    import_runs[run.id] = run
+    active_import = run
+    threading.Thread(target=feed_import, args=(run,), daemon=True).start()
+    return run
+
+def import_accepted(run):
+    body = run.to_dict()
+    body["status_url"] = f"/mosaic/import/{run.id}"
+    return jsonify(body), 202
+
+def admitted_import(masks, mode, kind='image'):
+    """start_import() unless the plotter is booked past BACKLOG_BUDGET: (run, None) or (None, refusal).
+    Runs queue a tile at a time, so they share the plotter with kiosks and have no client quota"""
+    with mosaic_lock:
+        refusal = admit(0.0)
+        if refusal is not None:
+            return None, refusal
+        return start_import(masks, mode, kind), None
+
+# --- Dry runs ---
+# ?dry_run=1 on a drawing endpoint plans and estimates what it would plot,
+# without queueing anything or changing the game, mosaic or leases
+def dry_run():
+    return request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+
+def dry_run_response(body, *jobs):
+    """200 with the commands and estimated seconds of jobs given as (drawing, compiled, motors_off, park),
+    planned one after another from the pen's current position"""
+    optimizer = Peephole(estimator)
+    pos = plotter_position
+    cmds = []
+    for drawing, compiled, motors_off, park in jobs:
+        job_cmds, pos = job_commands(drawing, compiled, motors_off, park, pos)
+        optimizer.reset()
+        cmds += optimizer.optimize(job_cmds)[0]
+    body.update(dry_run=True, jobs=len(jobs), strokes=sum(len(job[0]) for job in jobs),
+                commands=len(blot_protocol.expand_paths(cmds)),
+                estimated_seconds=round(estimator.seconds(cmds, plotter_position), 1),
+                breakdown=estimator.breakdown(cmds, plotter_position),
+                starts_in_seconds=round(backlog_seconds(), 1))
+    return jsonify(body)
+
+def import_dry_run(masks, mode, kind='image'):
+    """Body for an import that would plot these tiles: its plan and estimated seconds, without starting it"""
+    run = blot_image.ImportRun(None, masks, mode, kind)
+    plan_import(run)
+    return {"dry_run": True, "kind": kind, "mode": mode, "tiles_total": len(run.order), "tiles_clipped": run.clipped,
+            "estimated_seconds": round(sum(run.estimates.values()), 1), "starts_in_seconds": round(backlog_seconds(), 1)}
 
 # --- Routes ---
 @app.route("/start", methods=['POST'])
 def start_game():
-    global board, current_turn, game_over, winner
-    board = {i: ' ' for i in range(1, 10)}
+    global board, current_turn, game_over, winner, board_size, win_length, cell_size
+    data = request.get_json(silent=True) or {}
+    size = data.get('size', BOARD_SIZE)
+    k = data.get('k', min(WIN_LENGTH, size) if isinstance(size, int) else WIN_LENGTH)
+    if not (isinstance(size, int) and isinstance(k, int)
+            and ttt_board.MIN_SIZE <= size <= ttt_board.MAX_SIZE and 3 <= k <= size):
+        return jsonify({"error": f"Board must be {ttt_board.MIN_SIZE} to {ttt_board.MAX_SIZE} cells wide "
+                                 f"with 3 to size in a row."}), 400
+    if dry_run():
+        return dry_run_response({"size": size, "k": k}, (draw_grid(size), False, False, True))
+    board_size, win_length = size, k
+    cell_size = grid_size / board_size
+    board = {i: ' ' for i in range(1, board_size * board_size + 1)}
     current_turn = 'X'
     game_over = False
     winner = None
-    motors_on()
-    time.sleep(1)
-    draw_grid()
-    return jsonify({"message": "New game started."})
+    state_changed()
+    speculator.clear()
+    speculate_replies()
+    job = schedule('grid', draw_grid(), PRIORITY_GAME)
+    return accepted({"message": "New game started.", "size": board_size, "k": win_length}, job)
 
 @app.route("/move", methods=['POST'])
 def make_move():
@@ -275,28 +863,40 @@ def make_move():
     data = request.get_json()
     move = data.get('move')
 
-    if not (1 <= move <= 9) or board[move] != ' ':
+    if not isinstance(move, int) or not (1 <= move <= board_size * board_size) or board[move] != ' ':
         return jsonify({"error": "Invalid move."}), 400
 
+    if dry_run():
+        after = dict(board)
+        after[move] = current_turn
+        would_win, winning_line = check_winner(after)
+        jobs = [(draw_mark(current_turn, move), True, False, True)]
+        if would_win:
+            jobs.append((draw_winning_line(winning_line), False, True, True))
+        return dry_run_response({"move": move, "winner": would_win}, *jobs)
+
+    previous = dict(board)
     board[move] = current_turn
-    async_draw_mark(current_turn, move)
+    mark_job = plot_mark(current_turn, move)
     winner, winning_line = check_winner()
-
     if winner:
         game_over = True
-        time.sleep(0.5)
-        if winning_line:
-            draw_winning_line(winning_line)
-        motors_off()
-        return jsonify({"winner": winner, "board": board})
-
-    # Don't make AI move immediately - let frontend handle the delay
-    # Just return the current state after player's move
-    return jsonify({
+    state_changed(previous)
+
+    if winner:
+        speculator.clear()
+        # Same priority, so the winning line runs after the whole mark
+        job = plot_winning_line(winning_line)
+        return accepted({"winner": winner, "board": board, "mark_job_id": mark_job.id}, job)
+
+    # Don't make AI move immediately - let frontend handle the delay,
+    # but work out the reply now unless it is already waiting
+    speculate_reply(board, urgent=True)
+    return accepted({
         "board": board,
         "current_turn": "O",  # AI's turn next
         "winner": winner
-    })
+    }, mark_job)
 
 @app.route("/ai-move", methods=['POST'])
 def ai_move_endpoint():
@@ -307,66 +907,311 @@ def ai_move_endpoint():
         return jsonify({"error": "Game over."}), 400
 
     # AI move
-    ai = ai_move()
+    difficulty = (request.get_json(silent=True) or {}).get('difficulty', AI_DIFFICULTY)
+    if difficulty not in ttt_solver.DIFFICULTY:
+        return jsonify({"error": f"Difficulty must be one of {', '.join(ttt_solver.DIFFICULTY)}."}), 400
+    if dry_run():
+        # Auto's choice is worked out here but not kept, so easier levels may pick differently for real
+        ai, mark = compute_reply(board, difficulty)
+        after = dict(board)
+        if ai:
+            after[ai] = 'O'
+        would_win, winning_line = check_winner(after)
+        jobs = [(mark, True, False, True)]
+        if would_win:
+            jobs.append((draw_winning_line(winning_line), False, True, True))
+        return dry_run_response({"move": ai, "winner": would_win}, *jobs)
+    reply = speculator.take(reply_key(board, difficulty))
+    speculated = reply is not None
+    ai, mark = reply if speculated else compute_reply(board, difficulty)
+    job = None
     if ai:
+        previous = dict(board)
         board[ai] = 'O'
-        # Draw the AI move synchronously (wait for it to complete)
-        draw_mark('O', ai)
+        job = schedule(f"mark O{ai}", mark, PRIORITY_GAME, compiled=True)
         winner, winning_line = check_winner()
         if winner:
             game_over = True
-            time.sleep(0.5)
-            if winning_line:
-                draw_winning_line(winning_line)
-            motors_off()
+        state_changed(previous)
+        if not winner:
+            speculate_replies()
+        if winner:
+            # The handle returned is the last job, so done means the whole move is on paper
+            job = plot_winning_line(winning_line)
 
-    return jsonify({
+    body = {
         "board": board,
         "current_turn": "X",  # Player's turn next
-        "winner": winner
-    })
+        "winner": winner,
+        "speculated": speculated
+    }
+    if job is None:
+        return jsonify(body)
+    return accepted(body, job)
 
 @app.route("/state", methods=['GET'])
 def state():
-    return jsonify({
-        "board": board,
-        "current_turn": current_turn,
-        "game_over": game_over,
-        "winner": winner
-    })
+    """Game state with an ETag; ?since=<version>&wait=<s> blocks until the version moves past since"""
+    since = request.args.get('since', type=int)
+    wait = min(request.args.get('wait', 0, type=float), STATE_MAX_WAIT)
+    if since is not None and wait > 0:
+        with state_cond:
+            state_cond.wait_for(lambda: state_version != since, timeout=wait)
+    body, etag = state_snapshot()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route("/events", methods=['GET'])
+def events():
+    """Server-sent events: 'state' for board diffs, turn and winner, 'job' for plot status and progress"""
+    with state_cond:
+        snapshot = {"version": state_version, "diff": dict(board), "reset": True, "size": board_size,
+                    "k": win_length, "current_turn": current_turn, "game_over": game_over, "winner": winner}
+        sub = hub.subscribe([('state', snapshot)])
+    return Response(hub.stream(sub), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/events-stats", methods=['GET'])
+def events_stats():
+    return jsonify(hub.snapshot())
+
+@app.route("/serial-stats", methods=['GET'])
+def serial_stats():
+    return jsonify(link.snapshot())
+
+@app.route("/jobs", methods=['GET'])
+def list_jobs():
+    current = scheduler.current
+    return jsonify({"running": job_status(current) if current else None,
+                    "queued": [job_status(job) for job in scheduler.queued()], "depth": queue_depth()})
+
+@app.route("/queue", methods=['GET'])
+def queue_state():
+    """Queue depth, the admission budgets, what each client has queued and how many requests were refused"""
+    with mosaic_lock:
+        clients = {client: round(sum(jobs.values()), 1) for client, jobs in client_jobs.items()}
+        stats = dict(admission_stats)
+    return jsonify({"depth": queue_depth(), "budget_seconds": BACKLOG_BUDGET, "client_budget_seconds": CLIENT_BUDGET,
+                    "clients": clients, "admission": stats})
+
+@app.route("/jobs/<int:job_id>", methods=['GET'])
+def get_job(job_id):
+    job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job_status(job))
+
+@app.route("/jobs/<int:job_id>/cancel", methods=['POST'])
+def cancel_job(job_id):
+    if not scheduler.cancel(job_id):
+        return jsonify({"error": "Job is not queued."}), 409
+    return jsonify({"message": f"Job {job_id} cancelled."})
+
+@app.route("/jobs/<int:job_id>/priority", methods=['POST'])
+def reprioritize_job(job_id):
+    priority = (request.get_json() or {}).get('priority')
+    if not isinstance(priority, int):
+        return jsonify({"error": "Priority must be an integer."}), 400
+    if not scheduler.reprioritize(job_id, priority):
+        return jsonify({"error": "Job is not queued."}), 409
+    return jsonify({"message": f"Job {job_id} moved to priority {priority}."})
+
+@app.route("/speculation-stats", methods=['GET'])
+def speculation_stats():
+    return jsonify(speculator.snapshot())
+
+@app.route("/mosaic", methods=['GET'])
+def mosaic_state():
+    body = mosaic.snapshot()
+    body["tiles"] = [int(m) for m in mosaic.masks()]
+    return jsonify(body)
+
+@app.route("/mosaic/tiles/<int:index>", methods=['GET'])
+def mosaic_tile(index):
+    if not 0 <= index < blot_mosaic.TILE_COUNT:
+        return jsonify({"error": f"Tile must be 0-{blot_mosaic.TILE_COUNT - 1}."}), 404
+    x, y = blot_mosaic.tile_offset(index)
+    return jsonify({"tile": index, "x": x, "y": y, "pattern": blot_fill.bitmask_pattern(mosaic.tile(index)),
+                    "submissions": mosaic.history(index)})
+
+@app.route("/mosaic/claim", methods=['POST'])
+def mosaic_claim():
+    data = request.get_json(silent=True) or {}
+    client = client_id(data)
+    if last_tile_offset is not None:
+        near = last_tile_offset
+    else:
+        near = (plotter_position[0] - mosaic_origin[0], plotter_position[1] - mosaic_origin[1])
+    lease = allocator.claim(client, near)
+    if lease is None:
+        return jsonify({"error": "No free tiles left in the mosaic."}), 409
+    return jsonify(lease.to_dict())
+
+@app.route("/mosaic/leases/<token>/renew", methods=['POST'])
+def mosaic_renew(token):
+    lease = allocator.renew(token)
+    if lease is None:
+        return jsonify({"error": "Lease expired or unknown."}), 404
+    return jsonify(lease.to_dict())
+
+@app.route("/mosaic/leases/<token>/release", methods=['POST'])
+def mosaic_release(token):
+    if not allocator.release(token):
+        return jsonify({"error": "Lease expired or unknown."}), 404
+    return jsonify({"released": True})
+
+@app.route("/mosaic/leases", methods=['GET'])
+def mosaic_leases():
+    return jsonify(allocator.snapshot())
+
+@app.route("/mosaic/import", methods=['POST'])
+def mosaic_import():
+    if not dry_run() and active_import is not None and active_import.status in ('queued', 'running'):
+        return jsonify({"error": f"Import {active_import.id} is still running."}), 409
+    data = request.get_json(silent=True) or request.form
+    dither = data.get('dither', blot_image.DEFAULT_DITHER)
+    mode = data.get('mode', blot_fill.DEFAULT_MODE)
+    if dither not in blot_image.DITHERS:
+        return jsonify({"error": f"Dither must be one of {', '.join(blot_image.DITHERS)}."}), 400
+    if mode not in blot_fill.QUALITY_MODES:
+        return jsonify({"error": f"Mode must be one of {', '.join(blot_fill.QUALITY_MODES)}."}), 400
+    if 'image' in request.files:
+        try:
+            canvas = blot_image.image_canvas(request.files['image'].stream, dither)
+        except RuntimeError as e:
+            return jsonify({"error": str(e)}), 501
+        except (OSError, ValueError) as e:
+            return jsonify({"error": f"Could not read image: {e}"}), 400
+    elif data.get('pixels') is not None:
+        canvas = pixel_array(data['pixels'])
+        if canvas is None or canvas.shape != (blot_mosaic.MOSAIC_ROWS, blot_mosaic.MOSAIC_COLS):
+            return jsonify({"error": f"Pixels must be a {blot_mosaic.MOSAIC_ROWS}x{blot_mosaic.MOSAIC_COLS} array of 0/1."}), 400
+    else:
+        return jsonify({"error": "Send an 'image' file or a 'pixels' array."}), 400
+    if dry_run():
+        return jsonify(import_dry_run(blot_mosaic.canvas_to_masks(canvas), mode))
+    run, refusal = admitted_import(blot_mosaic.canvas_to_masks(canvas), mode)
+    if refusal is not None:
+        return refusal
+    return import_accepted(run)
+
+@app.route("/mosaic/diff", methods=['POST'])
+def mosaic_diff():
+    """Plot only the pixels of a bitmap that are not inked yet; report the inked ones it wants blank"""
+    data = request.get_json()
+    pixels = data.get('pixels')
+    if pixels is None:
+        return jsonify({"error": "Missing parameters."}), 400
+    target = pixel_array(pixels)
+    row, col = data.get('row', 0), data.get('col', 0)
+    rows, cols = blot_mosaic.MOSAIC_ROWS, blot_mosaic.MOSAIC_COLS
+    if (target is None or target.ndim != 2 or not (isinstance(row, int) and isinstance(col, int))
+            or row < 0 or col < 0 or row + target.shape[0] > rows or col + target.shape[1] > cols):
+        return jsonify({"error": f"Pixels must be a 2D array of 0/1 inside the {rows}x{cols} mosaic at (row, col)."}), 400
+    mode = data.get('mode', blot_fill.DEFAULT_MODE)
+    if mode not in blot_fill.QUALITY_MODES:
+        return jsonify({"error": f"Mode must be one of {', '.join(blot_fill.QUALITY_MODES)}."}), 400
+    inked = mosaic.canvas()
+    region = (slice(row, row + target.shape[0]), slice(col, col + target.shape[1]))
+    to_plot, unplottable = blot_mosaic.diff(inked[region], target)
+    body = {"new_pixels": int(to_plot.sum()),
+            "unplottable": [[row + int(r), col + int(c)] for r, c in np.argwhere(unplottable)]}
+    if not body["new_pixels"]:
+        body["message"] = "Nothing new to plot."
+        return jsonify(body)
+    # The run's target is what is inked plus the new pixels, so it plans exactly the difference
+    inked[region] |= to_plot
+    if dry_run():
+        body.update(import_dry_run(blot_mosaic.canvas_to_masks(inked), mode, 'diff'))
+        return jsonify(body)
+    if active_import is not None and active_import.status in ('queued', 'running'):
+        return jsonify({"error": f"Import {active_import.id} is still running."}), 409
+    run, refusal = admitted_import(blot_mosaic.canvas_to_masks(inked), mode, 'diff')
+    if refusal is not None:
+        return refusal
+    body.update(run.to_dict())
+    body["status_url"] = f"/mosaic/import/{body['id']}"
+    return jsonify(body), 202
+
+@app.route("/mosaic/import/resume", methods=['POST'])
+def mosaic_import_resume():
+    """Start the latest import again; tiles already inked are skipped"""
+    run = active_import
+    if run is not None and run.status in ('queued', 'running'):
+        return jsonify({"error": f"Import {run.id} is still running."}), 409
+    if run is None:
+        try:
+            run = blot_image.ImportRun.load(MOSAIC_IMPORT_PATH)
+        except (OSError, ValueError, KeyError) as e:
+            return jsonify({"error": f"No import to resume: {e}"}), 404
+    run, refusal = admitted_import(run.masks, run.mode, run.kind)
+    if refusal is not None:
+        return refusal
+    return import_accepted(run)
+
+@app.route("/mosaic/import/<int:run_id>", methods=['GET'])
+def mosaic_import_status(run_id):
+    run = import_runs.get(run_id)
+    if run is None:
+        return jsonify({"error": "Unknown import."}), 404
+    return jsonify(run.to_dict())
+
+@app.route("/mosaic/import/<int:run_id>/cancel", methods=['POST'])
+def mosaic_import_cancel(run_id):
+    run = import_runs.get(run_id)
+    if run is None:
+        return jsonify({"error": "Unknown import."}), 404
+    run.cancelled.set()
+    if run.job is not None:
+        scheduler.cancel(run.job.id)
+    return jsonify(run.to_dict())
+
+@app.route("/mosaic/log", methods=['GET'])
+def mosaic_log():
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({"submissions": mosaic.recent(max(limit, 0))})
+
+@app.route("/estimator", methods=['GET'])
+def estimator_stats():
+    return jsonify(estimator.snapshot())
+
+@app.route("/cache-stats", methods=['GET'])
+def cache_stats():
+    return jsonify(drawing_cache.snapshot())
+
+@app.route("/optimizer-stats", methods=['GET'])
+def optimizer_stats():
+    batches = dict(batch_stats)
+    batches["tiles_per_batch"] = round(batches["tiles"] / batches["batches"], 2) if batches["batches"] else 0.0
+    return jsonify({"totals": peephole.totals, "jobs": list(job_reports), "tile_batches": batches})
 
 @app.route("/draw-rectangle", methods=['POST'])
 def draw_rectangle():
     # Rectangle bounds
-    left = grid_origin[0] + 3 * cell_size + 3  # 3 units away from grid
+    left = grid_origin[0] + grid_size + 3  # 3 units away from grid
     right = 120
     top = 5
     bottom = 120
     if left >= right:
         return jsonify({"error": "Not enough space for rectangle."}), 400
 
-    motors_on()
-    time.sleep(0.2)
-    pen_up()
-    # Outer rectangle
-    go(left, top)
-    pen_down()
-    go(right, top)
-    go(right, bottom)
-    go(left, bottom)
-    go(left, top)
-    pen_up()
-    # Inner rectangle (1 unit in)
-    go(left + 1, top + 1)
-    pen_down()
-    go(right - 1, top + 1)
-    go(right - 1, bottom - 1)
-    go(left + 1, bottom - 1)
-    go(left + 1, top + 1)
-    pen_up()
-    go(grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)  # Resting position
-    motors_off()
-    return jsonify({"message": "Rectangle drawn."})
+    # Outer rectangle, then the inner one 1 unit in
+    outer = rectangle(left, top, right, bottom)
+    inner = rectangle(left + 1, top + 1, right - 1, bottom - 1)
+    refusal = off_paper(outer + inner)
+    if refusal is not None:
+        return refusal
+    if dry_run():
+        return dry_run_response({}, (outer + inner, False, True, True))
+    job, refusal = schedule_mosaic('rectangle', outer + inner, client_id(request.get_json(silent=True)))
+    if refusal is not None:
+        return refusal
+    return accepted({"message": "Rectangle queued."}, job)
 
 @app.route("/draw-pixel-square", methods=['POST'])
 def draw_pixel_square():
@@ -380,96 +1225,97 @@ def draw_pixel_square():
         return jsonify({"error": "Missing parameters."}), 400
     if not fill:
         return jsonify({"message": "Blank square, nothing drawn."})
-    motors_on()
-    time.sleep(0.1)
-    pen_up()
-    go(x, y)
-    pen_down()
-    go(x + w, y)
-    go(x + w, y + h)
-    go(x, y + h)
-    go(x, y)
-    pen_up()
-    go(grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)  # Resting position
-    motors_off()
-    return jsonify({"message": "Square drawn."})
+    square = rectangle(x, y, x + w, y + h)
+    refusal = off_paper(square)
+    if refusal is not None:
+        return refusal
+    if dry_run():
+        return dry_run_response({}, (square, False, True, True))
+    job, refusal = schedule_mosaic('pixel square', square, client_id(data))
+    if refusal is not None:
+        return refusal
+    return accepted({"message": "Square queued."}, job)
 
 @app.route("/draw-pixel-art-square", methods=['POST'])
 def draw_pixel_art_square():
+    global last_tile_offset
     data = request.get_json()
     x = data.get('x')
     y = data.get('y')
+    token = data.get('token')
     pattern = data.get('pattern')
-    if x is None or y is None or pattern is None:
+    if (token is None and (x is None or y is None)) or pattern is None:
         return jsonify({"error": "Missing parameters."}), 400
     if not (isinstance(pattern, list) and len(pattern) == 5 and all(isinstance(row, list) and len(row) == 6 for row in pattern)):
         return jsonify({"error": "Pattern must be a 5x6 array."}), 400
-    # Mosaic region offset
-    margin = 5
-    left = max(grid_origin[0] + 3 * cell_size + margin, margin)
-    top = 5
-    motors_on()
-    time.sleep(0.1)
-    pen_up()
-    for row in range(5):
-        for col in range(6):
-            if pattern[row][col]:
-                # Rotate 90 degrees: (row, col) -> (col, 4-row)
-                px = left + x + col
-                py = top + y + (4 - row)
-                for pass_num in range(2):  # Draw each square twice
-                    print(f"Drawing square at ({px}, {py}), pass {pass_num+1}, pen_down")
-                    go(px, py)
-                    pen_down()
-                    time.sleep(0.3)
-                    go(px + 1, py)
-                    print(f"  Line to ({px+1}, {py})")
-                    time.sleep(0.3)
-                    go(px + 1, py + 1)
-                    print(f"  Line to ({px+1}, {py+1})")
-                    time.sleep(0.3)
-                    go(px, py + 1)
-                    print(f"  Line to ({px}, {py+1})")
-                    time.sleep(0.3)
-                    go(px, py)
-                    print(f"  Line to ({px}, {py})")
-                    time.sleep(0.3)
-                    if pass_num == 1:
-                        pen_up()
-                        print(f"Pen up after second pass at ({px}, {py})")
-                        time.sleep(0.3)  # Only lift pen after second pass
-    go(grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)  # Resting position
-    print("Resting position reached, pen up.")
-    motors_off()
-    return jsonify({"message": "Pixel art square drawn."})
+    mode = data.get('mode', blot_fill.DEFAULT_MODE)
+    if mode not in blot_fill.QUALITY_MODES:
+        return jsonify({"error": f"Mode must be one of {', '.join(blot_fill.QUALITY_MODES)}."}), 400
+    # A token from /mosaic/claim places the tile; a bare x/y may not land on someone else's lease.
+    # Neither is used up until the tile is admitted, and a dry run only looks
+    client = client_id(data)
+    if token is not None:
+        lease = allocator.peek(token)
+        if lease is None:
+            return jsonify({"error": "Lease expired or unknown; claim a new tile."}), 409
+        index, client = lease.tile, lease.client or client
+        x, y = blot_mosaic.tile_offset(index)
+    else:
+        if not (isinstance(x, int) and isinstance(y, int)
+                and 0 <= x <= blot_mosaic.MOSAIC_COLS - blot_fill.PATTERN_COLS
+                and 0 <= y <= blot_mosaic.MOSAIC_ROWS - blot_fill.PATTERN_ROWS):
+            return jsonify({"error": f"x and y must place the tile inside the "
+                                     f"{blot_mosaic.MOSAIC_COLS}x{blot_mosaic.MOSAIC_ROWS} mosaic."}), 400
+        index = blot_mosaic.tile_at(x, y)
+    # Every mode's compiled tile gives its estimate; the chosen one is placed by one translate
+    tile = {m: place_tile(compiled_tile(pattern, m), x, y) for m in blot_fill.QUALITY_MODES}
+    estimates = {m: round(estimator.drawing_seconds(plan(tile[m], compiled=True), plotter_position, rest_position,
+                                                    True, True), 1)
+                 for m in tile}
+    estimate = estimates[mode]
+    if dry_run():
+        # Planned as a batch of one; a tile that joins a waiting batch costs less
+        return dry_run_response({"mode": mode, "mode_estimates": estimates, "tile": index},
+                                (tile[mode], False, True, True))
+    # Submissions at a tile's corner are logged and inked into the stored mosaic once plotted
+    sub_id = None
+    with mosaic_lock:
+        refusal = admit(estimate, client)
+        if refusal is not None:
+            return refusal
+        if token is not None and allocator.commit(token) is None:
+            return jsonify({"error": "Lease expired or unknown; claim a new tile."}), 409
+        if token is None and index is not None and not allocator.take(index):
+            return jsonify({"error": f"Tile {index} is reserved by another client."}), 409
+        print(f"Pixel art at ({x}, {y}): {len(tile[mode])} strokes, mode {mode}, ~{estimate:.1f}s")
+        job, batch_size = batch_tile(tile[mode])
+        # Charged as if plotted alone, so a client's quota does not depend on who shares its batch
+        charge(client, job, estimate)
+        if index is not None:
+            sub_id = mosaic.submit(index, blot_fill.pattern_bitmask(pattern), mode)
+            mosaic_jobs.setdefault(job.id, []).append(sub_id)
+            last_tile_offset = blot_mosaic.plot_offset(x, y)
+    return accepted({"message": "Pixel art square queued.", "mode": mode, "estimated_seconds": estimate,
+                     "mode_estimates": estimates, "tile": index, "submission_id": sub_id,
+                     "batch_size": batch_size}, job)
 
 @app.route("/draw-large-area-rectangle", methods=['POST'])
 def draw_large_area_rectangle():
-    margin = 5
-    left = max(grid_origin[0] + 3 * cell_size + margin, margin)  # 70
-    right = 125 - margin  # 120
-    width = right - left  # 50
-    top = margin  # 5
-    bottom = top + 108  # 113
-    if bottom > 125 - margin:
-        bottom = 120
-        top = bottom - 108
-    motors_on()
-    time.sleep(0.2)
-    pen_up()
-    go(left, top)
-    pen_down()
-    go(right, top)
-    go(right, bottom)
-    go(left, bottom)
-    go(left, top)
-    pen_up()
-    go(grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)  # Resting position
-    motors_off()
-    return jsonify({"message": f"Large area rectangle drawn at ({left}, {top}) to ({right}, {bottom})"})
+    # The mosaic's 50x108 footprint on paper: (70, 5) to (120, 113)
+    left, top, right, bottom = mosaic_bounds()
+    refusal = off_paper(rectangle(left, top, right, bottom))
+    if refusal is not None:
+        return refusal
+    if dry_run():
+        return dry_run_response({}, (rectangle(left, top, right, bottom), False, True, True))
+    job, refusal = schedule_mosaic('large area rectangle', rectangle(left, top, right, bottom),
+                                   client_id(request.get_json(silent=True)))
+    if refusal is not None:
+        return refusal
+    return accepted({"message": f"Large area rectangle queued at ({left}, {top}) to ({right}, {bottom})"}, job)
 
 if __name__ == "__main__":
     motors_on()
     pen_up()  # Raise the pen at startup
-    time.sleep(0.5)
+    wait_for_plotter()
     app.run(debug=True, use_reloader=False) 
\ No newline at end of file
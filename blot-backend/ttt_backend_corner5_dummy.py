@@ -1,9 +1,16 @@
 from flask import Flask, request, jsonify
 import time
 import threading
-import random
 from queue import Queue
 from flask_cors import CORS
+import blot_fill
+import blot_ir
+import blot_mosaic
+import blot_estimate
+from blot_estimate import Estimator
+from blot_protocol import PEN_UP, PEN_DOWN, MOTORS_ON, MOTORS_OFF
+import ttt_engine
+import ttt_solver
 
 app = Flask(__name__)
 CORS(app)
@@ -17,22 +24,69 @@ board = {i: ' ' for i in range(1, 10)}
 current_turn = 'X'
 game_over = False
 winner = None
+# How well Auto plays: 'easy', 'medium' or 'hard' (perfect play), see ttt_solver.DIFFICULTY
+AI_DIFFICULTY = 'medium'
+# Dummy plots take as long as the real Blot is estimated to, divided by this (0 = no waiting)
+SIMULATION_SPEED = 10.0
+
+# --- Simulated plot time ---
+# Commands are recorded per thread and priced by the same model the real backend uses
+estimator = Estimator(path=blot_estimate.CALIBRATION_PATH)
+recorded = threading.local()
+position = (0, 0)
+
+def record(cmd):
+    if not hasattr(recorded, 'cmds'):
+        recorded.cmds = []
+    recorded.cmds.append(cmd)
+
+def simulate_plot(wait=True):
+    """Estimated seconds of the commands recorded on this thread since the last call; waits that long
+    (scaled by SIMULATION_SPEED) unless wait is False, which also leaves the simulated pen where it was"""
+    global position
+    cmds = getattr(recorded, 'cmds', [])
+    recorded.cmds = []
+    seconds = estimator.seconds(cmds, position)
+    if wait:
+        position = next(((c[1], c[2]) for c in reversed(cmds) if c[0] == 'go'), position)
+        if SIMULATION_SPEED:
+            time.sleep(seconds / SIMULATION_SPEED)
+    return round(seconds, 1)
+
+def dry_run():
+    return request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
 
 # --- Dummy Blot commands ---
 def go(x, y):
     print(f"[DUMMY] go({x}, {y})")
+    record(('go', x, y))
 
 def pen_up():
     print("[DUMMY] pen_up()")
+    record(PEN_UP)
 
 def pen_down():
     print("[DUMMY] pen_down()")
+    record(PEN_DOWN)
 
 def motors_on():
     print("[DUMMY] motors_on()")
+    record(MOTORS_ON)
 
 def motors_off():
     print("[DUMMY] motors_off()")
+    record(MOTORS_OFF)
+
+def trace(points):
+    """Pen-down polyline through points, from a pen-up move to its first point"""
+    go(*points[0])
+    pen_down()
+    for x, y in points[1:]:
+        go(x, y)
+    pen_up()
+
+def draw_rect(left, top, right, bottom):
+    trace([(left, top), (right, top), (right, bottom), (left, bottom), (left, top)])
 
 def cell_center(cell):
     col = (cell - 1) % 3
@@ -81,53 +135,18 @@ def draw_mark(player, cell):
         draw_O(x, y)
     go(grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)
 
-def check_winner():
-    lines = [
-        [1, 2, 3], [4, 5, 6], [7, 8, 9],
-        [1, 4, 7], [2, 5, 8], [3, 6, 9],
-        [1, 5, 9], [3, 5, 7]
-    ]
-    for line in lines:
-        if board[line[0]] == board[line[1]] == board[line[2]] and board[line[0]] != ' ':
-            return board[line[0]], line
-    if all(board[c] != ' ' for c in range(1, 10)):
-        return 'D', None
-    return None, None
+def check_winner(board_state=None):
+    return ttt_engine.check_board(board if board_state is None else board_state)
 
 def check_winner_for_board(board_state):
-    lines = [
-        [1, 2, 3], [4, 5, 6], [7, 8, 9],
-        [1, 4, 7], [2, 5, 8], [3, 6, 9],
-        [1, 5, 9], [3, 5, 7]
-    ]
-    for line in lines:
-        if board_state[line[0]] == board_state[line[1]] == board_state[line[2]] and board_state[line[0]] != ' ':
-            return board_state[line[0]]
-    if all(board_state[c] != ' ' for c in range(1, 10)):
-        return 'D'
-    return None
-
-def ai_move():
-    available = [c for c in range(1, 10) if board[c] == ' ']
-    if not available:
-        return None
-    for cell in available:
-        board_copy = board.copy()
-        board_copy[cell] = 'O'
-        winner = check_winner_for_board(board_copy)
-        if winner == 'O':
-            return cell
-    for cell in available:
-        board_copy = board.copy()
-        board_copy[cell] = 'X'
-        winner = check_winner_for_board(board_copy)
-        if winner == 'X':
-            return cell
-    return random.choice(available)
+    """Check winner for a given board state (used by AI)"""
+    return ttt_engine.check_winner_for_board(board_state)
+
+def ai_move(difficulty=None):
+    return ttt_solver.choose_move(board, 'O', difficulty or AI_DIFFICULTY)
 
 def draw_grid():
     motors_on()
-    time.sleep(0.1)
     print("[DUMMY] draw_grid()")
     for i in range(1, 3):
         x = grid_origin[0] + i * cell_size
@@ -144,22 +163,27 @@ def draw_grid():
     go(grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)
 
 # --- Dummy async mark draw ---
+def draw_mark_and_wait(player, cell):
+    draw_mark(player, cell)
+    simulate_plot()
+
 def async_draw_mark(player, cell):
-    t = threading.Thread(target=draw_mark, args=(player, cell))
+    t = threading.Thread(target=draw_mark_and_wait, args=(player, cell))
     t.start()
 
 # --- Routes ---
 @app.route("/start", methods=['POST'])
 def start_game():
     global board, current_turn, game_over, winner
+    if dry_run():
+        draw_grid()
+        return jsonify({"dry_run": True, "estimated_seconds": simulate_plot(wait=False)})
     board = {i: ' ' for i in range(1, 10)}
     current_turn = 'X'
     game_over = False
     winner = None
-    motors_on()
-    time.sleep(0.1)
     draw_grid()
-    return jsonify({"message": "New game started."})
+    return jsonify({"message": "New game started.", "estimated_seconds": simulate_plot()})
 
 @app.route("/move", methods=['POST'])
 def make_move():
@@ -170,16 +194,25 @@ def make_move():
     move = data.get('move')
     if not (1 <= move <= 9) or board[move] != ' ':
         return jsonify({"error": "Invalid move."}), 400
+    if dry_run():
+        after = dict(board)
+        after[move] = current_turn
+        draw_mark(current_turn, move)
+        would_win, winning_line = check_winner(after)
+        if would_win:
+            draw_winning_line(winning_line)
+            motors_off()
+        return jsonify({"dry_run": True, "move": move, "winner": would_win,
+                        "estimated_seconds": simulate_plot(wait=False)})
     board[move] = current_turn
     async_draw_mark(current_turn, move)
     winner, winning_line = check_winner()
     if winner:
         game_over = True
-        time.sleep(0.1)
         if winning_line:
             draw_winning_line(winning_line)
         motors_off()
-        return jsonify({"winner": winner, "board": board})
+        return jsonify({"winner": winner, "board": board, "estimated_seconds": simulate_plot()})
     return jsonify({
         "board": board,
         "current_turn": "O",
@@ -191,21 +224,35 @@ def ai_move_endpoint():
     global current_turn, game_over, winner
     if game_over:
         return jsonify({"error": "Game over."}), 400
-    ai = ai_move()
+    difficulty = (request.get_json(silent=True) or {}).get('difficulty', AI_DIFFICULTY)
+    if difficulty not in ttt_solver.DIFFICULTY:
+        return jsonify({"error": f"Difficulty must be one of {', '.join(ttt_solver.DIFFICULTY)}."}), 400
+    ai = ai_move(difficulty)
+    if dry_run():
+        after = dict(board)
+        if ai:
+            after[ai] = 'O'
+            draw_mark('O', ai)
+        would_win, winning_line = check_winner(after)
+        if would_win:
+            draw_winning_line(winning_line)
+            motors_off()
+        return jsonify({"dry_run": True, "move": ai, "winner": would_win,
+                        "estimated_seconds": simulate_plot(wait=False)})
     if ai:
         board[ai] = 'O'
         draw_mark('O', ai)
         winner, winning_line = check_winner()
         if winner:
             game_over = True
-            time.sleep(0.1)
             if winning_line:
                 draw_winning_line(winning_line)
             motors_off()
     return jsonify({
         "board": board,
         "current_turn": "X",
-        "winner": winner
+        "winner": winner,
+        "estimated_seconds": simulate_plot()
     })
 
 @app.route("/state", methods=['GET'])
@@ -220,8 +267,14 @@ def state():
 @app.route("/draw-rectangle", methods=['POST'])
 def draw_rectangle():
     print("[DUMMY] draw_rectangle()")
-    time.sleep(0.05)
-    return jsonify({"message": "Rectangle drawn."})
+    left = grid_origin[0] + 3 * cell_size + 3
+    motors_on()
+    draw_rect(left, 5, 120, 120)
+    draw_rect(left + 1, 6, 119, 119)
+    motors_off()
+    if dry_run():
+        return jsonify({"dry_run": True, "estimated_seconds": simulate_plot(wait=False)})
+    return jsonify({"message": "Rectangle drawn.", "estimated_seconds": simulate_plot()})
 
 @app.route("/draw-pixel-square", methods=['POST'])
 def draw_pixel_square():
@@ -232,12 +285,16 @@ def draw_pixel_square():
     h = data.get('h')
     fill = data.get('fill', False)
     print(f"[DUMMY] draw_pixel_square at ({x},{y}) size ({w},{h}) fill={fill}")
-    time.sleep(0.01)
     if x is None or y is None or w is None or h is None:
         return jsonify({"error": "Missing parameters."}), 400
     if not fill:
         return jsonify({"message": "Blank square, nothing drawn."})
-    return jsonify({"message": "Square drawn."})
+    motors_on()
+    draw_rect(x, y, x + w, y + h)
+    motors_off()
+    if dry_run():
+        return jsonify({"dry_run": True, "estimated_seconds": simulate_plot(wait=False)})
+    return jsonify({"message": "Square drawn.", "estimated_seconds": simulate_plot()})
 
 @app.route("/draw-pixel-art-square", methods=['POST'])
 def draw_pixel_art_square():
@@ -246,18 +303,45 @@ def draw_pixel_art_square():
     y = data.get('y')
     pattern = data.get('pattern')
     print(f"[DUMMY] draw_pixel_art_square at ({x},{y}) pattern={pattern}")
-    time.sleep(0.01)
     if x is None or y is None or pattern is None:
         return jsonify({"error": "Missing parameters."}), 400
     if not (isinstance(pattern, list) and len(pattern) == 5 and all(isinstance(row, list) and len(row) == 6 for row in pattern)):
         return jsonify({"error": "Pattern must be a 5x6 array."}), 400
-    return jsonify({"message": "Pixel art square drawn."})
+    mode = data.get('mode', blot_fill.DEFAULT_MODE)
+    if mode not in blot_fill.QUALITY_MODES:
+        return jsonify({"error": f"Mode must be one of {', '.join(blot_fill.QUALITY_MODES)}."}), 400
+    margin = 5
+    left = max(grid_origin[0] + 3 * cell_size + margin, margin)
+    rest = (grid_origin[0] + 3 * cell_size + 10, grid_origin[1] + 3 * cell_size + 10)
+    # Mosaic offsets are turned a quarter onto the paper, as on the real backend
+    dx, dy = blot_mosaic.plot_offset(x, y)
+    plans = {m: blot_fill.plan_tile(pattern, left + dx, 5 + dy, blot_mosaic.TILE_TO_PLOTTER, m, rest, rest)
+             for m in blot_fill.QUALITY_MODES}
+    estimates = {}
+    for m, strokes in plans.items():
+        cmds = [MOTORS_ON] + blot_ir.Drawing(strokes).to_commands() + [('go',) + rest, MOTORS_OFF]
+        estimates[m] = round(estimator.seconds(cmds, rest), 1)
+    print(f"[DUMMY] fill mode {mode}: {estimates[mode]}s estimated")
+    if dry_run():
+        return jsonify({"dry_run": True, "mode": mode, "estimated_seconds": estimates[mode], "mode_estimates": estimates})
+    motors_on()
+    for stroke in plans[mode]:
+        trace(stroke)
+    go(*rest)
+    motors_off()
+    simulate_plot()
+    return jsonify({"message": "Pixel art square drawn.", "mode": mode, "estimated_seconds": estimates[mode], "mode_estimates": estimates})
 
 @app.route("/draw-large-area-rectangle", methods=['POST'])
 def draw_large_area_rectangle():
     print("[DUMMY] draw_large_area_rectangle()")
-    time.sleep(0.05)
-    return jsonify({"message": "Large area rectangle drawn (dummy)."})
+    left = grid_origin[0] + 3 * cell_size + 5
+    motors_on()
+    draw_rect(left, 5, 120, 113)
+    motors_off()
+    if dry_run():
+        return jsonify({"dry_run": True, "estimated_seconds": simulate_plot(wait=False)})
+    return jsonify({"message": "Large area rectangle drawn (dummy).", "estimated_seconds": simulate_plot()})
 
 if __name__ == "__main__":
     print("[DUMMY] Backend running in dummy mode.")
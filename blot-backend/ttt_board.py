@@ -0,0 +1,257 @@
+import random
+import time
+
+# Board variants that fit the Blot's grid area; (size, k) = size x size cells, k in a row wins
+MIN_SIZE = 3
+MAX_SIZE = 7
+# Hard limit on one AI move (s)
+TIME_BUDGET = 0.5
+# Score of a line holding n stones of one side and none of the other
+LINE_WEIGHTS = (0, 1, 8, 64, 512, 4096, 32768, 262144)
+WIN_SCORE = 10 ** 7
+TT_LIMIT = 200000
+
+
+class Timeout(Exception):
+    pass
+
+
+class Board:
+    """size x size board where k in a row wins, with incremental line counts.
+
+    Cells are 0-based here (the API's cell c is index c - 1). Every window
+    of k cells along a row, column or diagonal is a line; for each line the
+    board keeps how many X and O stones it holds, so playing or undoing a
+    stone touches only that cell's lines. A line holding only one side's
+    stones is a threat worth LINE_WEIGHTS[count]; their running total is
+    the evaluation, kept up to date the same way.
+    """
+
+    def __init__(self, size=3, k=3):
+        if not MIN_SIZE <= size <= MAX_SIZE or not 3 <= k <= size:
+            raise ValueError(f"Unsupported board {size}x{size} with {k} in a row")
+        self.size = size
+        self.k = k
+        self.cells = [None] * (size * size)
+        self.stones = 0
+        self.lines = self._lines()
+        self.cell_lines = [[] for _ in self.cells]
+        for i, line in enumerate(self.lines):
+            for c in line:
+                self.cell_lines[c].append(i)
+        self.counts = [[0, 0] for _ in self.lines]
+        self.score = 0  # X-positive
+        rng = random.Random(size * 100 + k)
+        self.zobrist = [[rng.getrandbits(64) for _ in range(2)] for _ in self.cells]
+        self.hash = 0
+
+    def _lines(self):
+        n, k = self.size, self.k
+        lines = []
+        for r in range(n):
+            for c in range(n):
+                for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_r, end_c = r + dr * (k - 1), c + dc * (k - 1)
+                    if 0 <= end_r < n and 0 <= end_c < n:
+                        lines.append(tuple((r + dr * i) * n + c + dc * i for i in range(k)))
+        return lines
+
+    @classmethod
+    def from_dict(cls, board, size, k):
+        b = cls(size, k)
+        for cell, mark in board.items():
+            if mark in ('X', 'O'):
+                b.play(cell - 1, 0 if mark == 'X' else 1)
+        return b
+
+    def _contribution(self, counts):
+        x, o = counts
+        if x and not o:
+            return LINE_WEIGHTS[x]
+        if o and not x:
+            return -LINE_WEIGHTS[o]
+        return 0
+
+    def play(self, cell, side):
+        """Put side's stone (0 = X, 1 = O) on cell; True if it completes a line"""
+        self.cells[cell] = side
+        self.stones += 1
+        self.hash ^= self.zobrist[cell][side]
+        won = False
+        for i in self.cell_lines[cell]:
+            counts = self.counts[i]
+            self.score -= self._contribution(counts)
+            counts[side] += 1
+            self.score += self._contribution(counts)
+            if counts[side] == self.k:
+                won = True
+        return won
+
+    def undo(self, cell, side):
+        self.cells[cell] = None
+        self.stones -= 1
+        self.hash ^= self.zobrist[cell][side]
+        for i in self.cell_lines[cell]:
+            counts = self.counts[i]
+            self.score -= self._contribution(counts)
+            counts[side] -= 1
+            self.score += self._contribution(counts)
+
+    def full(self):
+        return self.stones == len(self.cells)
+
+    def winning_line(self):
+        """(side, line) of a completed line, or None"""
+        for i, (x, o) in enumerate(self.counts):
+            if x == self.k:
+                return 0, self.lines[i]
+            if o == self.k:
+                return 1, self.lines[i]
+        return None
+
+    def candidates(self):
+        """Empty cells next to a stone (all of them on an empty board's centre)"""
+        n = self.size
+        if not self.stones:
+            return [(n // 2) * n + n // 2]
+        out = []
+        for cell, v in enumerate(self.cells):
+            if v is not None:
+                continue
+            r, c = divmod(cell, n)
+            for dr in (-1, 0, 1):
+                rr = r + dr
+                if 0 <= rr < n and any(0 <= c + dc < n and self.cells[rr * n + c + dc] is not None
+                                       for dc in (-1, 0, 1)):
+                    out.append(cell)
+                    break
+        return out
+
+    def move_priority(self, cell, side):
+        """How much a move builds own lines and breaks the opponent's, for move ordering"""
+        total = 0
+        for i in self.cell_lines[cell]:
+            own, other = self.counts[i][side], self.counts[i][1 - side]
+            if not other:
+                total += LINE_WEIGHTS[own + 1]
+            if not own:
+                total += LINE_WEIGHTS[other + 1] // 2
+        return total
+
+
+class Searcher:
+    """Iterative-deepening negamax with alpha-beta, a transposition table and a hard deadline"""
+
+    def __init__(self, board, time_budget=TIME_BUDGET):
+        self.board = board
+        self.time_budget = time_budget
+        self.tt = {}
+        self.nodes = 0
+        self.deadline = None
+
+    def best_move(self, side, max_depth=None):
+        """(cell, value, depth reached) for side to move"""
+        b = self.board
+        self.deadline = time.monotonic() + self.time_budget
+        moves = b.candidates()
+        if not moves:
+            return None, 0, 0
+        # A win now or a forced block needs no search
+        for s in (side, 1 - side):
+            for cell in moves:
+                won = b.play(cell, s)
+                b.undo(cell, s)
+                if won:
+                    return cell, WIN_SCORE if s == side else 0, 0
+        best, best_value, reached = moves[0], 0, 0
+        limit = len(b.cells) - b.stones
+        if max_depth is not None:
+            limit = min(limit, max_depth)
+        for depth in range(1, limit + 1):
+            try:
+                value, cell = self._root(side, depth)
+            except Timeout:
+                break
+            best, best_value, reached = cell, value, depth
+            if abs(value) >= WIN_SCORE - len(b.cells):
+                break
+        return best, best_value, reached
+
+    def _root(self, side, depth):
+        alpha, beta = -WIN_SCORE * 2, WIN_SCORE * 2
+        entry = self.tt.get((self.board.hash, side))
+        best_cell = None
+        for cell in self._ordered(side, entry[3] if entry else None):
+            value = -self._search(cell, side, depth - 1, -beta, -alpha, 1)
+            if best_cell is None or value > alpha:
+                alpha, best_cell = value, cell
+        self.tt[(self.board.hash, side)] = (depth, alpha, 0, best_cell)
+        return alpha, best_cell
+
+    def _ordered(self, side, first=None):
+        b = self.board
+        moves = sorted(b.candidates(), key=lambda c: -b.move_priority(c, side))
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _search(self, cell, side, depth, alpha, beta, ply):
+        """Value, for the side to reply, after side plays cell"""
+        b = self.board
+        self.nodes += 1
+        if self.nodes & 255 == 0 and time.monotonic() > self.deadline:
+            raise Timeout
+        if b.play(cell, side):
+            b.undo(cell, side)
+            return -(WIN_SCORE - ply)
+        try:
+            if b.full():
+                return 0
+            mover = 1 - side
+            if depth <= 0:
+                return b.score if mover == 0 else -b.score
+            key = (b.hash, mover)
+            entry = self.tt.get(key)
+            if entry is not None and entry[0] >= depth:
+                _, value, flag, _ = entry
+                if flag == 0 or (flag < 0 and value <= alpha) or (flag > 0 and value >= beta):
+                    return value
+            start_alpha = alpha
+            best, best_cell = -WIN_SCORE * 2, None
+            for move in self._ordered(mover, entry[3] if entry else None):
+                value = -self._search(move, mover, depth - 1, -beta, -alpha, ply + 1)
+                if value > best:
+                    best, best_cell = value, move
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+            # flag: -1 upper bound, 0 exact, 1 lower bound
+            flag = -1 if best <= start_alpha else 1 if best >= beta else 0
+            if len(self.tt) > TT_LIMIT:
+                self.tt.clear()
+            self.tt[key] = (depth, best, flag, best_cell)
+            return best
+        finally:
+            b.undo(cell, side)
+
+
+# --- Dict-board helpers, matching ttt_engine's ---
+def check_board(board, size, k):
+    """(winner, line of 1-based cells) for a win, ('D', None) when full, else (None, None)"""
+    b = Board.from_dict(board, size, k)
+    found = b.winning_line()
+    if found is not None:
+        side, line = found
+        return 'XO'[side], [c + 1 for c in line]
+    if b.full():
+        return 'D', None
+    return None, None
+
+def best_move(board, size, k, player='O', time_budget=TIME_BUDGET, max_depth=None):
+    """1-based cell for player, searched for at most time_budget seconds"""
+    b = Board.from_dict(board, size, k)
+    if b.winning_line() is not None or b.full():
+        return None
+    cell, _, _ = Searcher(b, time_budget).best_move(0 if player == 'X' else 1, max_depth)
+    return None if cell is None else cell + 1
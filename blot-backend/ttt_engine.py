@@ -0,0 +1,97 @@
+import random
+
+# Cells are numbered 1..9 row by row; cell c is bit c - 1 of a side's 9-bit mask
+LINES = (
+    (1, 2, 3), (4, 5, 6), (7, 8, 9),
+    (1, 4, 7), (2, 5, 8), (3, 6, 9),
+    (1, 5, 9), (3, 5, 7),
+)
+LINE_MASKS = tuple(sum(1 << (c - 1) for c in line) for line in LINES)
+FULL = 0x1FF
+
+
+def _first_line(mask):
+    for line, bits in zip(LINES, LINE_MASKS):
+        if mask & bits == bits:
+            return line
+    return None
+
+# WIN_TABLE[mask] is the first completed line in a side's mask, or None
+WIN_TABLE = tuple(_first_line(mask) for mask in range(1 << 9))
+
+
+def cell_bit(cell):
+    return 1 << (cell - 1)
+
+def bit_cell(bit):
+    return bit.bit_length()
+
+def from_dict(board):
+    """(x_mask, o_mask) of a {1..9: ' '|'X'|'O'} board"""
+    x = o = 0
+    for cell, mark in board.items():
+        if mark == 'X':
+            x |= cell_bit(cell)
+        elif mark == 'O':
+            o |= cell_bit(cell)
+    return x, o
+
+def to_dict(x, o):
+    return {c: 'X' if x & cell_bit(c) else 'O' if o & cell_bit(c) else ' ' for c in range(1, 10)}
+
+def empty_cells(x, o):
+    """Empty cells as single-bit masks, lowest cell first"""
+    free = FULL & ~(x | o)
+    while free:
+        bit = free & -free
+        yield bit
+        free ^= bit
+
+def winner(x, o):
+    """'X', 'O', 'D' for a full board with no line, or None while the game is open"""
+    if WIN_TABLE[x] is not None:
+        return 'X'
+    if WIN_TABLE[o] is not None:
+        return 'O'
+    if x | o == FULL:
+        return 'D'
+    return None
+
+# --- Dict-board helpers, drop-in for the backends' game logic ---
+def check_board(board):
+    """(winner, line) the way the backends' check_winner reports it: line is a list for a win"""
+    x, o = from_dict(board)
+    for side, mark in ((x, 'X'), (o, 'O')):
+        line = WIN_TABLE[side]
+        if line is not None:
+            return mark, list(line)
+    if x | o == FULL:
+        return 'D', None
+    return None, None
+
+def check_winner_for_board(board):
+    return winner(*from_dict(board))
+
+def winning_move(own, other):
+    """Bit of an empty cell that completes a line for own, or 0"""
+    for bit in empty_cells(own, other):
+        if WIN_TABLE[own | bit] is not None:
+            return bit
+    return 0
+
+def ai_move(board, player='O', rng=random):
+    """One-ply AI: win if possible, else block the opponent's win, else a random empty cell"""
+    x, o = from_dict(board)
+    own, other = (o, x) if player == 'O' else (x, o)
+    free = list(empty_cells(x, o))
+    if not free:
+        return None
+    bit = winning_move(own, other) or winning_move(other, own)
+    if not bit:
+        bit = rng.choice(free)
+    return bit_cell(bit)
+
+def random_move(board, rng=random):
+    x, o = from_dict(board)
+    free = list(empty_cells(x, o))
+    return bit_cell(rng.choice(free)) if free else None
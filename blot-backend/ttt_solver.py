@@ -0,0 +1,142 @@
+"""Perfect-play tic-tac-toe table and difficulty levels on top of ttt_engine.
+
+Usage: python ttt_solver.py [path]   write the compact solution file
+"""
+import os
+import random
+import struct
+import sys
+from ttt_engine import FULL, WIN_TABLE, bit_cell, empty_cells, from_dict
+
+# Cell permutations of the 8 board symmetries (rotations and reflections), as 0-based cells
+_ROTATE = (6, 3, 0, 7, 4, 1, 8, 5, 2)
+_MIRROR = (2, 1, 0, 5, 4, 3, 8, 7, 6)
+
+def _symmetries():
+    perms = []
+    perm = tuple(range(9))
+    for _ in range(4):
+        perms.append(perm)
+        perms.append(tuple(perm[_MIRROR[i]] for i in range(9)))
+        perm = tuple(perm[_ROTATE[i]] for i in range(9))
+    return perms
+
+SYMMETRIES = _symmetries()
+# PERMUTED[s][mask] is mask with its cells moved by symmetry s, so transforming a side is a lookup
+PERMUTED = tuple(tuple(sum(1 << perm[i] for i in range(9) if mask >> i & 1) for mask in range(1 << 9))
+                 for perm in SYMMETRIES)
+
+SOLUTION_MAGIC = b'TTS1'
+SOLUTION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ttt_solution.bin')
+
+# blunder: chance of a random move; depth: plies of the outcome the AI can see (None: all)
+DIFFICULTY = {
+    'easy': {"blunder": 0.4, "depth": 2},
+    'medium': {"blunder": 0.1, "depth": 4},
+    'hard': {"blunder": 0.0, "depth": None},
+}
+DEFAULT_DIFFICULTY = 'medium'
+
+
+def canonical(own, other):
+    """Smallest 18-bit key (own | other << 9) over the 8 symmetries"""
+    return min(p[own] | p[other] << 9 for p in PERMUTED)
+
+# --- Solving ---
+# A value is from the point of view of the side to move: 0 for a draw, otherwise
+# +/-(10 - plies), where plies is how long perfect play takes to end the game
+def _move_value(own, other, bit, table):
+    """Value of playing bit, from the mover's point of view"""
+    mine = own | bit
+    if WIN_TABLE[mine] is not None:
+        return 9
+    if mine | other == FULL:
+        return 0
+    child = position_value(other, mine, table)
+    return -child + (1 if child > 0 else -1 if child < 0 else 0)
+
+def position_value(own, other, table):
+    """Value of a position with own to move, memoized in table by its symmetry class"""
+    key = canonical(own, other)
+    v = table.get(key)
+    if v is None:
+        v = max(_move_value(own, other, bit, table) for bit in empty_cells(own, other))
+        table[key] = v
+    return v
+
+def solve():
+    """Negamax over every position reachable from the empty board, one entry per symmetry class"""
+    table = {}
+    position_value(0, 0, table)
+    return table
+
+def save(table, path=SOLUTION_PATH):
+    """Write the table as magic, count and (uint32 key, int8 value) records"""
+    with open(path, 'wb') as f:
+        f.write(SOLUTION_MAGIC + struct.pack('<I', len(table)))
+        for key in sorted(table):
+            f.write(struct.pack('<Ib', key, table[key]))
+
+def load(path=SOLUTION_PATH):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != SOLUTION_MAGIC:
+        raise ValueError(f"{path} is not a solution file")
+    count, = struct.unpack_from('<I', data, 4)
+    return dict(struct.iter_unpack('<Ib', data[8:8 + 5 * count]))
+
+def load_or_solve(path=SOLUTION_PATH):
+    if path and os.path.exists(path):
+        try:
+            return load(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"[ttt_solver] re-solving, could not load {path}: {e}")
+    return solve()
+
+TABLE = load_or_solve()
+
+# --- Move choice ---
+def move_values(own, other):
+    """{move bit: value of playing it} for the side to move.
+
+    Positions off the normal X-then-O sequence (e.g. two moves in a row)
+    are missing from the table; they are solved on first use and added.
+    """
+    return {bit: _move_value(own, other, bit, TABLE) for bit in empty_cells(own, other)}
+
+def horizon(value, depth):
+    """What an AI that sees depth plies ahead makes of a move's value"""
+    if depth is None or value == 0 or 10 - abs(value) <= depth:
+        return value
+    return 0
+
+def choose_move(board, player='O', difficulty=DEFAULT_DIFFICULTY, rng=random):
+    """Cell for player to play on a {1..9: mark} board at the given difficulty"""
+    x, o = from_dict(board)
+    own, other = (o, x) if player == 'O' else (x, o)
+    if WIN_TABLE[x] is not None or WIN_TABLE[o] is not None:
+        return None
+    values = move_values(own, other)
+    if not values:
+        return None
+    level = DIFFICULTY.get(difficulty, DIFFICULTY[DEFAULT_DIFFICULTY])
+    if rng.random() < level["blunder"]:
+        return bit_cell(rng.choice(list(values)))
+    seen = {bit: horizon(v, level["depth"]) for bit, v in values.items()}
+    best = max(seen.values())
+    return bit_cell(rng.choice([bit for bit, v in seen.items() if v == best]))
+
+def outcome(board, player='O'):
+    """'win', 'draw' or 'loss' for player, to move, under perfect play"""
+    x, o = from_dict(board)
+    own, other = (o, x) if player == 'O' else (x, o)
+    values = move_values(own, other)
+    v = max(values.values()) if values else 0
+    return 'win' if v > 0 else 'loss' if v < 0 else 'draw'
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else SOLUTION_PATH
+    table = solve()
+    save(table, path)
+    print(f"{len(table)} positions (up to symmetry) written to {path}, {os.path.getsize(path)} bytes")
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict, deque
+
+# Precomputed replies kept; the oldest unused ones are dropped first
+SPECULATION_LIMIT = 256
+
+
+def position_key(board, *context):
+    """Hashable key of a {cell: mark} board plus whatever else the reply depends on"""
+    return (tuple(sorted(board.items())),) + context
+
+
+class Speculator:
+    """Computes replies for positions before they are asked for.
+
+    request() queues a position for the background thread (urgent ones go
+    to the front); take() returns the precomputed reply, waiting if that
+    very position is being computed right now, or None on a miss so the
+    caller computes it inline.
+    """
+
+    def __init__(self, compute, limit=SPECULATION_LIMIT):
+        self.compute = compute
+        self.limit = limit
+        self.results = OrderedDict()
+        self.pending = deque()
+        self.queued = {}
+        self.computing = None
+        self.cond = threading.Condition()
+        self.stats = {"requested": 0, "computed": 0, "hits": 0, "misses": 0, "unused": 0}
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def request(self, key, args, urgent=False):
+        with self.cond:
+            if key in self.results or key == self.computing:
+                return
+            if key in self.queued:
+                if not urgent:
+                    return
+                self.pending.remove(key)
+            self.stats["requested"] += 1
+            self.queued[key] = args
+            if urgent:
+                self.pending.appendleft(key)
+            else:
+                self.pending.append(key)
+            self.cond.notify_all()
+
+    def take(self, key):
+        with self.cond:
+            while key == self.computing:
+                self.cond.wait()
+            if key in self.results:
+                self.stats["hits"] += 1
+                return self.results.pop(key)
+            self.stats["misses"] += 1
+            return None
+
+    def clear(self):
+        """Forget everything, e.g. when a new game starts"""
+        with self.cond:
+            self.stats["unused"] += len(self.results)
+            self.results.clear()
+            self.pending.clear()
+            self.queued.clear()
+
+    def snapshot(self):
+        with self.cond:
+            stats = dict(self.stats, ready=len(self.results), queued=len(self.pending))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                key = self.pending.popleft()
+                args = self.queued.pop(key)
+                self.computing = key
+            try:
+                result = self.compute(*args)
+            except Exception as e:
+                print(f"[ttt_speculation] speculative reply failed: {e}")
+                result = None
+            with self.cond:
+                self.computing = None
+                if result is not None:
+                    self.results[key] = result
+                    self.stats["computed"] += 1
+                    while len(self.results) > self.limit:
+                        self.results.popitem(last=False)
+                        self.stats["unused"] += 1
+                self.cond.notify_all()